@@ -3,6 +3,7 @@ from django.contrib.auth.models import Group, Permission
 from django.utils.html import format_html
 from django.db.models import Q, Count
 from .models import *
+from . import transiciones, versiones
 
 # ===========================================
 # CONFIGURACIÓN DE GRUPOS Y PERMISOS
@@ -258,6 +259,7 @@ class UsuarioAdmin(admin.ModelAdmin):
 
     def marcar_como_tutor(self, request, queryset):
         updated = queryset.update(es_tutor=True)
+        versiones.incrementar(Usuario)
         tutores_group = Group.objects.get(name='Tutores')
         for usuario in queryset:
             usuario.groups.add(tutores_group)
@@ -266,6 +268,7 @@ class UsuarioAdmin(admin.ModelAdmin):
 
     def marcar_como_estudiante(self, request, queryset):
         updated = queryset.update(es_tutor=False)
+        versiones.incrementar(Usuario)
         tutores_group = Group.objects.get(name='Tutores')
         for usuario in queryset:
             usuario.groups.remove(tutores_group)
@@ -274,6 +277,7 @@ class UsuarioAdmin(admin.ModelAdmin):
 
     def cambiar_estado_activo(self, request, queryset):
         updated = queryset.update(estado='Activo')
+        versiones.incrementar(Usuario)
         self.message_user(request, f'{updated} usuarios marcados como Activos')
     cambiar_estado_activo.short_description = 'Marcar como Activos'
 
@@ -519,20 +523,20 @@ class SesionTutoriaAdmin(admin.ModelAdmin):
         return qs.select_related(
             'tutor__usuario',
             'tutorado',
-            'asignatura'
+            'asignatura__carrera'  # La columna asignatura muestra Asignatura.__str__, que usa la carrera
         )
 
     actions = ['marcar_como_completada', 'marcar_como_cancelada']
 
     def marcar_como_completada(self, request, queryset):
         from django.utils import timezone
-        updated = queryset.update(estado='Completada', fecha_fin=timezone.now())
-        self.message_user(request, f'{updated} sesiones marcadas como completadas')
+        updated = transiciones.transicionar_varias(queryset, 'finalizar', fecha_fin=timezone.now())
+        self.message_user(request, f'{updated} sesiones marcadas como completadas (solo las aceptadas)')
     marcar_como_completada.short_description = 'Marcar como Completadas'
 
     def marcar_como_cancelada(self, request, queryset):
-        updated = queryset.update(estado='Cancelada')
-        self.message_user(request, f'{updated} sesiones canceladas')
+        updated = transiciones.transicionar_varias(queryset, 'cancelar')
+        self.message_user(request, f'{updated} sesiones canceladas (solo las pendientes o aceptadas)')
     marcar_como_cancelada.short_description = 'Marcar como Canceladas'
 
 
@@ -548,6 +552,7 @@ class NotificacionAdmin(admin.ModelAdmin):
         'get_leida_badge',
         'fecha_envio'
     )
+    list_select_related = ('usuario',)
     list_filter = (
         'tipo',
         'leida',
@@ -617,6 +622,7 @@ class DisponibilidadTutorAdmin(admin.ModelAdmin):
         'hora_fin',
         'activo'
     )
+    list_select_related = ('tutor__usuario',)
     list_filter = (
         'dia',
         'activo',
@@ -645,6 +651,81 @@ class DisponibilidadTutorAdmin(admin.ModelAdmin):
     get_tutor_nombre.short_description = 'Tutor'
 
 
+# ===========================================
+# ADMIN ARCHIVO HISTÓRICO (solo lectura)
+# ===========================================
+class SoloLecturaAdmin(admin.ModelAdmin):
+    """Tablas que solo llenan los comandos: el archivo (archivar_sesiones) y las proyecciones"""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class MensajeArchivadoInline(admin.TabularInline):
+    model = MensajeArchivado
+    fields = ('remitente', 'mensaje', 'fecha_envio')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('remitente')
+
+
+@admin.register(SesionArchivada)
+class SesionArchivadaAdmin(SoloLecturaAdmin):
+    list_display = ('id', 'tutor', 'tutorado', 'asignatura', 'fecha_programada', 'estado', 'fecha_archivado')
+    list_select_related = ('tutor__usuario', 'tutorado', 'asignatura__carrera')
+    list_filter = (EstadoSesionFilter, ('fecha_programada', admin.DateFieldListFilter))
+    search_fields = ('tutor__usuario__rut', 'tutorado__rut', 'asignatura__nombre')
+    date_hierarchy = 'fecha_programada'
+    inlines = [MensajeArchivadoInline]
+
+
+admin.site.register(NotificacionArchivada, SoloLecturaAdmin, list_select_related=('usuario',))
+
+
+# ===========================================
+# HISTORIAL DE EVENTOS Y PROYECCIONES
+# ===========================================
+@admin.register(EventoSesion)
+class EventoSesionAdmin(SoloLecturaAdmin):
+    list_display = ('id', 'sesion_id', 'tipo', 'estado_origen', 'estado_destino', 'fecha')
+    list_filter = ('tipo', ('fecha', admin.DateFieldListFilter))
+    search_fields = ('=sesion_id', '=tutor_id', '=tutorado_id')
+    date_hierarchy = 'fecha'
+
+    def has_delete_permission(self, request, obj=None):
+        return False  # Solo se agregan eventos
+
+
+@admin.register(EstadisticaTutor)
+class EstadisticaTutorAdmin(SoloLecturaAdmin):
+    list_display = (
+        'tutor', 'solicitadas', 'aceptadas', 'denegadas', 'completadas', 'canceladas',
+        'get_promedio_aceptacion', 'ultimo_evento',
+    )
+    list_select_related = ('tutor__usuario',)
+    search_fields = ('tutor__usuario__rut', 'tutor__usuario__first_name', 'tutor__usuario__last_name')
+
+    def get_promedio_aceptacion(self, obj):
+        promedio = obj.promedio_aceptacion()
+        if promedio is None:
+            return '—'
+        horas, resto = divmod(int(promedio.total_seconds()), 3600)
+        return f'{horas} h {resto // 60} min'
+    get_promedio_aceptacion.short_description = 'Tiempo de aceptación'
+
+
+admin.site.register(ContadorEventosDia, SoloLecturaAdmin, list_display=('fecha', 'tipo', 'total'),
+                    list_filter=('tipo',), date_hierarchy='fecha')
+admin.site.register(PuntoControlProyeccion, SoloLecturaAdmin,
+                    list_display=('nombre', 'ultimo_evento', 'fecha_actualizacion'))
+
+
 # ===========================================
 # DESREGISTRAR Y REGISTRAR GROUP
 # ===========================================
@@ -653,9 +734,13 @@ admin.site.unregister(Group)
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('name', 'get_permisos_count')
-    
+
+    def get_queryset(self, request):
+        # El conteo de permisos de cada grupo en la misma consulta del listado
+        return super().get_queryset(request).annotate(cantidad_permisos=Count('permissions'))
+
     def get_permisos_count(self, obj):
-        count = obj.permissions.count()
+        count = obj.cantidad_permisos
         return format_html(
             '<span style="background-color: #2196F3; color: white; '
             'padding: 3px 8px; border-radius: 3px;">{} permisos</span>',
@@ -669,7 +754,8 @@ class GroupAdmin(admin.ModelAdmin):
 # ===========================================
 admin.site.register(Sede)
 admin.site.register(Carrera)
-admin.site.register(Asignatura)
-admin.site.register(RecursoEducativo)
+# list_select_related: el __str__ de cada fila usa estas relaciones
+admin.site.register(Asignatura, list_select_related=('carrera',))
+admin.site.register(RecursoEducativo, list_select_related=('asignatura',))
 admin.site.register(Logro)
-admin.site.register(Mensaje)
\ No newline at end of file
+admin.site.register(Mensaje, list_select_related=('remitente',))
\ No newline at end of file
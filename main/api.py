@@ -1,15 +1,435 @@
-from rest_framework import viewsets
-from rest_framework.permissions import IsAuthenticated
+import hashlib
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework import serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from . import lectura_rapida, resumen, sincronizacion, transiciones, versiones
+from .renderers import transmitir_json
 from .serializers import *
 from .models import *
 
-class TutorViewSet(viewsets.ModelViewSet):
+
+def columnas_serializer(serializer, modelo, prefijo=''):
+    """
+    Columnas que lee el serializer, como argumentos para only() (con prefijo
+    'relacion__' para los serializers anidados por select_related).
+    Retorna None si algún campo no corresponde a una columna (SerializerMethodField,
+    propiedades, source con punto): en ese caso no se puede acotar el queryset.
+    """
+    columnas = {f'{prefijo}{modelo._meta.pk.name}'}
+    for campo in serializer.fields.values():
+        if isinstance(campo, serializers.ListSerializer):
+            continue  # Relación inversa: se trae con prefetch, ver prefetch_acotados
+        try:
+            campo_modelo = modelo._meta.get_field(campo.source)
+        except FieldDoesNotExist:
+            return None
+        if campo_modelo.many_to_many:
+            continue
+        if not campo_modelo.concrete:
+            return None
+        columnas.add(f'{prefijo}{campo.source}')
+        if isinstance(campo, serializers.BaseSerializer):
+            anidadas = columnas_serializer(campo, campo_modelo.related_model, f'{prefijo}{campo.source}__')
+            if anidadas is None:
+                return None
+            columnas |= anidadas
+    return columnas
+
+
+def prefetch_acotados(serializer, modelo, prefijo=''):
+    """
+    {lookup: Prefetch} con un queryset acotado con only() para cada colección
+    anidada (many=True) que el serializer va a entregar
+    """
+    prefetch = {}
+    for campo in serializer.fields.values():
+        if not isinstance(campo, serializers.ListSerializer):
+            continue
+        relacion = modelo._meta.get_field(campo.source)
+        hijo = relacion.related_model
+        lookup = f'{prefijo}{campo.source}'
+        columnas = columnas_serializer(campo.child, hijo)
+        queryset = hijo._default_manager.all()
+        if columnas is not None:
+            # La FK al padre es necesaria para repartir los objetos traídos
+            queryset = queryset.only(*columnas, relacion.field.name)
+        prefetch[lookup] = Prefetch(lookup, queryset=queryset)
+        prefetch.update(prefetch_acotados(campo.child, hijo, f'{lookup}__'))
+    return prefetch
+
+
+def modelos_serializer(serializer, modelo):
+    """Modelos cuyos datos entrega el serializer, incluidos los anidados"""
+    modelos = {modelo}
+    for campo in serializer.fields.values():
+        hijo = campo.child if isinstance(campo, serializers.ListSerializer) else campo
+        if not isinstance(hijo, serializers.BaseSerializer):
+            continue
+        try:
+            relacionado = modelo._meta.get_field(campo.source).related_model
+        except FieldDoesNotExist:
+            continue
+        modelos |= modelos_serializer(hijo, relacionado)
+    return modelos
+
+
+class CacheHTTPMixin:
+    """
+    GET condicional en lista y detalle. El ETag y Last-Modified salen de la
+    versión de los modelos que entrega el serializer (main/versiones.py), con
+    una consulta y sin leer los datos: si el cliente ya tiene la versión
+    vigente se responde 304 sin consultar el queryset ni serializar.
+    politica_cache: argumentos de patch_cache_control para las respuestas.
+    """
+    politica_cache = {'private': True, 'no_cache': True}
+
+    def validadores_cache(self, request):
+        modelos = modelos_serializer(self.get_serializer(), self.queryset.model)
+        firma, modificacion = versiones.obtener(*modelos)
+        # La misma versión de datos se ve distinta según la URL (filtros, cursor, ?fields=),
+        # el formato y el usuario
+        variante = f'{firma}|{request.get_full_path()}|{request.accepted_media_type}|{request.user.pk}'
+        etag = f'W/"{hashlib.sha1(variante.encode()).hexdigest()}"'
+        return etag, int(modificacion.timestamp()) if modificacion else None
+
+    def responder_condicional(self, request, vista, *args, **kwargs):
+        etag, ultima_modificacion = self.validadores_cache(request)
+        response = get_conditional_response(request, etag=etag, last_modified=ultima_modificacion)
+        if response is None:
+            response = vista(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if ultima_modificacion is not None:
+                response['Last-Modified'] = http_date(ultima_modificacion)
+            patch_cache_control(response, **self.politica_cache)
+        patch_vary_headers(response, ('Accept', 'Cookie'))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.responder_condicional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.responder_condicional(request, super().retrieve, *args, **kwargs)
+
+
+class ConsultaOptimizadaMixin:
+    """
+    Ajusta el queryset al grafo del serializer para evitar consultas N+1:
+    - relaciones_select / relaciones_prefetch: lo que el serializer siempre usa
+    - prefetch_expandibles: prefetch de cada relación opcional, solo si se pidió con ?expand=
+    - ?fields=: en los GET, el queryset y los prefetch se acotan con only() a las
+      columnas de los campos pedidos
+    - max_consultas: tope de consultas por request (lista o detalle, con todo expandido),
+      verificado con python manage.py verificar_consultas. Incluye las 3 consultas fijas
+      de cada request autenticado (sesión, usuario y versiones de CacheHTTPMixin); no el
+      guardado de last_activity en la sesión (3 más, a lo más una vez por
+      SESION_ACTIVIDAD_GRANULARIDAD, ver SessionTimeoutMiddleware).
+    """
+    relaciones_select = ()
+    relaciones_prefetch = ()
+    prefetch_expandibles = {}
+    max_consultas = None
+
+    def get_expand(self):
+        expand = set()
+        for valor in self.request.query_params.getlist('expand'):
+            for ruta in valor.split(','):
+                partes = ruta.strip().split('.')
+                # Pedir 'sesiones.mensajes' implica expandir 'sesiones'
+                for i in range(1, len(partes) + 1):
+                    expand.add('.'.join(partes[:i]))
+        return frozenset(ruta for ruta in expand if ruta in self.prefetch_expandibles)
+
+    def get_campos(self):
+        campos = set()
+        for valor in self.request.query_params.getlist('fields'):
+            campos.update(ruta.strip() for ruta in valor.split(',') if ruta.strip())
+        return frozenset(campos)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        context['fields'] = self.get_campos()
+        return context
+
+    def optimizar_queryset(self, queryset):
+        select = list(self.relaciones_select)
+        expandidos = []
+        for ruta in sorted(self.get_expand()):
+            expandidos.extend(self.prefetch_expandibles[ruta])
+
+        # Solo en lecturas: al escribir, el serializer valida y guarda el objeto completo
+        if self.get_campos() and self.request.method == 'GET':
+            serializer = self.get_serializer()
+            columnas = columnas_serializer(serializer, queryset.model)
+            if columnas is not None:
+                # Una relación que no se va a serializar no se trae, ni puede diferirse y recorrerse a la vez
+                select = [relacion for relacion in select if relacion in columnas]
+                queryset = queryset.only(*columnas)
+            # Una colección expandida pero fuera de ?fields= no se serializa: no se trae
+            acotados = prefetch_acotados(serializer, queryset.model)
+            expandidos = [acotados[lookup] for lookup in expandidos if lookup in acotados]
+
+        prefetch = list(self.relaciones_prefetch) + expandidos
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    def get_queryset(self):
+        return self.optimizar_queryset(super().get_queryset())
+
+
+class EscrituraMasivaMixin:
+    """
+    Endpoint /bulk/ para importar o migrar muchos objetos en un solo request:
+    - POST con una lista de objetos los crea con bulk_create
+    - PATCH con una lista de objetos con su id los actualiza con bulk_update
+    Se valida todo el lote (las claves foráneas con una consulta por modelo,
+    ver serializers.RelacionPrecargada) y se escribe en una sola transacción.
+    Si algún ítem es inválido no se escribe nada y se responde 400 con
+    {'errores': [{'indice': i, 'errores': {...}}]}.
+    Hasta API_BULK_MAXIMO ítems por request. Sin señales post_save: la versión
+    del modelo (main/versiones.py) se incrementa explícitamente.
+
+    Salvo para staff, el lote se limita a lo del usuario del request:
+    - propietario: lookups que ligan una fila al usuario; PATCH solo encuentra esas filas
+    - campos_propietario: en POST toman el usuario del request; en PATCH no se cambian
+    - relaciones_propietario: {campo: lookups} las claves foráneas solo aceptan objetos del usuario
+    campos_no_masivos: campos que /bulk/ no escribe para nadie (tienen su propio flujo).
+    """
+    tamano_lote_bulk = 500
+    propietario = ()
+    campos_propietario = ()
+    relaciones_propietario = {}
+    campos_no_masivos = ()
+
+    @action(detail=False, methods=['post', 'patch'], url_path='bulk')
+    def bulk(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'detail': 'Se espera una lista de objetos'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.API_BULK_MAXIMO:
+            return Response(
+                {'detail': f'Máximo {settings.API_BULK_MAXIMO} objetos por request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        actualizar = request.method == 'PATCH'
+        validos, errores = self.validar_lote(items, actualizar)
+        if errores:
+            return Response({'errores': errores}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            if actualizar:
+                objetos = self.actualizar_lote(validos)
+                return Response({'actualizados': len(objetos)})
+            objetos = self.crear_lote(validos)
+        # Los ids vuelven de bulk_create en PostgreSQL, SQLite y MariaDB, no en MySQL
+        return Response(
+            {'creados': len(objetos), 'ids': [objeto.pk for objeto in objetos]},
+            status=status.HTTP_201_CREATED
+        )
+
+    @staticmethod
+    def filtro_usuario(lookups, usuario):
+        """Q de las filas ligadas al usuario por cualquiera de los lookups"""
+        filtro = Q()
+        for lookup in lookups:
+            filtro |= Q(**{lookup: usuario})
+        return filtro
+
+    def restringir_al_usuario(self):
+        return not self.request.user.is_staff
+
+    def queryset_masivo(self):
+        """Filas que el usuario puede actualizar con /bulk/"""
+        queryset = self.get_queryset()
+        if not self.restringir_al_usuario():
+            return queryset
+        if not self.propietario:
+            return queryset.none()  # Sin dueño declarado solo staff actualiza
+        return queryset.filter(self.filtro_usuario(self.propietario, self.request.user))
+
+    def precargar_relaciones(self, items):
+        """{modelo: {pk como texto: objeto}} de las claves foráneas que trae el lote"""
+        precargados = {}
+        for nombre, campo in self.get_serializer().fields.items():
+            if not isinstance(campo, serializers.PrimaryKeyRelatedField) or campo.read_only:
+                continue
+            pks = {
+                str(item[nombre]) for item in items
+                if isinstance(item, dict) and isinstance(item.get(nombre), (int, str))
+                and not isinstance(item.get(nombre), bool) and str(item[nombre]).isdigit()
+            }
+            queryset = campo.get_queryset()
+            if nombre in self.relaciones_propietario and self.restringir_al_usuario():
+                # Una sesión ajena no se encuentra: el ítem falla con does_not_exist
+                queryset = queryset.filter(self.filtro_usuario(self.relaciones_propietario[nombre], self.request.user))
+                objetos = precargados.setdefault((queryset.model, nombre), {})
+            else:
+                objetos = precargados.setdefault(queryset.model, {})
+            objetos.update((str(pk), objeto) for pk, objeto in queryset.in_bulk(pks - objetos.keys()).items())
+        return precargados
+
+    def errores_de_permiso(self, item, actualizar):
+        """Errores por campo de lo que el usuario no puede escribir en el ítem"""
+        errores = {campo: ['No se puede escribir con /bulk/'] for campo in self.campos_no_masivos if campo in item}
+        if actualizar and self.restringir_al_usuario():
+            errores.update({campo: ['No se puede cambiar'] for campo in self.campos_propietario if campo in item})
+        return errores
+
+    def validar_lote(self, items, actualizar):
+        """Retorna ([(instancia o None, validated_data)], [errores por índice])"""
+        if not actualizar and self.restringir_al_usuario():
+            # Los objetos creados quedan a nombre del usuario del request
+            propios = {campo: self.request.user.pk for campo in self.campos_propietario}
+            items = [{**item, **propios} if isinstance(item, dict) else item for item in items]
+
+        instancias = {}
+        if actualizar:
+            ids = {
+                str(item['id']) for item in items
+                if isinstance(item, dict) and str(item.get('id', '')).isdigit()
+            }
+            instancias = {str(pk): objeto for pk, objeto in self.queryset_masivo().in_bulk(ids).items()}
+
+        context = self.get_serializer_context()
+        context['precargados'] = self.precargar_relaciones(items)
+        serializer_class = self.get_serializer_class()
+
+        validos, errores = [], []
+        for indice, item in enumerate(items):
+            if not isinstance(item, dict):
+                errores.append({'indice': indice, 'errores': {'non_field_errors': ['Se espera un objeto']}})
+                continue
+            errores_permiso = self.errores_de_permiso(item, actualizar)
+            if errores_permiso:
+                errores.append({'indice': indice, 'errores': errores_permiso})
+                continue
+            instancia = None
+            if actualizar:
+                instancia = instancias.get(str(item.get('id')))
+                if instancia is None:
+                    errores.append({'indice': indice, 'errores': {'id': ['No existe un objeto con este id']}})
+                    continue
+            serializer = serializer_class(instancia, data=item, partial=actualizar, context=context)
+            if serializer.is_valid():
+                validos.append((instancia, serializer.validated_data))
+            else:
+                errores.append({'indice': indice, 'errores': serializer.errors})
+        return validos, errores
+
+    def crear_lote(self, validos):
+        modelo = self.get_queryset().model
+        objetos = [modelo(**datos) for _, datos in validos]
+        objetos = modelo.objects.bulk_create(objetos, batch_size=self.tamano_lote_bulk)
+        versiones.incrementar(modelo)
+        return objetos
+
+    def actualizar_lote(self, validos):
+        campos = set()
+        objetos = []
+        for instancia, datos in validos:
+            for campo, valor in datos.items():
+                setattr(instancia, campo, valor)
+            campos.update(datos)
+            objetos.append(instancia)
+        if campos:
+            modelo = self.get_queryset().model
+            # bulk_update() no pasa por save(): los campos auto_now (fecha_actualizacion) se fijan aquí
+            for campo in modelo._meta.concrete_fields:
+                if getattr(campo, 'auto_now', False):
+                    for objeto in objetos:
+                        campo.pre_save(objeto, add=False)
+                    campos.add(campo.name)
+            modelo.objects.bulk_update(objetos, campos, batch_size=self.tamano_lote_bulk)
+            versiones.incrementar(modelo)
+        return objetos
+
+
+class ExportacionMixin:
+    """
+    GET /exportar/: todas las filas del endpoint (con sus filtros, ?fields= y
+    ?expand=) como un arreglo JSON transmitido fila a fila. El queryset se
+    recorre con iterator() por lotes de tamano_lote_exportacion y cada fila se
+    serializa y se envía al cliente sin acumular el resultado, de modo que la
+    memoria no crece con la cantidad de filas.
+    Con PostgreSQL iterator() usa un cursor del lado del servidor; con MySQL
+    (PyMySQL) el driver recibe todas las filas antes de entregar la primera.
+    permisos_exportacion reemplaza los permisos del ViewSet en /exportar/.
+    """
+    tamano_lote_exportacion = 2000
+    permisos_exportacion = None
+
+    def get_permissions(self):
+        if self.action == 'exportar' and self.permisos_exportacion is not None:
+            return [permiso() for permiso in self.permisos_exportacion]
+        return super().get_permissions()
+
+    @action(detail=False, methods=['get'], url_path='exportar')
+    def exportar(self, request):
+        queryset = self.filter_queryset(self.get_queryset()).order_by('pk')
+        # Un solo serializer para todas las filas: sus campos se construyen una vez
+        serializer = self.get_serializer()
+        filas = (
+            serializer.to_representation(objeto)
+            for objeto in queryset.iterator(chunk_size=self.tamano_lote_exportacion)
+        )
+        return StreamingHttpResponse(transmitir_json(filas), content_type='application/json')
+
+
+class LecturaRapidaMixin:
+    """
+    Listas leídas con .values() y armadas con un plan compilado del serializer
+    (main/lectura_rapida.py), sin instanciarlo por fila; el JSON es el mismo.
+    Si el serializer pedido no se puede compilar (ej. con ?expand=) se usa el normal.
+    """
+
+    def list(self, request, *args, **kwargs):
+        plan = lectura_rapida.compilar(self.get_serializer(), self.queryset.model)
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # El cursor lee su posición del campo de orden de la última fila
+        orden = [campo.lstrip('-') for campo in queryset.query.order_by]
+        queryset = queryset.prefetch_related(None).values(*dict.fromkeys([*plan.columnas, *orden]))
+        pagina = self.paginate_queryset(queryset)
+        if pagina is not None:
+            return self.get_paginated_response([plan.armar(fila) for fila in pagina])
+        return Response([plan.armar(fila) for fila in queryset])
+
+
+class TutorViewSet(CacheHTTPMixin, ExportacionMixin, LecturaRapidaMixin, ConsultaOptimizadaMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = Tutor.objects.all()
     serializer_class = TutorSerializer
+    relaciones_select = ('usuario',)
+    # Cambian poco: el navegador puede reutilizarlos un minuto sin revalidar
+    politica_cache = {'private': True, 'max_age': 60}
+    prefetch_expandibles = {
+        'sesiones': ('sesiones_como_tutor',),
+        'sesiones.mensajes': ('sesiones_como_tutor__mensajes',),
+    }
+    filtros = {'usuario': 'usuario'}
+    campos_orden = ('id',)
+    max_consultas = 6
 
     def get_queryset(self):
-        queryset = Tutor.objects.all()
+        queryset = super().get_queryset()
         nombre = self.request.query_params.get('nombre', None)
         especialidad = self.request.query_params.get('especialidad', None)
         
@@ -20,18 +440,107 @@ class TutorViewSet(viewsets.ModelViewSet):
         
         return queryset
     
-class MensajeViewSet(viewsets.ModelViewSet):
+class MensajeViewSet(CacheHTTPMixin, ExportacionMixin, EscrituraMasivaMixin, ConsultaOptimizadaMixin, viewsets.ModelViewSet):
     queryset = Mensaje.objects.all()
     serializer_class = MensajeSerializer
+    ambito_limite = 'api_mensajes'
+    filtros = {'sesion': 'sesion', 'remitente': 'remitente'}
+    campos_orden = ('id',)
+    max_consultas = 4
+    propietario = ('remitente',)
+    campos_propietario = ('remitente',)
+    relaciones_propietario = {'sesion': ('tutorado', 'tutor__usuario')}
+    # Todos los mensajes de todas las sesiones: solo administradores
+    permisos_exportacion = (IsAdminUser,)
 
-class RecursoEducativoViewSet(viewsets.ModelViewSet):
+class RecursoEducativoViewSet(CacheHTTPMixin, ExportacionMixin, EscrituraMasivaMixin, ConsultaOptimizadaMixin, viewsets.ModelViewSet):
     queryset = RecursoEducativo.objects.all()
     serializer_class = RecursoEducativoSerializer
+    politica_cache = {'private': True, 'max_age': 60}
+    filtros = {'tutor': 'tutor', 'asignatura': 'asignatura'}
+    campos_orden = ('id',)
+    max_consultas = 4
+    propietario = ('tutor__usuario',)
+    relaciones_propietario = {'tutor': ('usuario',)}
 
-class SesionTutoriaViewSet(viewsets.ModelViewSet):
+class SesionTutoriaViewSet(CacheHTTPMixin, ExportacionMixin, LecturaRapidaMixin, EscrituraMasivaMixin, ConsultaOptimizadaMixin, viewsets.ModelViewSet):
     queryset = SesionTutoria.objects.all()
     serializer_class = SesionTutoriaSerializer
+    prefetch_expandibles = {
+        'mensajes': ('mensajes',),
+    }
+    filtros = {
+        'estado': 'estado',
+        'tutor': 'tutor',
+        'tutorado': 'tutorado',
+        'asignatura': 'asignatura',
+        'desde': 'fecha_programada__gte',
+        'hasta': 'fecha_programada__lt',
+    }
+    campos_orden = ('fecha_programada', 'id')
+    ordering = ('-fecha_programada',)
+    max_consultas = 5
+    propietario = ('tutorado', 'tutor__usuario')
+    campos_propietario = ('tutorado',)
+    # Los cambios de estado pasan por main/transiciones.py
+    campos_no_masivos = ('estado',)
+
+    def perform_update(self, serializer):
+        """
+        Un cambio de estado en PUT/PATCH se aplica con la transición que corresponde
+        (UPDATE condicional y evento en el historial, main/eventos.py), junto con
+        los demás campos del request; un cambio sin transición responde 400.
+        """
+        sesion = serializer.instance
+        estado = serializer.validated_data.pop('estado', sesion.estado)
+        if estado == sesion.estado:
+            serializer.save()
+            return
+        nombre = transiciones.transicion_hacia(sesion.estado, estado)
+        if nombre is None:
+            raise ValidationError({'estado': [f'Una sesión {sesion.estado} no puede pasar a {estado}']})
+        # Los campos propios del request quedan en los datos del evento (ej. razon_rechazo)
+        campos = {
+            campo: valor for campo, valor in serializer.validated_data.items()
+            if not SesionTutoria._meta.get_field(campo).is_relation
+        }
+        with transaction.atomic():
+            if not transiciones.transicionar(sesion, nombre, **campos):
+                raise ValidationError({'estado': ['La sesión cambió de estado; vuelve a cargarla']})
+            serializer.save()
 
-class UsuarioViewSet(viewsets.ModelViewSet):
+class UsuarioViewSet(CacheHTTPMixin, ExportacionMixin, ConsultaOptimizadaMixin, viewsets.ModelViewSet):
     queryset = Usuario.objects.all()
-    serializer_class = UsuarioSerializer
\ No newline at end of file
+    serializer_class = UsuarioSerializer
+    filtros = {'rut': 'rut'}
+    campos_orden = ('id',)
+    max_consultas = 4
+    permisos_exportacion = (IsAdminUser,)
+
+
+class SincronizacionView(APIView):
+    """
+    GET /api/sync/?since=<token>: sesiones, mensajes y notificaciones del usuario
+    creados, modificados o eliminados desde el token. Ver main/sincronizacion.py.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            datos = sincronizacion.sincronizar(request.user, request.query_params.get('since') or None)
+        except sincronizacion.TokenInvalido:
+            raise ValidationError({'since': ['Token de sincronización inválido']})
+        return Response(datos)
+
+
+class DashboardView(APIView):
+    """
+    GET /api/dashboard/: próximas sesiones, solicitudes pendientes, contadores y
+    tutores destacados del usuario en una sola respuesta. Ver main/resumen.py.
+    """
+    permission_classes = [IsAuthenticated]
+    # Las 3 fijas de cada request autenticado (sesión, usuario y versiones) y las 3 del resumen
+    max_consultas = 6
+
+    def get(self, request):
+        return Response(resumen.obtener(request.user))
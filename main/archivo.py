@@ -0,0 +1,95 @@
+"""
+Archivo histórico de sesiones.
+
+Las sesiones programadas antes del inicio del semestre de hace
+ARCHIVO_SEMESTRES semestres se mueven, con sus mensajes y notificaciones, a
+las tablas SesionArchivada, MensajeArchivado y NotificacionArchivada
+(python manage.py archivar_sesiones). Así SesionTutoria, Mensaje y
+Notificacion solo guardan los semestres recientes y los filtros de las
+vistas, el admin y la API recorren tablas chicas.
+
+Las lecturas usan el archivo solo cuando se pide explícitamente
+(historial(..., incluir_archivo=True), ?archivo=1 en las vistas): las
+consultas de siempre no lo tocan.
+
+Semestres: enero-junio y julio-diciembre, en la zona horaria del proyecto.
+"""
+import heapq
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import versiones
+from .models import (Mensaje, MensajeArchivado, Notificacion, NotificacionArchivada, SesionArchivada,
+                     SesionTutoria)
+
+# (nombre, modelo en uso, modelo del archivo, campo que lo une a la sesión), en el orden en que se copian
+TABLAS = (
+    ('sesiones', SesionTutoria, SesionArchivada, 'pk'),
+    ('mensajes', Mensaje, MensajeArchivado, 'sesion_id'),
+    ('notificaciones', Notificacion, NotificacionArchivada, 'sesion_id'),
+)
+
+
+def inicio_semestre(atras=0, fecha=None):
+    """Inicio del semestre de fecha (ahora por defecto), retrocediendo `atras` semestres"""
+    fecha = timezone.localtime(fecha)
+    indice = fecha.year * 2 + (fecha.month - 1) // 6 - atras
+    anio, mitad = divmod(indice, 2)
+    return timezone.make_aware(datetime(anio, 1 + 6 * mitad, 1))
+
+
+def corte(semestres=None):
+    """Las sesiones programadas antes de esta fecha se archivan"""
+    return inicio_semestre(settings.ARCHIVO_SEMESTRES if semestres is None else semestres)
+
+
+def archivar_lote(fecha_corte, lote):
+    """
+    Mueve al archivo hasta `lote` sesiones anteriores a fecha_corte con sus mensajes y
+    notificaciones, en una transacción. Retorna {nombre: filas movidas}; vacío si no quedan.
+    """
+    with transaction.atomic():
+        ids = list(
+            SesionTutoria.objects.select_for_update()
+            .filter(fecha_programada__lt=fecha_corte)
+            .order_by('fecha_programada', 'pk')
+            .values_list('pk', flat=True)[:lote]
+        )
+        if not ids:
+            return {}
+
+        ahora = timezone.now()
+        movidas = {}
+        for nombre, modelo, archivo, campo in TABLAS:
+            columnas = [f.attname for f in modelo._meta.concrete_fields]
+            filas = modelo.objects.filter(**{f'{campo}__in': ids}).values(*columnas)
+            extra = {'fecha_archivado': ahora} if archivo is SesionArchivada else {}
+            archivo.objects.bulk_create([archivo(**fila, **extra) for fila in filas])
+            movidas[nombre] = len(filas)
+
+        # Sin delete() del ORM: cargaría cada fila para enviar post_delete, que registraría
+        # una versión por fila y una eliminación para /api/sync/ (archivar no es eliminar)
+        for _, modelo, _, campo in reversed(TABLAS):
+            consulta = modelo.objects.filter(**{f'{campo}__in': ids})
+            consulta._raw_delete(consulta.db)
+        versiones.incrementar(*(modelo for _, modelo, _, _ in TABLAS))
+    return movidas
+
+
+def historial(condicion, incluir_archivo=False, orden='-fecha_programada', relacionados=()):
+    """
+    Sesiones que cumplen condicion (un Q sobre los campos de SesionTutoria), de la
+    tabla en uso y, con incluir_archivo, también del archivo, intercaladas según orden.
+    Sin archivo retorna el queryset; con archivo, una lista.
+    """
+    sesiones = SesionTutoria.objects.filter(condicion).select_related(*relacionados).order_by(orden, 'pk')
+    if not incluir_archivo:
+        return sesiones
+    archivadas = SesionArchivada.objects.filter(condicion).select_related(*relacionados).order_by(orden, 'pk')
+    campo = orden.lstrip('-')
+    return list(heapq.merge(
+        sesiones, archivadas, key=lambda sesion: getattr(sesion, campo), reverse=orden.startswith('-'),
+    ))
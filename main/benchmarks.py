@@ -0,0 +1,547 @@
+"""
+Escenarios de benchmark ejecutables con: python manage.py benchmark <escenario>
+
+Cada escenario es una función registrada con @escenario que recibe las
+opciones del comando y retorna una lista de (descripción, valor) a reportar.
+"""
+import asyncio
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.cache import caches
+from django.test.utils import override_settings
+
+ESCENARIOS = {}
+
+
+def escenario(nombre):
+    def registrar(funcion):
+        ESCENARIOS[nombre] = funcion
+        return funcion
+    return registrar
+
+
+# ============================================
+# SERVIDOR STUB DE OPEN LIBRARY
+# ============================================
+class _ServidorStub(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512  # Acepta ráfagas de conexiones simultáneas
+
+    def handle_error(self, request, client_address):
+        # El cliente cortó la conexión por timeout: esperado en las pruebas de latencia
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _StubOpenLibrary(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        servidor = self.server
+        with servidor.lock:
+            servidor.llamadas += 1
+            status = servidor.fallos.pop(0) if servidor.fallos else 200
+        time.sleep(servidor.latencia)
+        if status != 200:
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps({
+            'numFound': 1,
+            'docs': [{
+                'title': 'Cálculo Diferencial',
+                'author_name': ['Autor Stub'],
+                'first_publish_year': 2001,
+                'subject': ['Matemáticas'],
+                'key': '/works/OL1W',
+                'cover_i': 1,
+            }],
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def servidor_stub_openlibrary(latencia=0.2):
+    """
+    Levanta un servidor local que imita search.json y cuenta las llamadas recibidas.
+    Los status agregados a servidor.fallos se responden, en orden, antes de volver a 200.
+    """
+    servidor = _ServidorStub(('127.0.0.1', 0), _StubOpenLibrary)
+    servidor.latencia = latencia
+    servidor.fallos = []
+    servidor.llamadas = 0
+    servidor.lock = threading.Lock()
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    try:
+        yield servidor
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+@contextmanager
+def openlibrary_apuntando_a(servidor, **ajustes):
+    """Redirige el cliente de Open Library al servidor stub con cachés vacías"""
+    from django.conf import settings
+    from . import cliente_http
+
+    url = f'http://127.0.0.1:{servidor.server_port}'
+    clientes = {**settings.CLIENTES_HTTP, 'openlibrary': {**settings.CLIENTES_HTTP['openlibrary'], 'base_url': url}}
+    with override_settings(OPENLIBRARY_URL=url, CLIENTES_HTTP=clientes, **ajustes):
+        for clave in ('openlibrary', 'openlibrary:async'):
+            cliente_http._clientes.pop(clave, None)
+        caches['openlibrary'].clear()
+        caches['default'].clear()
+        try:
+            yield
+        finally:
+            for clave in ('openlibrary', 'openlibrary:async'):
+                cliente_http._clientes.pop(clave, None)
+
+
+# ============================================
+# ESCENARIOS
+# ============================================
+@escenario('proxy_coalescencia')
+def benchmark_proxy_coalescencia(concurrencia=50, **opciones):
+    """
+    Llamadas a la API con búsquedas idénticas simultáneas, con y sin coalescencia.
+    Lanza `concurrencia` búsquedas a la vez contra el stub local.
+    """
+    from . import openlibrary
+
+    resultados = []
+    with servidor_stub_openlibrary(latencia=0.2) as servidor:
+        for coalescer in (False, True):
+            with openlibrary_apuntando_a(servidor, OPENLIBRARY_COALESCER=coalescer):
+                servidor.llamadas = 0
+                barrera = threading.Barrier(concurrencia)
+
+                def buscar(_):
+                    barrera.wait()
+                    return openlibrary.buscar_libros('cálculo', 10)
+
+                inicio = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+                    list(executor.map(buscar, range(concurrencia)))
+                duracion = time.perf_counter() - inicio
+
+                modo = 'con coalescencia' if coalescer else 'sin coalescencia'
+                resultados.append((f'{modo}: llamadas a la API', servidor.llamadas))
+                resultados.append((f'{modo}: tiempo total (s)', round(duracion, 3)))
+
+    return resultados
+
+
+@escenario('proxy_async')
+def benchmark_proxy_async(concurrencia=50, workers=4, **opciones):
+    """
+    Búsquedas distintas contra el stub a través de las URLs reales del proxy, con
+    toda la cadena de middleware: workers sync (gunicorn) vs un solo event loop.
+    El modo sync atiende `workers` requests a la vez con el Client de Django (WSGI),
+    como los workers de gunicorn; el modo async mantiene los `concurrencia` requests
+    en curso en un solo proceso con el AsyncClient (ASGI).
+    Corre sobre una base de datos de prueba sembrada (ver main/rendimiento.py).
+    """
+    from asgiref.sync import ThreadSensitiveContext
+    from django.conf import settings
+    from django.test import AsyncClient, Client
+    from django.urls import reverse
+
+    from .rendimiento import base_de_datos_temporal, sembrar_datos
+
+    consultas = [f'tema {n}' for n in range(concurrencia)]
+    resultados = []
+    ajustes = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'], 'LIMITES_ACTIVOS': False}
+    with override_settings(**ajustes), base_de_datos_temporal():
+        estudiante = sembrar_datos()['estudiante']
+        with servidor_stub_openlibrary(latencia=0.5) as servidor:
+            with openlibrary_apuntando_a(servidor):
+                url = reverse('proxy_openlibrary')
+                local = threading.local()
+
+                def buscar_sync(query):
+                    if not hasattr(local, 'cliente'):
+                        local.cliente = Client()
+                        local.cliente.force_login(estudiante)
+                    return local.cliente.get(url, {'q': query}).status_code
+
+                inicio = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    estados_sync = list(executor.map(buscar_sync, consultas))
+                duracion_sync = time.perf_counter() - inicio
+
+            with openlibrary_apuntando_a(servidor):
+                url = reverse('proxy_openlibrary_async')
+                cliente = AsyncClient()
+                cliente.force_login(estudiante)
+
+                async def buscar_async(query):
+                    # Como ASGIHandler: el código sync de cada request corre en su propio hilo
+                    async with ThreadSensitiveContext():
+                        return (await cliente.get(url, {'q': query})).status_code
+
+                async def buscar_todas():
+                    # Un request previo deja la sesión al día: los concurrentes no la vuelven a escribir
+                    await buscar_async('calentamiento')
+                    inicio = time.perf_counter()
+                    estados = await asyncio.gather(*(buscar_async(query) for query in consultas))
+                    return estados, time.perf_counter() - inicio
+
+                estados_async, duracion_async = asyncio.run(buscar_todas())
+
+    resultados.append((f'sync ({workers} workers): tiempo total (s)', round(duracion_sync, 3)))
+    resultados.append((f'sync ({workers} workers): búsquedas/s', round(concurrencia / duracion_sync, 1)))
+    resultados.append(('async (1 proceso): tiempo total (s)', round(duracion_async, 3)))
+    resultados.append(('async (1 proceso): búsquedas/s', round(concurrencia / duracion_async, 1)))
+    resultados.append(('respuestas 200 (sync / async)', f'{estados_sync.count(200)} / {estados_async.count(200)}'))
+    return resultados
+
+
+@escenario('api_bulk')
+def benchmark_api_bulk(cantidad=500, **opciones):
+    """
+    Creación de `cantidad` mensajes por la API: un POST por objeto vs un POST a /bulk/.
+    Corre sobre una base de datos de prueba sembrada (ver main/rendimiento.py).
+    """
+    from django.conf import settings
+    from django.test import Client
+
+    from .models import Mensaje, SesionTutoria
+    from .rendimiento import base_de_datos_temporal, medir, sembrar_datos
+
+    resultados = []
+    ajustes = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'], 'LIMITES_ACTIVOS': False}
+    with override_settings(**ajustes), base_de_datos_temporal():
+        usuarios = sembrar_datos()
+        cliente = Client()
+        cliente.force_login(usuarios['admin'])
+        sesiones = list(SesionTutoria.objects.values_list('id', 'tutorado_id')[:50])
+        items = []
+        for n in range(cantidad):
+            sesion, remitente = sesiones[n % len(sesiones)]
+            items.append({'sesion': sesion, 'remitente': remitente, 'mensaje': f'Mensaje importado {n}'})
+
+        consultas_total = 0
+        inicio = time.perf_counter()
+        for item in items:
+            _, consultas, _ = medir(cliente, '/api/mensajes/', 'post', data=item, content_type='application/json')
+            consultas_total += consultas
+        duracion_individual = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        response, consultas_bulk, _ = medir(
+            cliente, '/api/mensajes/bulk/', 'post', data=items, content_type='application/json'
+        )
+        duracion_bulk = time.perf_counter() - inicio
+        if response.status_code != 201:
+            raise RuntimeError(f'/bulk/ respondió {response.status_code}: {response.content[:200]}')
+
+        resultados.append(('mensajes creados', Mensaje.objects.filter(mensaje__startswith='Mensaje importado').count()))
+        resultados.append(('un POST por objeto: tiempo total (s)', round(duracion_individual, 3)))
+        resultados.append(('un POST por objeto: objetos/s', round(cantidad / duracion_individual, 1)))
+        resultados.append(('un POST por objeto: consultas', consultas_total))
+        resultados.append(('/bulk/: tiempo total (s)', round(duracion_bulk, 3)))
+        resultados.append(('/bulk/: objetos/s', round(cantidad / duracion_bulk, 1)))
+        resultados.append(('/bulk/: consultas', consultas_bulk))
+    return resultados
+
+
+@escenario('api_exportar')
+def benchmark_api_exportar(cantidad=500, **opciones):
+    """
+    Exportación de `cantidad` mensajes: lista serializada y codificada de una vez vs /exportar/.
+    Reporta el pico de memoria de Python de cada modo (tracemalloc).
+    """
+    from django.conf import settings
+    from django.test import Client
+    from rest_framework.renderers import JSONRenderer
+
+    from .models import Mensaje, SesionTutoria
+    from .rendimiento import base_de_datos_temporal, sembrar_datos
+    from .serializers import MensajeSerializer
+
+    resultados = []
+    ajustes = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'], 'LIMITES_ACTIVOS': False}
+    with override_settings(**ajustes), base_de_datos_temporal():
+        usuarios = sembrar_datos(mensajes_por_sesion=0)
+        cliente = Client()
+        cliente.force_login(usuarios['admin'])
+        sesiones = list(SesionTutoria.objects.values_list('id', 'tutorado_id'))
+        Mensaje.objects.bulk_create(
+            (Mensaje(sesion_id=sesiones[n % len(sesiones)][0], remitente_id=sesiones[n % len(sesiones)][1],
+                     mensaje=f'Mensaje exportado {n}') for n in range(cantidad)),
+            batch_size=5000,
+        )
+
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        cuerpo = JSONRenderer().render(MensajeSerializer(Mensaje.objects.all(), many=True).data)
+        duracion_lista = time.perf_counter() - inicio
+        pico_lista = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        bytes_lista = len(cuerpo)
+        del cuerpo
+
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        response = cliente.get('/api/mensajes/exportar/')
+        bytes_exportados = sum(len(bloque) for bloque in response.streaming_content)
+        duracion_exportar = time.perf_counter() - inicio
+        pico_exportar = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        resultados.append(('lista completa: tiempo (s)', round(duracion_lista, 3)))
+        resultados.append(('lista completa: pico de memoria (MB)', round(pico_lista / 2 ** 20, 1)))
+        resultados.append(('lista completa: bytes', bytes_lista))
+        resultados.append(('/exportar/: tiempo (s)', round(duracion_exportar, 3)))
+        resultados.append(('/exportar/: pico de memoria (MB)', round(pico_exportar / 2 ** 20, 1)))
+        resultados.append(('/exportar/: bytes', bytes_exportados))
+    return resultados
+
+
+@escenario('api_lectura_rapida')
+def benchmark_api_lectura_rapida(cantidad=500, **opciones):
+    """
+    Filas/s de TutorSerializer y SesionTutoriaSerializer vs la lectura rápida con .values().
+    Incluye la consulta; verifica que ambos JSON sean idénticos.
+    """
+    from . import lectura_rapida
+    from .models import SesionTutoria, Tutor
+    from .rendimiento import base_de_datos_temporal, sembrar_datos
+    from .renderers import JSONRapidoRenderer
+    from .serializers import SesionTutoriaSerializer, TutorSerializer
+
+    def mejor_de(repeticiones, funcion):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            datos = funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        return min(tiempos), datos
+
+    context = {'fields': frozenset(), 'expand': frozenset()}
+    casos = (
+        (TutorSerializer, Tutor.objects.select_related('usuario')),
+        (SesionTutoriaSerializer, SesionTutoria.objects.all()),
+    )
+    renderer = JSONRapidoRenderer()
+    resultados = []
+    with base_de_datos_temporal():
+        # ~cantidad tutores (con su usuario) y 15 sesiones por tutor
+        sembrar_datos(tutores=cantidad, estudiantes=50, mensajes_por_sesion=0, recursos_por_tutor=0)
+        for serializer_class, queryset in casos:
+            plan = lectura_rapida.compilar(serializer_class(context=context), queryset.model)
+            filas = queryset.count()
+            tiempo_serializer, datos_serializer = mejor_de(
+                3, lambda: serializer_class(queryset.all(), many=True, context=context).data
+            )
+            tiempo_rapido, datos_rapidos = mejor_de(
+                3, lambda: [plan.armar(fila) for fila in queryset.values(*plan.columnas)]
+            )
+            if renderer.render(datos_serializer) != renderer.render(datos_rapidos):
+                raise RuntimeError(f'{serializer_class.__name__}: la lectura rápida no produce el mismo JSON')
+
+            nombre = serializer_class.__name__
+            resultados.append((f'{nombre}: filas', filas))
+            resultados.append((f'{nombre}: filas/s', round(filas / tiempo_serializer)))
+            resultados.append((f'{nombre} lectura rápida: filas/s', round(filas / tiempo_rapido)))
+            resultados.append((f'{nombre}: aceleración', f'{tiempo_serializer / tiempo_rapido:.1f}x'))
+    return resultados
+
+
+@escenario('limites')
+def benchmark_limites(cantidad=500, **opciones):
+    """
+    Costo del límite de requests (main/limites.py): por consulta al bucket y por request a la API.
+    Con la caché configurada en LIMITES_CACHE (LocMemCache o Redis).
+    """
+    from django.conf import settings
+    from django.test import Client
+
+    from . import limites
+    from .rendimiento import base_de_datos_temporal, sembrar_datos
+
+    resultados = []
+    holgados = {ambito: {'tasa': '1000000/s', 'rafaga': 1000000} for ambito in settings.LIMITES_TASA}
+    with override_settings(LIMITES_ACTIVOS=True, LIMITES_TASA=holgados):
+        for descripcion, identidad in (('mismo usuario', lambda n: 'u1'), ('usuarios distintos', lambda n: f'u{n}')):
+            inicio = time.perf_counter()
+            for n in range(cantidad):
+                limites.consumir('api', identidad(n))
+            duracion = time.perf_counter() - inicio
+            resultados.append((f'consumir() {descripcion}: µs por llamada', round(duracion / cantidad * 1e6, 1)))
+
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), base_de_datos_temporal():
+        usuarios = sembrar_datos()
+        cliente = Client()
+        cliente.force_login(usuarios['admin'])
+        for activos in (False, True):
+            with override_settings(LIMITES_ACTIVOS=activos, LIMITES_TASA=holgados):
+                cliente.get('/api/tutores/?fields=id')  # Calentamiento
+                inicio = time.perf_counter()
+                for _ in range(cantidad):
+                    cliente.get('/api/tutores/?fields=id')
+                duracion = time.perf_counter() - inicio
+            modo = 'con límite' if activos else 'sin límite'
+            resultados.append((f'GET /api/tutores/ {modo}: ms por request', round(duracion / cantidad * 1000, 3)))
+    return resultados
+
+
+@contextmanager
+def motor_base_de_datos(engine, conn_max_age):
+    """Cambia el backend y CONN_MAX_AGE de 'default' para los hilos que se creen dentro"""
+    from django.db import connections
+
+    ajustes = connections.settings['default']
+    originales = ajustes['ENGINE'], ajustes['CONN_MAX_AGE']
+    connections['default'].close()
+    ajustes['ENGINE'], ajustes['CONN_MAX_AGE'] = engine, conn_max_age
+    del connections['default']  # El wrapper se vuelve a crear con el nuevo backend
+    try:
+        yield
+    finally:
+        connections['default'].close()
+        ajustes['ENGINE'], ajustes['CONN_MAX_AGE'] = originales
+        del connections['default']
+
+
+@escenario('conexiones_mysql')
+def benchmark_conexiones_mysql(cantidad=500, concurrencia=50, **opciones):
+    """
+    Requests/s a la API con MySQL: una conexión nueva por request, conexiones persistentes y el pool.
+    `concurrencia` hilos reparten `cantidad` requests; requiere DATABASE_URL=mysql://...
+    """
+    from django.conf import settings
+    from django.db import close_old_connections, connection, connections
+    from django.test import Client
+
+    from .pool_mysql.base import pool_de
+    from .rendimiento import base_de_datos_temporal, sembrar_datos
+
+    if connection.vendor != 'mysql':
+        raise RuntimeError('El escenario mide conexiones a MySQL: correr con DATABASE_URL=mysql://...')
+
+    modos = (
+        ('conexión por request', 'django.db.backends.mysql', 0),
+        ('persistentes (CONN_MAX_AGE)', 'django.db.backends.mysql', settings.DB_CONN_MAX_AGE),
+        (f"pool ({settings.DB_POOL_OPCIONES['TAMANO']} conexiones)", 'main.pool_mysql', 0),
+    )
+    resultados = []
+    with override_settings(LIMITES_ACTIVOS=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), \
+            base_de_datos_temporal():
+        usuario = sembrar_datos()['estudiante']
+        for descripcion, engine, conn_max_age in modos:
+            with motor_base_de_datos(engine, conn_max_age):
+                barrera = threading.Barrier(concurrencia)
+
+                def cliente(n):
+                    c = Client()
+                    c.force_login(usuario)
+                    close_old_connections()
+                    barrera.wait()
+                    for _ in range(n):
+                        c.get('/api/tutores/?fields=id')
+                        # Lo que hace el servidor al terminar cada request (el cliente de test no lo hace)
+                        close_old_connections()
+                    connections.close_all()
+
+                por_hilo = [cantidad // concurrencia + (1 if n < cantidad % concurrencia else 0) for n in range(concurrencia)]
+                inicio = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+                    list(executor.map(cliente, por_hilo))
+                duracion = time.perf_counter() - inicio
+
+                resultados.append((f'{descripcion}: requests/s', round(cantidad / duracion, 1)))
+                pool = pool_de('default')
+                if engine == 'main.pool_mysql' and pool is not None:
+                    estado = pool.estado()
+                    resultados.append((f'{descripcion}: conexiones abiertas', estado['creadas']))
+                    resultados.append((f'{descripcion}: conexiones reutilizadas', estado['reutilizadas']))
+                    pool.cerrar_libres()
+    return resultados
+
+
+@escenario('sesiones')
+def benchmark_sesiones(cantidad=500, **opciones):
+    """
+    Escrituras de sesión por request autenticado con el guardado de la última actividad por
+    intervalos (SessionTimeoutMiddleware) frente al guardado en cada request, y el cierre por
+    inactividad: `cantidad` requests repartidos en el intervalo, luego inactividad justo bajo
+    y justo sobre SESION_INACTIVIDAD_MINUTOS.
+    """
+    from datetime import timedelta
+    from unittest import mock
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client
+    from django.utils import timezone
+
+    from .rendimiento import base_de_datos_temporal, sembrar_datos
+
+    modos = (
+        ('guardado en cada request', 'db', {'SESSION_SAVE_EVERY_REQUEST': True, 'SESION_ACTIVIDAD_GRANULARIDAD': 0}),
+        ('guardado por intervalos', 'db', {}),
+        ('guardado por intervalos, cached_db', 'cached_db', {}),
+        ('guardado por intervalos, cache', 'cache', {}),
+    )
+    url = '/api/tutores/?fields=id'
+    paso = timedelta(seconds=1)  # Un request por segundo: `cantidad` segundos de actividad
+    inactividad = timedelta(minutes=settings.SESION_INACTIVIDAD_MINUTOS)
+    resultados = []
+    with override_settings(LIMITES_ACTIVOS=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), \
+            base_de_datos_temporal():
+        usuario = sembrar_datos()['estudiante']
+        for descripcion, motor, ajustes in modos:
+            with override_settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{motor}', **ajustes):
+                reloj = {'ahora': timezone.now()}
+                escrituras = [0]
+
+                def contar(execute, sql, params, many, context):
+                    if sql.lstrip().upper().startswith(('UPDATE', 'INSERT')) and 'django_session' in sql:
+                        escrituras[0] += 1
+                    return execute(sql, params, many, context)
+
+                # Solo se adelanta el reloj del middleware: la sesión de Django vence en horas, no minutos
+                with mock.patch('main.middleware.timezone.now', lambda: reloj['ahora']):
+                    cliente = Client()
+                    cliente.force_login(usuario)
+                    cliente.get(url)  # Primer request: guarda la actividad
+                    with connection.execute_wrapper(contar):
+                        for _ in range(cantidad):
+                            reloj['ahora'] += paso
+                            cliente.get(url)
+                    resultados.append((
+                        f'{descripcion}: escrituras de sesión por request',
+                        round(escrituras[0] / cantidad, 3),
+                    ))
+
+                    # Inactividad justo bajo el límite (y ese request es actividad), luego justo sobre
+                    reloj['ahora'] += inactividad - paso
+                    sigue = cliente.get(url).status_code == 200
+                    reloj['ahora'] += inactividad + paso
+                    cerrada = cliente.get(url).status_code == 302
+                    resultados.append((
+                        f'{descripcion}: sigue activa 1 s antes y se cierra 1 s después del límite',
+                        'sí' if sigue and cerrada else 'no',
+                    ))
+    return resultados
@@ -0,0 +1,97 @@
+"""
+Catálogo local de Open Library.
+
+Los libros se importan desde los dumps de Open Library con el comando
+importar_openlibrary y se buscan por un índice invertido de palabras
+(TerminoCatalogo), de modo que cada búsqueda es un lookup por índice y no un
+LIKE '%...%' sobre toda la tabla.
+"""
+import re
+import unicodedata
+
+from django.db.models import Count, Q
+
+from .models import LibroCatalogo, TerminoCatalogo
+from .portadas import url_portada
+
+MAX_TERMINOS_POR_CAMPO = 40
+LARGO_MINIMO_TERMINO = 2
+LARGO_MAXIMO_TERMINO = 64
+
+# Todo lo que no es letra o dígito en cualquier alfabeto (también '_'): los títulos
+# en cirílico, griego, etc. y letras como ø o ł forman términos propios.
+# Al cambiar la tokenización: importar_openlibrary --reindexar
+_SEPARADORES = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def tokenizar(texto):
+    """Palabras normalizadas (minúsculas, sin tildes, cualquier alfabeto) sin repetir, en orden de aparición"""
+    texto = unicodedata.normalize('NFKD', str(texto).casefold())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    vistos = []
+    for termino in _SEPARADORES.split(texto):
+        if LARGO_MINIMO_TERMINO <= len(termino) <= LARGO_MAXIMO_TERMINO and termino not in vistos:
+            vistos.append(termino)
+    return vistos
+
+
+def terminos_de_libro(libro):
+    """Términos de índice de un libro como TerminoCatalogo sin guardar"""
+    campos = (
+        ('titulo', libro.titulo),
+        ('autor', libro.autor),
+        ('tema', ' '.join(libro.temas)),
+    )
+    terminos = []
+    for campo, texto in campos:
+        for termino in tokenizar(texto)[:MAX_TERMINOS_POR_CAMPO]:
+            terminos.append(TerminoCatalogo(libro_id=libro.id, campo=campo, termino=termino))
+    return terminos
+
+
+def formatear_libro(libro):
+    """Mismo formato que entrega el proxy para los resultados de Open Library"""
+    return {
+        'title': libro.titulo or 'Sin título',
+        'author': libro.autor or 'Autor desconocido',
+        'year': libro.anio if libro.anio is not None else 'N/A',
+        'subjects': libro.temas[:3],  # Primeros 3 temas
+        'isbn': libro.isbn or 'N/A',
+        'pages': libro.paginas if libro.paginas is not None else 'N/A',
+        'url': f'https://openlibrary.org{libro.clave}',
+        'cover_url': url_portada(libro.portada_id)
+    }
+
+
+def buscar_en_catalogo(query, limite):
+    """
+    Busca libros que contengan todas las palabras de la consulta en su título,
+    autor o temas. Primero los que tienen más coincidencias en el título.
+    Retorna {'total_results', 'books'} igual que openlibrary.consultar_openlibrary.
+    """
+    terminos = tokenizar(query)
+    if not terminos:
+        return {'total_results': 0, 'books': []}
+
+    coincidencias = (
+        TerminoCatalogo.objects
+        .filter(termino__in=terminos)
+        .values('libro_id')
+        .annotate(
+            encontrados=Count('termino', distinct=True),
+            en_titulo=Count('id', filter=Q(campo='titulo')),
+        )
+        .filter(encontrados=len(terminos))
+    )
+
+    total = coincidencias.count()
+    ids = [
+        fila['libro_id']
+        for fila in coincidencias.order_by('-en_titulo', 'libro_id')[:limite]
+    ]
+    libros = LibroCatalogo.objects.in_bulk(ids)
+
+    return {
+        'total_results': total,
+        'books': [formatear_libro(libros[libro_id]) for libro_id in ids if libro_id in libros]
+    }
@@ -0,0 +1,345 @@
+"""
+Cliente HTTP compartido para todas las integraciones externas.
+
+Cada servicio externo tiene un ClienteHTTP propio (ver obtener_cliente) con:
+- Sesión de requests con pool de conexiones keep-alive
+- Concurrencia acotada por un semáforo
+- Reintentos con backoff exponencial y jitter completo para métodos idempotentes
+- Circuit breaker que falla rápido mientras el servicio está caído
+
+ClienteHTTPAsync (ver obtener_cliente_async) ofrece lo mismo sobre httpx para
+las vistas async servidas por ASGI.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+METODOS_IDEMPOTENTES = ('GET', 'HEAD', 'OPTIONS')
+
+# Status que indican una falla transitoria del servicio y justifican reintentar
+STATUS_REINTENTABLES = (429, 502, 503, 504)
+
+CONFIGURACION_POR_DEFECTO = {
+    'base_url': '',
+    'timeout': 10,  # segundos
+    'reintentos': 2,
+    'backoff_base': 0.2,  # segundos
+    'backoff_max': 2.0,  # segundos
+    'max_concurrencia': 20,
+    'max_concurrencia_async': 200,  # Llamadas en curso por event loop en el cliente async
+    'espera_concurrencia': 5,  # segundos esperando un cupo antes de rendirse
+    'pool_maxsize': 20,
+    'umbral_fallos': 5,  # fallas consecutivas que abren el circuito
+    'tiempo_reapertura': 30,  # segundos con el circuito abierto
+}
+
+
+class ErrorClienteHTTP(Exception):
+    """El servicio externo no respondió correctamente tras los reintentos"""
+
+
+class CircuitoAbierto(ErrorClienteHTTP):
+    """El circuito está abierto: no se intenta la llamada"""
+
+    def __init__(self, nombre, reintentar_en):
+        super().__init__(f'Servicio {nombre} no disponible temporalmente')
+        self.reintentar_en = reintentar_en
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker clásico: cerrado -> abierto tras N fallas consecutivas,
+    abierto -> semiabierto al cumplirse el tiempo de reapertura, y semiabierto
+    deja pasar una sola llamada de prueba que decide si vuelve a cerrarse.
+    """
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+
+    def __init__(self, umbral_fallos, tiempo_reapertura):
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_reapertura = tiempo_reapertura
+        self.estado = self.CERRADO
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        """
+        Retorna (reintentar_en, es_prueba): reintentar_en es 0 si la llamada puede hacerse,
+        o los segundos que faltan para reintentar; es_prueba indica si es la llamada de prueba
+        del circuito semiabierto, que debe terminar con registrar_exito, registrar_fallo o
+        liberar_prueba.
+        """
+        with self._lock:
+            if self.estado == self.CERRADO:
+                return 0, False
+
+            ahora = time.monotonic()
+            if self.estado == self.ABIERTO and ahora >= self.abierto_hasta:
+                self.estado = self.SEMIABIERTO
+                self._prueba_en_curso = False
+
+            if self.estado == self.SEMIABIERTO and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return 0, True
+
+            return max(self.abierto_hasta - ahora, 1), False
+
+    def registrar_exito(self):
+        with self._lock:
+            self.estado = self.CERRADO
+            self.fallos = 0
+            self._prueba_en_curso = False
+
+    def liberar_prueba(self):
+        """La llamada de prueba terminó sin decidir (una excepción no prevista): se permite otra"""
+        with self._lock:
+            if self.estado == self.SEMIABIERTO:
+                self._prueba_en_curso = False
+
+    def registrar_fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.estado == self.SEMIABIERTO or self.fallos >= self.umbral_fallos:
+                self.estado = self.ABIERTO
+                self.abierto_hasta = time.monotonic() + self.tiempo_reapertura
+                self._prueba_en_curso = False
+
+
+class _ClienteBase:
+    def __init__(self, nombre, **opciones):
+        config = {**CONFIGURACION_POR_DEFECTO, **opciones}
+        self.config = config
+        self.nombre = nombre
+        self.base_url = config['base_url'].rstrip('/')
+        self.timeout = config['timeout']
+        self.reintentos = config['reintentos']
+        self.backoff_base = config['backoff_base']
+        self.backoff_max = config['backoff_max']
+        self.espera_concurrencia = config['espera_concurrencia']
+        self.circuito = CircuitBreaker(config['umbral_fallos'], config['tiempo_reapertura'])
+
+    def _espera_backoff(self, intento):
+        # Full jitter: aleatorio entre 0 y el backoff exponencial acotado
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** intento)))
+
+    def _verificar_circuito(self):
+        """Lanza CircuitoAbierto si no se puede llamar; retorna si la llamada es la de prueba"""
+        reintentar_en, es_prueba = self.circuito.permitir()
+        if reintentar_en:
+            raise CircuitoAbierto(self.nombre, reintentar_en)
+        return es_prueba
+
+    def _intentos(self, metodo):
+        return self.reintentos + 1 if metodo in METODOS_IDEMPOTENTES else 1
+
+    @staticmethod
+    def _es_falla_transitoria(status_code):
+        return status_code in STATUS_REINTENTABLES or status_code >= 500
+
+
+class ClienteHTTP(_ClienteBase):
+    def __init__(self, nombre, **opciones):
+        super().__init__(nombre, **opciones)
+        config = self.config
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=config['pool_maxsize'],
+            pool_block=False,
+            max_retries=0,  # Los reintentos los maneja este cliente
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.semaforo = threading.BoundedSemaphore(config['max_concurrencia'])
+
+    def _enviar(self, metodo, url, **kwargs):
+        if not self.semaforo.acquire(timeout=self.espera_concurrencia):
+            raise ErrorClienteHTTP(f'Demasiadas llamadas simultáneas a {self.nombre}')
+        try:
+            return self.session.request(metodo, url, timeout=kwargs.pop('timeout', self.timeout), **kwargs)
+        finally:
+            self.semaforo.release()
+
+    def request(self, metodo, path, **kwargs):
+        """
+        Ejecuta la llamada y retorna el Response.
+        Los errores de red y los status 429/5xx transitorios se reintentan solo
+        en métodos idempotentes. Los 4xx se retornan tal cual al llamador.
+        """
+        metodo = metodo.upper()
+        es_prueba = self._verificar_circuito()
+        try:
+            return self._request(metodo, path, **kwargs)
+        finally:
+            if es_prueba:
+                # Sin efecto si la prueba ya registró su resultado
+                self.circuito.liberar_prueba()
+
+    def _request(self, metodo, path, **kwargs):
+        url = f'{self.base_url}{path}'
+        intentos = self._intentos(metodo)
+        error = None
+
+        for intento in range(intentos):
+            if intento:
+                time.sleep(self._espera_backoff(intento - 1))
+            try:
+                response = self._enviar(metodo, url, **dict(kwargs))
+            except requests.RequestException as e:
+                error = str(e)
+                logger.warning('%s %s falló (intento %s/%s): %s', metodo, url, intento + 1, intentos, e)
+                continue
+
+            if self._es_falla_transitoria(response.status_code):
+                error = f'Error en la API: {response.status_code}'
+                logger.warning('%s %s respondió %s (intento %s/%s)', metodo, url, response.status_code, intento + 1, intentos)
+                continue
+
+            self.circuito.registrar_exito()
+            return response
+
+        self.circuito.registrar_fallo()
+        raise ErrorClienteHTTP(error)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+
+class ClienteHTTPAsync(_ClienteBase):
+    """
+    Versión no bloqueante de ClienteHTTP sobre httpx.AsyncClient.
+    El AsyncClient y el semáforo quedan atados a un event loop, por eso se crea
+    un par por loop (bajo uvicorn hay uno solo por proceso). El AsyncClient se
+    cierra cuando termina su loop: bajo WSGI cada vista async corre en un loop
+    propio que termina con el request.
+    """
+
+    def __init__(self, nombre, **opciones):
+        if httpx is None:
+            raise ImproperlyConfigured('El cliente HTTP async requiere el paquete httpx')
+        super().__init__(nombre, **opciones)
+        self._por_loop = weakref.WeakKeyDictionary()
+
+    async def _recursos(self):
+        loop = asyncio.get_running_loop()
+        recursos = self._por_loop.get(loop)
+        if recursos is None:
+            limite = self.config['max_concurrencia_async']
+            cliente = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=limite, max_keepalive_connections=self.config['pool_maxsize']),
+            )
+            vida = _vida_del_loop(cliente)
+            await vida.__anext__()
+            recursos = self._por_loop[loop] = (cliente, asyncio.Semaphore(limite), vida)
+        return recursos
+
+    async def _enviar(self, metodo, url, **kwargs):
+        cliente, semaforo, _ = await self._recursos()
+        try:
+            await asyncio.wait_for(semaforo.acquire(), timeout=self.espera_concurrencia)
+        except asyncio.TimeoutError:
+            raise ErrorClienteHTTP(f'Demasiadas llamadas simultáneas a {self.nombre}')
+        try:
+            return await cliente.request(metodo, url, **kwargs)
+        finally:
+            semaforo.release()
+
+    async def request(self, metodo, path, **kwargs):
+        """Igual que ClienteHTTP.request, retornando un httpx.Response"""
+        metodo = metodo.upper()
+        es_prueba = self._verificar_circuito()
+        try:
+            return await self._request(metodo, path, **kwargs)
+        finally:
+            if es_prueba:
+                self.circuito.liberar_prueba()
+
+    async def _request(self, metodo, path, **kwargs):
+        url = f'{self.base_url}{path}'
+        intentos = self._intentos(metodo)
+        error = None
+
+        for intento in range(intentos):
+            if intento:
+                await asyncio.sleep(self._espera_backoff(intento - 1))
+            try:
+                response = await self._enviar(metodo, url, **dict(kwargs))
+            except httpx.HTTPError as e:
+                error = str(e) or e.__class__.__name__
+                logger.warning('%s %s falló (intento %s/%s): %s', metodo, url, intento + 1, intentos, error)
+                continue
+
+            if self._es_falla_transitoria(response.status_code):
+                error = f'Error en la API: {response.status_code}'
+                logger.warning('%s %s respondió %s (intento %s/%s)', metodo, url, response.status_code, intento + 1, intentos)
+                continue
+
+            self.circuito.registrar_exito()
+            return response
+
+        self.circuito.registrar_fallo()
+        raise ErrorClienteHTTP(error)
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+
+async def _vida_del_loop(cliente):
+    """
+    Generador async que cierra el cliente al terminar el event loop: asyncio.run
+    (y el loop que asgiref crea para cada vista async bajo WSGI) cierra los
+    generadores async pendientes con shutdown_asyncgens antes de cerrar el loop.
+    """
+    try:
+        yield
+    finally:
+        await cliente.aclose()
+
+
+_clientes = {}
+_clientes_lock = threading.Lock()
+
+
+def _obtener(clase, clave, nombre):
+    cliente = _clientes.get(clave)
+    if cliente is None:
+        with _clientes_lock:
+            cliente = _clientes.get(clave)
+            if cliente is None:
+                cliente = clase(nombre, **settings.CLIENTES_HTTP[nombre])
+                _clientes[clave] = cliente
+    return cliente
+
+
+def obtener_cliente(nombre):
+    """
+    Retorna el cliente compartido del servicio, creándolo la primera vez con la
+    configuración de settings.CLIENTES_HTTP[nombre].
+    """
+    return _obtener(ClienteHTTP, nombre, nombre)
+
+
+def obtener_cliente_async(nombre):
+    """Igual que obtener_cliente, para usar desde vistas async"""
+    return _obtener(ClienteHTTPAsync, f'{nombre}:async', nombre)
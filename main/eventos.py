@@ -0,0 +1,50 @@
+"""
+Historial de eventos de las sesiones (tabla EventoSesion, solo se agregan filas).
+
+Cada solicitud de sesión y cada transición de main/transiciones.py deja un
+evento con el estado anterior y el nuevo, en la misma transacción que el
+cambio: una transición masiva del admin escribe todos sus eventos con un solo
+INSERT. Con el historial se responden preguntas que el estado actual ya no
+sabe (cuánto tarda un tutor en aceptar) y se reconstruyen las proyecciones de
+main/proyecciones.py. Los receptores se conectan en main/signals.py.
+
+Los cambios de estado por PUT/PATCH de la API también pasan por las
+transiciones (/api/sesiones/bulk/ no acepta estado). Quedan fuera las sesiones
+creadas con /api/sesiones/bulk/, que no envían post_save.
+"""
+from .models import EventoSesion
+
+# Los demás campos escritos quedan en datos; estos ya tienen su columna
+CAMPOS_PROPIOS = ('estado', 'fecha_actualizacion')
+
+
+def registrar_solicitud(sender, instance, created, **kwargs):
+    # post_save de SesionTutoria
+    if not created:
+        return
+    EventoSesion.objects.create(
+        sesion_id=instance.pk,
+        tutor_id=instance.tutor_id,
+        tutorado_id=instance.tutorado_id,
+        tipo='solicitar',
+        estado_destino=instance.estado,
+        fecha=instance.fecha_creacion or instance.fecha_actualizacion,
+    )
+
+
+def registrar_transicion(sender, transicion, destino, sesiones, campos, **kwargs):
+    # sesion_transicion de main/transiciones.py
+    datos = {campo: valor for campo, valor in campos.items() if campo not in CAMPOS_PROPIOS}
+    EventoSesion.objects.bulk_create([
+        EventoSesion(
+            sesion_id=sesion['id'],
+            tutor_id=sesion['tutor_id'],
+            tutorado_id=sesion['tutorado_id'],
+            tipo=transicion,
+            estado_origen=sesion['estado'],
+            estado_destino=destino,
+            fecha=campos['fecha_actualizacion'],
+            datos=datos,
+        )
+        for sesion in sesiones
+    ])
@@ -0,0 +1,81 @@
+"""
+Filtros y orden declarativos para los viewsets de la API.
+
+Cada viewset declara los filtros que expone y los campos por los que se
+puede ordenar; todos deben estar respaldados por un índice (ver los índices
+de cada modelo en main/models.py). El comando verificar_planes corre EXPLAIN
+sobre cada filtro y orden expuesto y falla si alguno recorre la tabla completa.
+
+    filtros = {'estado': 'estado', 'desde': 'fecha_programada__gte'}
+    campos_orden = ('fecha_programada', 'id')
+    ordering = ('-fecha_programada',)  # Orden por defecto (también el del cursor)
+
+?estado=Pendiente,Aceptada filtra por cualquiera de los valores. Las fechas
+sin zona horaria (?desde=2024-05-01T10:00) se interpretan en la zona actual.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as ErrorDjango
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from .pagination import ORDEN
+
+
+def _campo_modelo(modelo, lookup):
+    """Campo del modelo al que apunta el lookup ('fecha_programada__gte' -> fecha_programada)"""
+    return modelo._meta.get_field(lookup.split('__')[0])
+
+
+class FiltroDeclarativo(BaseFilterBackend):
+    """Aplica los filtros del diccionario filtros del viewset: {parámetro: lookup}"""
+
+    def filter_queryset(self, request, queryset, view):
+        filtros = getattr(view, 'filtros', {})
+        condiciones = {}
+        errores = {}
+        for parametro, lookup in filtros.items():
+            valor = request.query_params.get(parametro)
+            if valor in (None, ''):
+                continue
+            campo = _campo_modelo(queryset.model, lookup)
+            exacto = '__' not in lookup
+            valores = valor.split(',') if exacto else [valor]
+            try:
+                valores = [campo.to_python(v.strip()) for v in valores]
+            except ErrorDjango as e:
+                errores[parametro] = e.messages
+                continue
+            if settings.USE_TZ:
+                valores = [
+                    timezone.make_aware(v) if isinstance(v, datetime) and timezone.is_naive(v) else v
+                    for v in valores
+                ]
+            if exacto and len(valores) > 1:
+                condiciones[f'{lookup}__in'] = valores
+            else:
+                condiciones[lookup] = valores[0]
+        if errores:
+            raise ValidationError(errores)
+        return queryset.filter(**condiciones) if condiciones else queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': parametro, 'required': False, 'in': 'query', 'schema': {'type': 'string'}}
+            for parametro in getattr(view, 'filtros', {})
+        ]
+
+
+class OrdenIndexado(OrderingFilter):
+    """
+    ?ordering= limitado a campos_orden del viewset (campos indexados), con el
+    orden por pk como respaldo cuando el viewset no declara ordering.
+    """
+
+    def get_valid_fields(self, queryset, view, context={}):
+        return [(campo, campo) for campo in getattr(view, 'campos_orden', ())]
+
+    def get_default_ordering(self, view):
+        return super().get_default_ordering(view) or ORDEN
@@ -44,7 +44,7 @@ class AgendarForm(forms.Form):
     modalidad = forms.ChoiceField(choices=[('Presencial', 'Presencial'), ('Online', 'Online')], required=True)
     tema_solicitud = forms.CharField(widget=forms.Textarea, required=True)
     asignatura = forms.ModelChoiceField(
-        queryset=Asignatura.objects.all(),
+        queryset=Asignatura.objects.select_related('carrera'),
         label="Asignatura",
         empty_label="Seleccione una asignatura",
         to_field_name="id"
@@ -83,6 +83,11 @@ class RecursoEducativoForm(forms.ModelForm):
             'contenido': forms.Textarea(attrs={'rows': 5}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Asignatura.__str__ usa la carrera: se trae en la misma consulta que las opciones
+        self.fields['asignatura'].queryset = Asignatura.objects.select_related('carrera')
+
 
 class DisponibilidadForm(forms.ModelForm):
     class Meta:
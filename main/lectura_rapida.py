@@ -0,0 +1,111 @@
+"""
+Lectura rápida para las listas más consultadas de la API.
+
+En vez de instanciar el serializer y recorrer sus campos por cada objeto, el
+serializer se "compila" una vez en un plan: qué columnas pedir con
+.values() y cómo convertir cada valor. Las filas se leen como diccionarios y
+se arman con el plan, con el mismo JSON que entrega el serializer.
+
+Solo se compilan los campos cuya conversión se conoce (columnas simples,
+claves foráneas como pk y serializers anidados por clave foránea). Si el
+serializer tiene otro tipo de campo (colecciones anidadas, SerializerMethodField,
+archivos...), compilar() retorna None y se usa el serializer normal.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+# Campos cuyo to_representation no cambia el valor leído de la base de datos
+CAMPOS_IDENTIDAD = (
+    serializers.IntegerField, serializers.BooleanField, serializers.CharField,
+    serializers.EmailField, serializers.SlugField, serializers.URLField, serializers.ChoiceField,
+)
+# Campos que se convierten con su propio to_representation (no dependen del request)
+CAMPOS_CONVERTIDOS = (
+    serializers.DateTimeField, serializers.DateField, serializers.TimeField,
+    serializers.DecimalField, serializers.FloatField,
+)
+
+MAX_PLANES = 256
+
+_planes = {}
+
+
+class Plan:
+    """Columnas a pedir con .values() y los pasos para armar cada fila"""
+
+    def __init__(self, pasos, columnas):
+        # pasos: (nombre, columna, convertidor o None, (columna_pk, pasos) del anidado o None)
+        self.pasos = pasos
+        self.columnas = columnas
+
+    def armar(self, fila):
+        return _armar(self.pasos, fila)
+
+
+def _armar(pasos, fila):
+    resultado = {}
+    for nombre, columna, convertidor, anidado in pasos:
+        if anidado is not None:
+            columna_pk, pasos_anidados = anidado
+            resultado[nombre] = None if fila[columna_pk] is None else _armar(pasos_anidados, fila)
+            continue
+        valor = fila[columna]
+        resultado[nombre] = convertidor(valor) if convertidor is not None and valor is not None else valor
+    return resultado
+
+
+def _compilar_pasos(serializer, modelo, prefijo, columnas):
+    pasos = []
+    for campo in serializer.fields.values():
+        if campo.write_only:
+            continue
+        if isinstance(campo, serializers.ListSerializer) or campo.source == '*' or '.' in campo.source:
+            return None
+        try:
+            campo_modelo = modelo._meta.get_field(campo.source)
+        except FieldDoesNotExist:
+            return None
+        if campo_modelo.many_to_many or not campo_modelo.concrete:
+            return None
+        columna = f'{prefijo}{campo.source}'
+
+        if isinstance(campo, serializers.BaseSerializer):
+            columna_pk = f'{columna}__{campo_modelo.related_model._meta.pk.name}'
+            columnas.append(columna_pk)
+            anidados = _compilar_pasos(campo, campo_modelo.related_model, f'{columna}__', columnas)
+            if anidados is None:
+                return None
+            pasos.append((campo.field_name, None, None, (columna_pk, anidados)))
+        elif isinstance(campo, serializers.PrimaryKeyRelatedField) and campo.pk_field is None:
+            columnas.append(columna)  # values() entrega el id de la relación
+            pasos.append((campo.field_name, columna, None, None))
+        elif type(campo) in CAMPOS_IDENTIDAD:
+            columnas.append(columna)
+            pasos.append((campo.field_name, columna, None, None))
+        elif type(campo) in CAMPOS_CONVERTIDOS:
+            columnas.append(columna)
+            pasos.append((campo.field_name, columna, campo.to_representation, None))
+        else:
+            return None
+    return pasos
+
+
+def compilar(serializer, modelo):
+    """
+    Plan para el serializer (ya con sus campos filtrados por ?fields= y ?expand=),
+    o None si tiene campos que no se pueden leer con .values().
+    Los planes se reutilizan entre requests con la misma forma.
+    """
+    context = serializer.context
+    clave = (type(serializer), context.get('fields'), context.get('expand'))
+    if clave in _planes:
+        return _planes[clave]
+
+    columnas = ['pk']  # Para la posición del cursor, ver pagination.PaginacionCursor
+    pasos = _compilar_pasos(serializer, modelo, '', columnas)
+    plan = Plan(pasos, list(dict.fromkeys(columnas))) if pasos is not None else None
+
+    if len(_planes) >= MAX_PLANES:
+        _planes.clear()
+    _planes[clave] = plan
+    return plan
@@ -0,0 +1,184 @@
+"""
+Límite de requests por usuario (o por IP si no hay sesión) con token buckets.
+
+Cada ámbito (ver settings.LIMITES_TASA) tiene una tasa de recarga y una
+ráfaga máxima: cada request consume un token y los tokens se recargan de a
+poco hasta la ráfaga. El estado de cada bucket es un par (tokens, instante)
+guardado en la caché configurada (LIMITES_CACHE), así que con Redis el límite
+es común a todos los workers; con LocMemCache es por proceso. La lectura y
+escritura del bucket se serializa con un candado en la misma caché (cache.add
+es atómico en Redis y en LocMemCache): requests simultáneos del mismo cliente
+no pisan los tokens gastados por otro. Si el candado no se obtiene en
+LIMITE_CANDADO_INTENTOS intentos (p. ej. lo dejó un worker que murió) se
+sigue sin él antes que bloquear el request.
+
+Se aplica a la API con LimiteTokenBucket (DEFAULT_THROTTLE_CLASSES) y a las
+vistas con el decorador @limitar('ambito'). Al exceder el límite se responde
+429 con Retry-After.
+"""
+import asyncio
+import functools
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+PERIODOS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+LIMITE_CANDADO_SEGUNDOS = 1  # Vence solo si quien lo tomó no lo suelta
+LIMITE_CANDADO_INTENTOS = 20
+LIMITE_CANDADO_ESPERA = 0.002  # Segundos entre intentos
+
+
+def _limite(ambito):
+    """(tokens por segundo, ráfaga) del ámbito, o None si no tiene límite"""
+    configuracion = settings.LIMITES_TASA.get(ambito)
+    if not settings.LIMITES_ACTIVOS or configuracion is None:
+        return None
+    cantidad, periodo = configuracion['tasa'].split('/')
+    tasa = int(cantidad) / PERIODOS[periodo.strip()[0]]
+    return tasa, configuracion.get('rafaga', int(cantidad))
+
+
+def _clave(ambito, identidad):
+    return f'limite:{ambito}:{identidad}'
+
+
+def _consumir_bucket(estado, limite, ahora):
+    """Retorna (nuevo estado, segundos a esperar o 0 si se permite)"""
+    tasa, rafaga = limite
+    tokens, instante = estado if estado is not None else (rafaga, ahora)
+    tokens = min(rafaga, tokens + (ahora - instante) * tasa)
+    if tokens < 1:
+        return (tokens, ahora), (1 - tokens) / tasa
+    return (tokens - 1, ahora), 0
+
+
+def _duracion(limite):
+    # Pasado este tiempo el bucket está lleno: no hace falta guardarlo más
+    tasa, rafaga = limite
+    return math.ceil(rafaga / tasa) + 1
+
+
+def _candado(clave):
+    return f'{clave}:candado'
+
+
+def _bloquear(cache, clave):
+    """Toma el candado del bucket; retorna si se obtuvo"""
+    for _ in range(LIMITE_CANDADO_INTENTOS):
+        if cache.add(_candado(clave), 1, LIMITE_CANDADO_SEGUNDOS):
+            return True
+        time.sleep(LIMITE_CANDADO_ESPERA)
+    return False
+
+
+async def _abloquear(cache, clave):
+    for _ in range(LIMITE_CANDADO_INTENTOS):
+        if await cache.aadd(_candado(clave), 1, LIMITE_CANDADO_SEGUNDOS):
+            return True
+        await asyncio.sleep(LIMITE_CANDADO_ESPERA)
+    return False
+
+
+def consumir(ambito, identidad):
+    """Consume un token. Retorna 0 si se permite o los segundos a esperar"""
+    limite = _limite(ambito)
+    if limite is None:
+        return 0
+    cache = caches[settings.LIMITES_CACHE]
+    clave = _clave(ambito, identidad)
+    bloqueado = _bloquear(cache, clave)
+    try:
+        estado, espera = _consumir_bucket(cache.get(clave), limite, time.time())
+        cache.set(clave, estado, _duracion(limite))
+    finally:
+        if bloqueado:
+            cache.delete(_candado(clave))
+    return espera
+
+
+async def aconsumir(ambito, identidad):
+    """Versión async de consumir()"""
+    limite = _limite(ambito)
+    if limite is None:
+        return 0
+    cache = caches[settings.LIMITES_CACHE]
+    clave = _clave(ambito, identidad)
+    bloqueado = await _abloquear(cache, clave)
+    try:
+        estado, espera = _consumir_bucket(await cache.aget(clave), limite, time.time())
+        await cache.aset(clave, estado, _duracion(limite))
+    finally:
+        if bloqueado:
+            await cache.adelete(_candado(clave))
+    return espera
+
+
+def direccion_ip(request):
+    """
+    IP del cliente. Detrás de LIMITES_PROXIES proxies de confianza (Render,
+    Railway) se toma de X-Forwarded-For, que el cliente no puede falsificar
+    más allá de esa posición.
+    """
+    proxies = settings.LIMITES_PROXIES
+    reenviada = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxies and reenviada:
+        direcciones = [direccion.strip() for direccion in reenviada.split(',')]
+        return direcciones[-min(proxies, len(direcciones))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def identidad(usuario, request):
+    # Por usuario y no por IP cuando hay sesión: los estudiantes de una sede comparten IP
+    if usuario is not None and usuario.is_authenticated:
+        return f'u{usuario.pk}'
+    return f'ip{direccion_ip(request)}'
+
+
+def respuesta_limite(espera):
+    response = JsonResponse({'error': 'Demasiadas solicitudes, intenta nuevamente más tarde'}, status=429)
+    response['Retry-After'] = str(math.ceil(espera))
+    return response
+
+
+def limitar(ambito):
+    """Decorador para vistas Django (sync o async) con el límite del ámbito"""
+    def decorador(vista):
+        if asyncio.iscoroutinefunction(vista):
+            @functools.wraps(vista)
+            async def vista_limitada_async(request, *args, **kwargs):
+                usuario = await sync_to_async(lambda: request.user)()
+                espera = await aconsumir(ambito, identidad(usuario, request))
+                if espera:
+                    return respuesta_limite(espera)
+                return await vista(request, *args, **kwargs)
+            return vista_limitada_async
+
+        @functools.wraps(vista)
+        def vista_limitada(request, *args, **kwargs):
+            espera = consumir(ambito, identidad(request.user, request))
+            if espera:
+                return respuesta_limite(espera)
+            return vista(request, *args, **kwargs)
+        return vista_limitada
+    return decorador
+
+
+class LimiteTokenBucket(BaseThrottle):
+    """
+    Throttle de DRF con el bucket del ámbito de la vista (atributo ambito_limite,
+    por defecto 'api'). DRF responde 429 con Retry-After = wait().
+    """
+
+    def allow_request(self, request, view):
+        ambito = getattr(view, 'ambito_limite', 'api')
+        self.espera = consumir(ambito, identidad(request.user, request))
+        return not self.espera
+
+    def wait(self):
+        return self.espera
@@ -0,0 +1,50 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from main import proyecciones
+
+
+class Command(BaseCommand):
+    help = (
+        'Aplica a las proyecciones (main/proyecciones.py) los eventos de sesión nuevos desde su punto '
+        'de control. Con --reconstruir las vacía y vuelve a aplicar todo el historial, una proyección '
+        'por hilo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('nombres', nargs='*', help=f"Proyecciones (todas por defecto): {', '.join(proyecciones.PROYECCIONES)}")
+        parser.add_argument('--reconstruir', action='store_true', help='Desde el primer evento, con las tablas vacías')
+        parser.add_argument('--hilos', type=int, default=4, help='Proyecciones procesadas a la vez')
+        parser.add_argument('--lote', type=int, default=settings.PROYECCIONES_LOTE, help='Eventos por transacción')
+
+    def handle(self, *args, **options):
+        nombres = options['nombres'] or list(proyecciones.PROYECCIONES)
+        desconocidas = set(nombres) - set(proyecciones.PROYECCIONES)
+        if desconocidas:
+            raise CommandError(f"Proyecciones desconocidas: {', '.join(sorted(desconocidas))}")
+
+        funcion = proyecciones.reconstruir if options['reconstruir'] else proyecciones.actualizar
+        # SQLite admite un solo escritor a la vez: los hilos solo esperarían el bloqueo
+        hilos = 1 if connection.vendor == 'sqlite' else max(1, options['hilos'])
+
+        def procesar(nombre):
+            inicio = time.perf_counter()
+            try:
+                return nombre, funcion(nombre, options['lote']), time.perf_counter() - inicio
+            finally:
+                connections.close_all()  # Las conexiones de cada hilo
+
+        if hilos == 1:
+            resultados = [procesar(nombre) for nombre in nombres]
+        else:
+            with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+                resultados = list(ejecutor.map(procesar, nombres))
+
+        for nombre, aplicados, segundos in resultados:
+            self.stdout.write(f'  {nombre:<25} {aplicados:>8} eventos  {segundos:>7.2f} s')
+        accion = 'reconstruidas' if options['reconstruir'] else 'al día'
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(resultados)} proyección(es) {accion}'))
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main import archivo
+from main.models import SesionTutoria
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve al archivo histórico las sesiones de hace más de ARCHIVO_SEMESTRES semestres, con sus '
+        'mensajes y notificaciones, por lotes (una transacción por lote). Ver main/archivo.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--semestres', type=int, default=settings.ARCHIVO_SEMESTRES,
+            help='Semestres completos que se mantienen en las tablas en uso además del actual',
+        )
+        parser.add_argument('--lote', type=int, default=settings.ARCHIVO_LOTE, help='Sesiones por transacción')
+        parser.add_argument('--simular', action='store_true', help='Solo informa cuántas sesiones se archivarían')
+
+    def handle(self, *args, **options):
+        fecha_corte = archivo.corte(options['semestres'])
+        if options['simular']:
+            pendientes = SesionTutoria.objects.filter(fecha_programada__lt=fecha_corte).count()
+            self.stdout.write(f'{pendientes} sesión(es) anteriores al {fecha_corte:%d/%m/%Y} se archivarían')
+            return
+
+        totales = {}
+        while True:
+            movidas = archivo.archivar_lote(fecha_corte, options['lote'])
+            if not movidas:
+                break
+            for nombre, cantidad in movidas.items():
+                totales[nombre] = totales.get(nombre, 0) + cantidad
+            self.stdout.write(f"  lote: {', '.join(f'{c} {nombre}' for nombre, c in movidas.items())}")
+
+        resumen = ', '.join(f'{c} {nombre}' for nombre, c in totales.items()) or 'nada'
+        self.stdout.write(self.style.SUCCESS(f'✅ Archivado ({resumen}) anterior al {fecha_corte:%d/%m/%Y}'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.benchmarks import ESCENARIOS
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta un escenario de benchmark (ver main/benchmarks.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('escenario', nargs='?', help='Nombre del escenario a ejecutar')
+        parser.add_argument('--listar', action='store_true', help='Lista los escenarios disponibles')
+        parser.add_argument('--concurrencia', type=int, default=50, help='Clientes simultáneos')
+        parser.add_argument('--workers', type=int, default=4, help='Workers sync a simular')
+        parser.add_argument('--cantidad', type=int, default=500, help='Objetos a escribir en los escenarios de la API')
+
+    def handle(self, *args, **options):
+        if options['listar'] or not options['escenario']:
+            for nombre, funcion in sorted(ESCENARIOS.items()):
+                resumen = (funcion.__doc__ or '').strip().split('\n')[0]
+                self.stdout.write(f'{nombre:30} {resumen}')
+            return
+
+        funcion = ESCENARIOS.get(options['escenario'])
+        if funcion is None:
+            raise CommandError(f"Escenario desconocido: {options['escenario']}")
+
+        opciones = {
+            clave: valor for clave, valor in options.items()
+            if clave not in ('escenario', 'listar', 'verbosity', 'settings', 'pythonpath',
+                             'traceback', 'no_color', 'force_color', 'skip_checks')
+        }
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Benchmark: {options['escenario']}"))
+        for descripcion, valor in funcion(**opciones):
+            self.stdout.write(f'  {descripcion}: {valor}')
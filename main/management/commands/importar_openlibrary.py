@@ -0,0 +1,225 @@
+import gzip
+import json
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main.catalogo import terminos_de_libro
+from main.models import AutorCatalogo, LibroCatalogo, TerminoCatalogo
+
+TIPO_AUTOR = '/type/author'
+TIPO_OBRA = '/type/work'
+TIPO_EDICION = '/type/edition'
+
+_ANIO = re.compile(r'\b(\d{4})\b')
+
+
+def _leer_registros(ruta):
+    """
+    Recorre el dump línea a línea sin cargarlo en memoria.
+    Formato de los dumps de Open Library (opcionalmente .gz):
+    tipo<TAB>clave<TAB>revisión<TAB>última modificación<TAB>JSON
+    """
+    abrir = gzip.open if ruta.endswith('.gz') else open
+    with abrir(ruta, 'rt', encoding='utf-8') as archivo:
+        for linea in archivo:
+            partes = linea.rstrip('\n').split('\t', 4)
+            if len(partes) != 5:
+                continue
+            try:
+                yield partes[0], partes[1], json.loads(partes[4])
+            except ValueError:
+                continue
+
+
+def _anio(texto):
+    coincidencia = _ANIO.search(texto or '')
+    return int(coincidencia.group(1)) if coincidencia else None
+
+
+def _texto(valor):
+    # Algunos campos vienen como {'type': '/type/text', 'value': '...'}
+    if isinstance(valor, dict):
+        return valor.get('value', '')
+    return valor or ''
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa dumps de Open Library (autores, obras y ediciones) al catálogo local. '
+        'Importar primero el dump de autores para resolver los nombres en las obras. '
+        'Con --reindexar vuelve a generar el índice de palabras de los libros ya importados.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivos', nargs='*', help='Dumps ol_dump_*.txt o .txt.gz')
+        parser.add_argument('--lote', type=int, default=1000, help='Registros por inserción')
+        parser.add_argument(
+            '--reindexar', action='store_true',
+            help='Regenera TerminoCatalogo con la tokenización actual (main/catalogo.py)',
+        )
+
+    def handle(self, *args, **options):
+        self.lote = options['lote']
+        self.verbosity = options['verbosity']
+        if self.lote < 1:
+            raise CommandError('--lote debe ser mayor que 0')
+        if not options['archivos'] and not options['reindexar']:
+            raise CommandError('Indicar los dumps a importar o --reindexar')
+
+        for ruta in options['archivos']:
+            self.stdout.write(f'Importando {ruta}...')
+            try:
+                totales = self._importar_archivo(ruta)
+            except OSError as e:
+                raise CommandError(f'No se pudo leer {ruta}: {e}')
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {totales[TIPO_AUTOR]} autores, {totales[TIPO_OBRA]} obras, "
+                f"{totales[TIPO_EDICION]} ediciones procesadas"
+            ))
+
+        if options['reindexar']:
+            total = self._reindexar()
+            self.stdout.write(self.style.SUCCESS(f'✅ {total} libros reindexados'))
+
+    def _importar_archivo(self, ruta):
+        pendientes = {TIPO_AUTOR: [], TIPO_OBRA: [], TIPO_EDICION: []}
+        procesadores = {
+            TIPO_AUTOR: self._guardar_autores,
+            TIPO_OBRA: self._guardar_obras,
+            TIPO_EDICION: self._guardar_ediciones,
+        }
+        totales = dict.fromkeys(pendientes, 0)
+
+        for tipo, clave, registro in _leer_registros(ruta):
+            if tipo not in pendientes:
+                continue
+            pendientes[tipo].append((clave, registro))
+            if len(pendientes[tipo]) >= self.lote:
+                procesadores[tipo](pendientes[tipo])
+                totales[tipo] += len(pendientes[tipo])
+                pendientes[tipo] = []
+                if self.verbosity > 1:
+                    self.stdout.write(f'  {sum(totales.values())} registros...')
+
+        for tipo, registros in pendientes.items():
+            if registros:
+                procesadores[tipo](registros)
+                totales[tipo] += len(registros)
+
+        return totales
+
+    @transaction.atomic
+    def _guardar_autores(self, registros):
+        AutorCatalogo.objects.bulk_create(
+            [
+                AutorCatalogo(clave=clave, nombre=_texto(registro.get('name'))[:255])
+                for clave, registro in registros
+                if registro.get('name')
+            ],
+            update_conflicts=True,
+            unique_fields=['clave'],
+            update_fields=['nombre'],
+        )
+
+    @transaction.atomic
+    def _guardar_obras(self, registros):
+        # Nombres de los autores del lote en una sola consulta
+        claves_autor = {}
+        for clave, registro in registros:
+            for autor in registro.get('authors', []):
+                clave_autor = (autor.get('author') or {}).get('key')
+                if clave_autor:
+                    claves_autor.setdefault(clave, clave_autor)
+                    break
+        nombres = dict(
+            AutorCatalogo.objects
+            .filter(clave__in=set(claves_autor.values()))
+            .values_list('clave', 'nombre')
+        )
+
+        libros = []
+        for clave, registro in registros:
+            titulo = _texto(registro.get('title'))
+            if not titulo:
+                continue
+            portadas = [c for c in registro.get('covers', []) if isinstance(c, int) and c > 0]
+            libros.append(LibroCatalogo(
+                clave=clave,
+                titulo=titulo[:500],
+                autor=nombres.get(claves_autor.get(clave), '')[:255],
+                anio=_anio(registro.get('first_publish_date')),
+                temas=[_texto(t) for t in registro.get('subjects', [])][:20],
+                portada_id=portadas[0] if portadas else None,
+            ))
+
+        LibroCatalogo.objects.bulk_create(
+            libros,
+            update_conflicts=True,
+            unique_fields=['clave'],
+            update_fields=['titulo', 'autor', 'anio', 'temas', 'portada_id'],
+        )
+
+        # Los ids no siempre vuelven de bulk_create con update_conflicts (MySQL)
+        ids = dict(
+            LibroCatalogo.objects
+            .filter(clave__in=[libro.clave for libro in libros])
+            .values_list('clave', 'id')
+        )
+        for libro in libros:
+            libro.id = ids[libro.clave]
+
+        TerminoCatalogo.objects.filter(libro_id__in=ids.values()).delete()
+        terminos = []
+        for libro in libros:
+            terminos.extend(terminos_de_libro(libro))
+        TerminoCatalogo.objects.bulk_create(terminos, batch_size=self.lote * 4)
+
+    def _reindexar(self):
+        """Regenera los términos de todos los libros, un lote por transacción"""
+        total = 0
+        ultimo = 0
+        while True:
+            libros = list(
+                LibroCatalogo.objects.filter(pk__gt=ultimo).order_by('pk')
+                .only('id', 'titulo', 'autor', 'temas')[:self.lote]
+            )
+            if not libros:
+                return total
+            with transaction.atomic():
+                TerminoCatalogo.objects.filter(libro_id__in=[libro.id for libro in libros]).delete()
+                terminos = []
+                for libro in libros:
+                    terminos.extend(terminos_de_libro(libro))
+                TerminoCatalogo.objects.bulk_create(terminos, batch_size=self.lote * 4)
+            total += len(libros)
+            ultimo = libros[-1].pk
+            if self.verbosity > 1:
+                self.stdout.write(f'  {total} libros...')
+
+    @transaction.atomic
+    def _guardar_ediciones(self, registros):
+        """Completa ISBN y páginas de las obras que aún no los tienen"""
+        datos_por_obra = {}
+        for _, registro in registros:
+            obras = registro.get('works') or []
+            if not obras or not obras[0].get('key'):
+                continue
+            isbns = registro.get('isbn_13') or registro.get('isbn_10') or []
+            paginas = registro.get('number_of_pages')
+            if isbns or paginas:
+                datos_por_obra.setdefault(obras[0]['key'], (isbns[0][:20] if isbns else '', paginas))
+
+        libros = list(
+            LibroCatalogo.objects
+            .filter(clave__in=datos_por_obra.keys(), isbn='')
+            .only('id', 'clave', 'isbn', 'paginas')
+        )
+        for libro in libros:
+            isbn, paginas = datos_por_obra[libro.clave]
+            libro.isbn = isbn
+            if libro.paginas is None and isinstance(paginas, int) and paginas > 0:
+                libro.paginas = paginas
+
+        LibroCatalogo.objects.bulk_update(libros, ['isbn', 'paginas'])
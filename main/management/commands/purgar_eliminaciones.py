@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.sincronizacion import purgar_eliminaciones
+
+
+class Command(BaseCommand):
+    help = (
+        'Elimina el registro de eliminaciones de /api/sync/ más viejo que SYNC_RETENCION_DIAS. '
+        'Los clientes con un token anterior reciben una sincronización completa.'
+    )
+
+    def handle(self, *args, **options):
+        eliminadas = purgar_eliminaciones()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {eliminadas} registro(s) de más de {settings.SYNC_RETENCION_DIAS} días eliminados'
+        ))
@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from main.rendimiento import base_de_datos_temporal, medir, sembrar_datos
+from main.api import DashboardView
+from main.urls import router
+
+# Las 3 fijas de cada request autenticado: sesión, usuario y versiones (api.CacheHTTPMixin)
+CONSULTAS_304 = 3
+
+# Endpoints fuera del router: (url, tope). El segundo request sale de la caché
+# (solo la consulta de versiones) y se verifica con CONSULTAS_304
+VISTAS = (
+    ('/api/dashboard/', DashboardView.max_consultas),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Verifica que cada endpoint de la API respete su tope de consultas (max_consultas) '
+        'sobre una base de datos de prueba sembrada. Sale con error si alguno lo excede.'
+    )
+
+    def handle(self, *args, **options):
+        # Sin límite de requests: el recorrido hace muchos requests seguidos con el mismo usuario
+        with override_settings(LIMITES_ACTIVOS=False), base_de_datos_temporal():
+            excedidos = self.verificar(sembrar_datos())
+
+        if excedidos:
+            raise CommandError(f'{len(excedidos)} endpoint(s) exceden su tope de consultas')
+        self.stdout.write(self.style.SUCCESS('✅ Todos los endpoints dentro de su tope de consultas'))
+
+    def verificar(self, usuarios):
+        """Recorre los endpoints sobre la base de datos actual (ya sembrada); retorna los que exceden su tope"""
+        cliente = Client()
+        cliente.force_login(usuarios['admin'])
+        # El primer request guarda last_activity en la sesión (3 consultas, a lo más una vez por
+        # SESION_ACTIVIDAD_GRANULARIDAD): no se cuenta en los topes
+        cliente.get('/api/')
+
+        excedidos = []
+        for prefijo, viewset, basename in router.registry:
+            tope = getattr(viewset, 'max_consultas', None)
+            if tope is None:
+                continue
+
+            lista = f'/api/{prefijo}/'
+            primero = viewset.queryset.model.objects.order_by('pk').first()
+            urls = [lista]
+            if primero is not None:
+                urls.append(f'{lista}{primero.pk}/')
+            # Con todas las relaciones expandibles: el costo no debe crecer con las filas
+            expandibles = ','.join(getattr(viewset, 'prefetch_expandibles', {}))
+            if expandibles:
+                urls += [f'{url}?expand={expandibles}' for url in urls]
+            # Con ?fields= el queryset se acota con only(): no debe sumar consultas diferidas
+            urls += [f"{url}{'&' if '?' in url else '?'}fields=id" for url in urls]
+
+            for url in urls:
+                response, consultas, _ = medir(cliente, url)
+                if response.status_code != 200:
+                    raise CommandError(f'{url} respondió {response.status_code}')
+                estado = self.style.SUCCESS('OK') if consultas <= tope else self.style.ERROR('EXCEDIDO')
+                self.stdout.write(f'{estado:>10}  {url:55} {consultas:3d} consultas (tope {tope})')
+                if consultas > tope:
+                    excedidos.append(url)
+
+                # Con el ETag vigente: 304 sin consultar los datos
+                etag = response.get('ETag')
+                if etag:
+                    condicional, consultas, _ = medir(cliente, url, HTTP_IF_NONE_MATCH=etag)
+                    if condicional.status_code != 304:
+                        raise CommandError(f'{url} con If-None-Match respondió {condicional.status_code}')
+                    estado = self.style.SUCCESS('OK') if consultas <= CONSULTAS_304 else self.style.ERROR('EXCEDIDO')
+                    self.stdout.write(f"{estado:>10}  {'  304':55} {consultas:3d} consultas (tope {CONSULTAS_304})")
+                    if consultas > CONSULTAS_304:
+                        excedidos.append(f'{url} (304)')
+
+        for url, tope in VISTAS:
+            for intento, tope_intento in (('', tope), ('  (caché)', CONSULTAS_304)):
+                response, consultas, _ = medir(cliente, url)
+                if response.status_code != 200:
+                    raise CommandError(f'{url} respondió {response.status_code}')
+                estado = self.style.SUCCESS('OK') if consultas <= tope_intento else self.style.ERROR('EXCEDIDO')
+                self.stdout.write(f'{estado:>10}  {url + intento:55} {consultas:3d} consultas (tope {tope_intento})')
+                if consultas > tope_intento:
+                    excedidos.append(url + intento)
+        return excedidos
@@ -0,0 +1,193 @@
+import itertools
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+
+from main.rendimiento import base_de_datos_temporal, recorrido_vistas, sembrar_datos
+from main.urls import router
+
+# Tablas que crecen con la actividad de los usuarios: ninguna vista debe leerlas completas
+TABLAS_VIGILADAS = (
+    'main_sesiontutoria', 'main_mensaje', 'main_notificacion', 'main_recursoeducativo', 'main_eliminacion',
+    'main_sesionarchivada', 'main_mensajearchivado', 'main_notificacionarchivada',
+)
+# Recorridos aceptados a sabiendas, {(vista, tabla): motivo}
+RECORRIDOS_PERMITIDOS = {
+    ('admin_dashboard', 'main_sesiontutoria'): 'totales del panel de administración',
+    ('admin_dashboard', 'main_notificacion'): 'conteo global de no leídas del panel de administración',
+    ('admin_sesiones', 'main_sesiontutoria'): 'el panel lista todas las sesiones (sin paginar) con su total',
+}
+PREFIJOS_EXPLAIN = {
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN FORMAT=JSON ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+
+def preparar_conexion():
+    """Estadísticas al día y, donde se puede, el planificador forzado a preferir índices"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('ANALYZE')
+            # Con tablas chicas un Seq Scan puede ser más barato; así solo aparece si no hay índice
+            cursor.execute('SET enable_seqscan = off')
+        elif connection.vendor == 'mysql':
+            cursor.execute('SET SESSION max_seeks_for_key = 1')
+        elif connection.vendor == 'sqlite':
+            cursor.execute('ANALYZE')
+
+
+def explicar(queryset):
+    if connection.vendor == 'mysql':
+        return queryset.explain(format='JSON')
+    return queryset.explain()
+
+
+def explicar_sql(sql):
+    """Plan de una consulta capturada (con los parámetros ya interpolados)"""
+    with connection.cursor() as cursor:
+        cursor.execute(PREFIJOS_EXPLAIN[connection.vendor] + sql)
+        filas = cursor.fetchall()
+    return '\n'.join(str(fila[-1]) for fila in filas)
+
+
+def tablas_recorridas(plan, sql):
+    """Tablas que el plan lee completas"""
+    if connection.vendor == 'postgresql':
+        nombres = [alias or tabla for tabla, alias in re.findall(r'Seq Scan on (\w+)(?: (\w+))?', plan)]
+    elif connection.vendor == 'mysql':
+        nombres = re.findall(r'"table_name": "(\w+)",\s*"access_type": "ALL"', plan)
+    else:
+        # Recorrer un índice en orden sirve si la consulta corta en un LIMIT; si no, lo lee completo
+        limitada = re.search(r'\bLIMIT\b', sql) is not None
+        nombres = [
+            tabla for tabla, indice in re.findall(r'\bSCAN (\w+)( USING (?:COVERING )?INDEX)?', plan)
+            if not (indice and limitada)
+        ]
+    # Las subconsultas y los joins repetidos usan alias (U0, T4...)
+    alias = {alias: tabla for tabla, alias in re.findall(r'[`"](\w+)[`"] ([A-Z]\d+)\b', sql)}
+    return {alias.get(nombre, nombre) for nombre in nombres}
+
+
+def recorre_tabla_completa(plan, tabla, filtrada):
+    """
+    True si el plan lee toda la tabla: sin filtros solo se acepta recorrerla en
+    el orden pedido (por índice o por la clave primaria) cortando en el LIMIT,
+    nunca ordenarla completa en memoria.
+    """
+    if connection.vendor == 'postgresql':
+        return f'Seq Scan on {tabla}' in plan
+    if connection.vendor == 'mysql':
+        return re.search(rf'"table_name": "{tabla}",\s*"access_type": "ALL"', plan) is not None
+    # SQLite: con filtros la tabla debe buscarse por índice (SEARCH); un SCAN, aunque
+    # sea recorriendo un índice en orden, lee filas hasta encontrar las que cumplen
+    if filtrada:
+        return re.search(rf'\bSEARCH {tabla}\b', plan) is None
+    return 'USE TEMP B-TREE FOR ORDER BY' in plan
+
+
+def valores_de_ejemplo(modelo, filtros):
+    """Un valor real por cada filtro, para que el planificador vea una consulta representativa"""
+    fila = modelo.objects.order_by('pk').first()
+    valores = {}
+    for parametro, lookup in filtros.items():
+        if '__' in lookup:
+            valores[parametro] = timezone.now().isoformat()
+        else:
+            valor = getattr(fila, modelo._meta.get_field(lookup).attname)
+            valores[parametro] = str(valor)
+    return valores
+
+
+class Command(BaseCommand):
+    help = (
+        'Corre EXPLAIN sobre cada filtro (solo y de a pares) y cada orden que expone la API, y sobre '
+        'cada consulta de las vistas HTML con cada rol, en una base de datos de prueba sembrada. '
+        'Sale con error si alguna recorre la tabla completa.'
+    )
+
+    def handle(self, *args, **options):
+        with override_settings(LIMITES_ACTIVOS=False), base_de_datos_temporal():
+            fallidos = self.verificar(sembrar_datos())
+
+        if fallidos:
+            raise CommandError(f'{len(fallidos)} consulta(s) recorren la tabla completa')
+        self.stdout.write(self.style.SUCCESS('✅ Todos los filtros, órdenes y vistas usan índices'))
+
+    def verificar(self, usuarios):
+        """Verifica los planes sobre la base de datos actual (ya sembrada); retorna las consultas que recorren"""
+        fallidos = []
+        preparar_conexion()
+        self.verificar_api(usuarios, fallidos)
+        self.verificar_vistas(usuarios, fallidos)
+        return fallidos
+
+    def verificar_api(self, usuarios, fallidos):
+        """EXPLAIN de la página de cada filtro y orden de la API"""
+        fabrica = RequestFactory()
+        for prefijo, viewset, basename in router.registry:
+            filtros = getattr(viewset, 'filtros', {})
+            modelo = viewset.queryset.model
+            ejemplo = valores_de_ejemplo(modelo, filtros)
+
+            casos = [{}]
+            for cantidad in (1, 2):
+                for parametros in itertools.combinations(filtros, cantidad):
+                    casos.append({parametro: ejemplo[parametro] for parametro in parametros})
+            for campo in getattr(viewset, 'campos_orden', ()):
+                casos += [{'ordering': campo}, {'ordering': f'-{campo}'}]
+
+            for parametros in casos:
+                request = Request(fabrica.get(f'/api/{prefijo}/', parametros))
+                request.user = usuarios['admin']
+                vista = viewset(request=request, format_kwarg=None, action='list', args=(), kwargs={})
+                queryset = vista.filter_queryset(vista.get_queryset())
+                # La consulta de una página: la misma que arma la paginación por cursor
+                plan = explicar(queryset[:vista.paginator.get_page_size(request)])
+
+                filtrada = any(parametro != 'ordering' for parametro in parametros)
+                descripcion = '&'.join(f'{clave}={valor}' for clave, valor in parametros.items()) or '(sin filtros)'
+                if recorre_tabla_completa(plan, modelo._meta.db_table, filtrada):
+                    fallidos.append(f'/api/{prefijo}/?{descripcion}')
+                    self.stdout.write(self.style.ERROR(f'  RECORRE  /api/{prefijo}/ {descripcion}'))
+                    self.stdout.write(f'            {plan}')
+                else:
+                    self.stdout.write(f"{self.style.SUCCESS('OK'):>10}  /api/{prefijo}/ {descripcion}")
+
+    def verificar_vistas(self, usuarios, fallidos):
+        """
+        EXPLAIN de cada consulta de las vistas HTML, con cada rol: ninguna puede
+        leer completa una de TABLAS_VIGILADAS salvo lo listado en RECORRIDOS_PERMITIDOS
+        """
+        for rol, usuario in usuarios.items():
+            cliente = Client()
+            cliente.force_login(usuario)
+            for nombre, url in recorrido_vistas(usuario):
+                with CaptureQueriesContext(connection) as capturadas:
+                    cliente.get(url)
+                consultas = dict.fromkeys(
+                    consulta['sql'] for consulta in capturadas.captured_queries
+                    if consulta['sql'].lstrip().upper().startswith('SELECT')
+                )
+                recorridas = set()
+                for sql in consultas:
+                    plan = explicar_sql(sql)
+                    tablas = {
+                        tabla for tabla in tablas_recorridas(plan, sql)
+                        if tabla in TABLAS_VIGILADAS and (nombre, tabla) not in RECORRIDOS_PERMITIDOS
+                    }
+                    for tabla in tablas:
+                        self.stdout.write(self.style.ERROR(f'  RECORRE  {rol:10} {url} {tabla}'))
+                        self.stdout.write(f'            {sql}')
+                        self.stdout.write(f'            {plan}')
+                    recorridas |= tablas
+                if recorridas:
+                    fallidos.append(f'{rol} {url}')
+                else:
+                    self.stdout.write(f"{self.style.SUCCESS('OK'):>10}  {rol:10} {url} ({len(consultas)} consultas)")
+
@@ -0,0 +1,92 @@
+import json
+import logging
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from main.rendimiento import base_de_datos_temporal, medir, recorrido_urls, sembrar_datos
+
+# Presupuestos versionados junto al código: {rol: {ruta: {'consultas': n, 'tiempo_db_ms': t}}}
+ARCHIVO_PRESUPUESTOS = Path(__file__).resolve().parents[2] / 'presupuestos_consultas.json'
+
+# El tiempo de base de datos varía entre máquinas: se falla recién al superar
+# el presupuesto por este factor más un margen fijo
+TOLERANCIA_TIEMPO = 3
+MARGEN_TIEMPO_MS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Recorre cada ruta de main/urls.py con cada rol sobre una base de datos de prueba sembrada, '
+        'mide consultas y tiempo de base de datos y los compara con main/presupuestos_consultas.json. '
+        'Sale con error si alguna ruta excede su presupuesto o no tiene uno.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--actualizar', action='store_true',
+            help='Reescribe el archivo de presupuestos con lo medido (revisar el diff antes de commitear)',
+        )
+
+    def handle(self, *args, **options):
+        # Sin límite de requests ni llamadas a Open Library: el proxy busca en el catálogo local
+        with override_settings(LIMITES_ACTIVOS=False, OPENLIBRARY_FUENTE='local'), base_de_datos_temporal():
+            medidos = self.medir_rutas(sembrar_datos())
+
+        if options['actualizar']:
+            ARCHIVO_PRESUPUESTOS.write_text(json.dumps(medidos, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f'✅ Presupuestos actualizados en {ARCHIVO_PRESUPUESTOS}'))
+            return
+
+        excedidos = self.comparar(medidos)
+        if excedidos:
+            raise CommandError(
+                f'{len(excedidos)} ruta(s) exceden su presupuesto. Si el aumento es intencional, '
+                'actualiza los presupuestos con --actualizar'
+            )
+        self.stdout.write(self.style.SUCCESS('✅ Todas las rutas dentro de su presupuesto'))
+
+    def medir_rutas(self, usuarios):
+        """{rol: {ruta: {'consultas', 'tiempo_db_ms'}}} recorriendo la base de datos actual (ya sembrada)"""
+        # Los 403/404/405 esperables del recorrido no son advertencias
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        medidos = {}
+        for rol, usuario in usuarios.items():
+            cliente = Client(raise_request_exception=False)
+            cliente.force_login(usuario)
+            medidos[rol] = {}
+            for nombre, url in recorrido_urls(usuario):
+                response, consultas, tiempo_db = medir(cliente, url)
+                if response.status_code >= 500:
+                    raise CommandError(f'{rol} {url} respondió {response.status_code}')
+                medidos[rol][nombre] = {'consultas': consultas, 'tiempo_db_ms': round(tiempo_db, 2)}
+        return medidos
+
+    def comparar(self, medidos):
+        """Compara lo medido con ARCHIVO_PRESUPUESTOS; retorna las rutas que lo exceden o no tienen uno"""
+        presupuestos = json.loads(ARCHIVO_PRESUPUESTOS.read_text(encoding='utf-8'))
+        excedidos = []
+        for rol, rutas in medidos.items():
+            for nombre, medido in rutas.items():
+                presupuesto = presupuestos.get(rol, {}).get(nombre)
+                if presupuesto is None:
+                    excedidos.append(f'{rol} {nombre} (sin presupuesto)')
+                    self.stdout.write(self.style.ERROR(f'  SIN PRESUPUESTO  {rol:10} {nombre}'))
+                    continue
+                tope_tiempo = presupuesto['tiempo_db_ms'] * TOLERANCIA_TIEMPO + MARGEN_TIEMPO_MS
+                problemas = []
+                if medido['consultas'] > presupuesto['consultas']:
+                    problemas.append(f"{medido['consultas']} consultas (presupuesto {presupuesto['consultas']})")
+                if medido['tiempo_db_ms'] > tope_tiempo:
+                    problemas.append(f"{medido['tiempo_db_ms']:.1f} ms de base de datos (tope {tope_tiempo:.1f})")
+                if problemas:
+                    excedidos.append(f'{rol} {nombre}')
+                    self.stdout.write(self.style.ERROR(f"  EXCEDIDO  {rol:10} {nombre:30} {', '.join(problemas)}"))
+                else:
+                    self.stdout.write(
+                        f"{self.style.SUCCESS('OK'):>10}  {rol:10} {nombre:30} "
+                        f"{medido['consultas']:3d} consultas {medido['tiempo_db_ms']:7.2f} ms"
+                    )
+        return excedidos
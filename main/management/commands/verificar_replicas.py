@@ -0,0 +1,187 @@
+import tempfile
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from main import replicas
+from main.models import Mensaje, SesionTutoria, Usuario
+from main.rendimiento import base_de_datos_temporal, sembrar_datos
+
+REPLICAS = ('replica1', 'replica2')
+
+
+def selects_por_base(funcion):
+    """Ejecuta funcion() y retorna (resultado, {alias: cantidad de SELECT})"""
+    selects = dict.fromkeys((DEFAULT_DB_ALIAS, *REPLICAS), 0)
+
+    def contador(alias):
+        def envoltura(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                selects[alias] += 1
+            return execute(sql, params, many, context)
+        return envoltura
+
+    # Sin CaptureQueriesContext: conecta al entrar, y una réplica caída debe fallar recién en el request
+    with ExitStack() as pila:
+        for alias in selects:
+            pila.enter_context(connections[alias].execute_wrapper(contador(alias)))
+        resultado = funcion()
+    return resultado, selects
+
+
+def get(cliente, url):
+    response = cliente.get(url)
+    if response.streaming:
+        response.streaming_content = [b''.join(response.streaming_content)]
+    return response
+
+
+class Command(BaseCommand):
+    help = (
+        'Verifica el router de réplicas (main/replicas.py) con dos réplicas SQLite locales copiadas '
+        'de una base de datos de prueba sembrada: lecturas de GET en réplicas, fijación a la primaria '
+        'después de un POST y respaldo en la primaria si las réplicas no responden.'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(
+                'Las réplicas de prueba se copian con la API de respaldo de SQLite: '
+                'correr con DATABASE_URL=sqlite:///...'
+            )
+        with override_settings(LIMITES_ACTIVOS=False), base_de_datos_temporal():
+            self.verificar_con_replicas(sembrar_datos()['estudiante'])
+
+        if self.fallidos:
+            raise CommandError(f'{len(self.fallidos)} verificación(es) fallaron')
+        self.stdout.write(self.style.SUCCESS('✅ El router de réplicas se comporta como se espera'))
+
+    def verificar_con_replicas(self, estudiante):
+        """
+        Verifica el router sobre la base de datos actual (ya sembrada) con dos réplicas
+        SQLite temporales; retorna las verificaciones fallidas
+        """
+        self.fallidos = []
+        with override_settings(DATABASE_REPLICAS=list(REPLICAS)), tempfile.TemporaryDirectory() as directorio:
+            for alias in REPLICAS:
+                connections.settings[alias] = {
+                    **connections[DEFAULT_DB_ALIAS].settings_dict, 'NAME': str(Path(directorio) / f'{alias}.db'),
+                }
+            try:
+                self.verificar(estudiante)
+            finally:
+                for alias in REPLICAS:
+                    connections[alias].close()
+                    del connections[alias]
+                    del connections.settings[alias]
+                replicas._caidas.clear()
+        return self.fallidos
+
+    def replicar(self):
+        """Copia la primaria en las réplicas: sin llamarla, las réplicas quedan atrasadas"""
+        connections[DEFAULT_DB_ALIAS].ensure_connection()
+        for alias in REPLICAS:
+            connections[alias].ensure_connection()
+            connections[DEFAULT_DB_ALIAS].connection.backup(connections[alias].connection)
+
+    def comprobar(self, descripcion, condicion, detalle=''):
+        if condicion:
+            self.stdout.write(f"{self.style.SUCCESS('OK'):>10}  {descripcion}")
+        else:
+            self.fallidos.append(descripcion)
+            self.stdout.write(self.style.ERROR(f'  FALLA  {descripcion} {detalle}'))
+
+    def verificar(self, estudiante):
+        cliente = Client()
+        cliente.force_login(estudiante)
+        self.replicar()
+
+        def en_replicas(selects):
+            return selects[DEFAULT_DB_ALIAS] == 0 and sum(selects[alias] for alias in REPLICAS) > 0
+
+        # GET: vistas HTML, lista de la API y exportación transmitida
+        for url in (reverse('buscar_tutor'), '/api/sesiones/', '/api/sesiones/exportar/'):
+            response, selects = selects_por_base(lambda: get(cliente, url))
+            self.comprobar(f'GET {url} lee de una réplica', response.status_code == 200 and en_replicas(selects), selects)
+
+        # Fuera de un request, en una transacción o después de escribir: primaria
+        self.comprobar('Fuera de un request se lee de la primaria', router.db_for_read(Usuario) == DEFAULT_DB_ALIAS)
+        replicas.iniciar(True)
+        try:
+            with transaction.atomic():
+                self.comprobar(
+                    'Dentro de una transacción se lee de la primaria', router.db_for_read(Usuario) == DEFAULT_DB_ALIAS
+                )
+            leida = Usuario.objects.get(pk=estudiante.pk)
+            self.comprobar('Sin escrituras se lee de una réplica', leida._state.db in REPLICAS, leida._state.db)
+            self.comprobar(
+                'Una instancia leída de una réplica se guarda en la primaria',
+                router.db_for_write(Usuario, instance=leida) == DEFAULT_DB_ALIAS,
+            )
+            self.comprobar(
+                'Después de escribir, el resto del request lee de la primaria',
+                router.db_for_read(Usuario) == DEFAULT_DB_ALIAS,
+            )
+        finally:
+            replicas.terminar()
+
+        # POST: escribe en la primaria y fija las lecturas siguientes mientras las réplicas están atrasadas
+        sesion = SesionTutoria.objects.filter(tutorado=estudiante).order_by('pk').first()
+        response, selects = selects_por_base(lambda: cliente.post(
+            '/api/mensajes/', {'sesion': sesion.pk, 'remitente': estudiante.pk, 'mensaje': 'Recién escrito'},
+            content_type='application/json',
+        ))
+        self.comprobar(
+            'POST escribe en la primaria y deja la cookie de fijación',
+            response.status_code == 201 and replicas.COOKIE_FIJACION in response.cookies, response.status_code,
+        )
+        nuevo = response.json()['id'] if response.status_code == 201 else None
+        url = f'/api/mensajes/?sesion={sesion.pk}'
+        response, selects = selects_por_base(lambda: get(cliente, url))
+        visto = any(mensaje['id'] == nuevo for mensaje in response.json()['results'])
+        self.comprobar(
+            'Después del POST el usuario lee su escritura de la primaria',
+            visto and selects[DEFAULT_DB_ALIAS] > 0 and not any(selects[alias] for alias in REPLICAS), selects,
+        )
+        del cliente.cookies[replicas.COOKIE_FIJACION]  # Vencida
+        response, selects = selects_por_base(lambda: get(cliente, url))
+        visto = any(mensaje['id'] == nuevo for mensaje in response.json()['results'])
+        self.comprobar('Con la fijación vencida se vuelve a leer de una réplica', en_replicas(selects), selects)
+        self.comprobar('La réplica sin replicar todavía no tiene el mensaje', not visto)
+        self.replicar()
+        response, selects = selects_por_base(lambda: get(cliente, url))
+        visto = any(mensaje['id'] == nuevo for mensaje in response.json()['results'])
+        self.comprobar('Una vez replicado el mensaje se lee de la réplica', visto and en_replicas(selects), selects)
+
+        # Réplicas caídas: se usa otra, y si no queda ninguna, la primaria
+        originales = {alias: connections[alias].settings_dict['NAME'] for alias in REPLICAS}
+
+        def botar(alias):
+            connections[alias].close()
+            connections[alias].settings_dict['NAME'] = str(Path(originales[alias]).parent / 'no-existe' / 'x.db')
+
+        botar('replica1')
+        response, selects = selects_por_base(lambda: get(cliente, url))
+        self.comprobar(
+            'Con una réplica caída se lee de la otra',
+            response.status_code == 200 and selects['replica2'] > 0 and selects[DEFAULT_DB_ALIAS] == 0, selects,
+        )
+        botar('replica2')
+        response, selects = selects_por_base(lambda: get(cliente, url))
+        self.comprobar(
+            'Con todas las réplicas caídas se lee de la primaria',
+            response.status_code == 200 and selects[DEFAULT_DB_ALIAS] > 0, selects,
+        )
+        self.comprobar('Las réplicas caídas quedan en espera de reintento', set(replicas._caidas) == set(REPLICAS))
+
+        for alias, nombre in originales.items():
+            connections[alias].settings_dict['NAME'] = nombre
+        replicas._caidas.clear()
+        response, selects = selects_por_base(lambda: get(cliente, url))
+        self.comprobar('Recuperadas, se vuelve a leer de las réplicas', en_replicas(selects), selects)
+        self.comprobar('Los mensajes siguen completos', Mensaje.objects.filter(pk=nuevo).exists())
@@ -1,17 +1,56 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.contrib.auth import logout
 from django.shortcuts import redirect
 from django.contrib import messages
+from django.conf import settings
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+import datetime
 
-class OneSessionPerUserMiddleware:
+from . import replicas
+
+
+class MiddlewareAsync:
     """
-    Middleware que previene múltiples sesiones simultáneas del mismo usuario.
-    Si un usuario inicia sesión en otro dispositivo, cierra la sesión anterior.
+    Base de los middleware del proyecto: sirven tanto bajo WSGI como bajo ASGI.
+    Con una cadena async (SERVIDOR_MODO=asgi) __call__ retorna la corrutina de
+    __acall__ y el request no cambia de hilo al pasar por el middleware.
     """
-    
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.procesar(request)
+
+    def procesar(self, request):
+        raise NotImplementedError
+
+    async def __acall__(self, request):
+        raise NotImplementedError
+
+
+class OneSessionPerUserMiddleware(MiddlewareAsync):
+    """
+    Middleware que previene múltiples sesiones simultáneas del mismo usuario.
+    Si un usuario inicia sesión en otro dispositivo, cierra la sesión anterior.
+    """
+
+    def procesar(self, request):
+        return self.verificar(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        # La sesión y el usuario se cargan de la base de datos: en un hilo
+        return await sync_to_async(self.verificar)(request) or await self.get_response(request)
+
+    def verificar(self, request):
+        """Retorna la redirección al login si la sesión fue reemplazada por otra"""
         if request.user.is_authenticated:
             # Obtener la sesión actual del usuario
             current_session_key = request.session.session_key
@@ -31,46 +70,112 @@ class OneSessionPerUserMiddleware:
                 )
                 logout(request)
                 return redirect('login')
+        return None
+
+
+class SessionTimeoutMiddleware(MiddlewareAsync):
+    """
+    Middleware que cierra automáticamente sesiones inactivas por más de
+    SESION_INACTIVIDAD_MINUTOS.
+
+    La hora exacta de la última actividad viaja en una cookie firmada que se
+    renueva en cada respuesta, sin escribir en la base de datos. En la sesión
+    ('last_activity') se guarda solo cuando la guardada tiene más de
+    SESION_ACTIVIDAD_GRANULARIDAD segundos: así la sesión se escribe a lo más
+    una vez por ese intervalo y sigue vigente mientras el usuario esté activo.
+    Sin la cookie (bloqueada, o de otra sesión) se usa la hora de la sesión.
+    """
+    COOKIE = 'ultima_actividad'
+
+    def procesar(self, request):
+        if not request.user.is_authenticated:
+            return self.get_response(request)
+        ahora = timezone.now()
+        response = self.verificar(request, ahora) or self.get_response(request)
+        self.renovar_cookie(request, response, ahora)
+        return response
 
-        response = self.get_response(request)
+    async def __acall__(self, request):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return await self.get_response(request)
+        ahora = timezone.now()
+        response = await sync_to_async(self.verificar)(request, ahora) or await self.get_response(request)
+        self.renovar_cookie(request, response, ahora)
         return response
 
+    def verificar(self, request, ahora):
+        """Cierra la sesión inactiva (retorna la redirección) o registra la actividad"""
+        guardada = self.leer(request.session.get('last_activity'))
+        ultima = max(filter(None, (guardada, self.leer_cookie(request))), default=None)
+
+        # Si pasó el tiempo de inactividad, cerrar sesión
+        if ultima and ahora - ultima > datetime.timedelta(minutes=settings.SESION_INACTIVIDAD_MINUTOS):
+            messages.info(
+                request,
+                'Tu sesión ha expirado por inactividad.'
+            )
+            logout(request)
+            response = redirect('login')
+            response.delete_cookie(self.COOKIE)
+            return response
+
+        # Actualizar última actividad en la sesión, solo si la guardada ya es vieja
+        if guardada is None or (ahora - guardada).total_seconds() >= settings.SESION_ACTIVIDAD_GRANULARIDAD:
+            request.session['last_activity'] = ahora.isoformat()
+        return None
+
+    def renovar_cookie(self, request, response, ahora):
+        # Tras el logout por inactividad el usuario ya es anónimo y la cookie se borró
+        if request.user.is_authenticated and request.session.session_key:
+            response.set_signed_cookie(
+                self.COOKIE, f'{self.huella(request.session.session_key)}|{ahora.isoformat()}', salt=self.COOKIE,
+                max_age=settings.SESSION_COOKIE_AGE, secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True, samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+
+    def huella(self, session_key):
+        # La cookie no lleva el session_key (legible en su valor firmado), solo un HMAC de él
+        return salted_hmac(self.COOKIE, session_key).hexdigest()
+
+    @staticmethod
+    def leer(valor):
+        return datetime.datetime.fromisoformat(valor) if valor else None
+
+    def leer_cookie(self, request):
+        valor = request.get_signed_cookie(self.COOKIE, default=None, salt=self.COOKIE)
+        if not valor:
+            return None
+        huella, _, fecha = valor.partition('|')
+        # Firmada para otra sesión (p. ej. antes de iniciar sesión de nuevo): no cuenta
+        if not request.session.session_key or not constant_time_compare(huella, self.huella(request.session.session_key)):
+            return None
+        return self.leer(fecha)
+
 
-class SessionTimeoutMiddleware:
+class LecturaReplicasMiddleware(MiddlewareAsync):
     """
-    Middleware que cierra automáticamente sesiones inactivas después de cierto tiempo.
+    Decide si las lecturas del request pueden ir a una réplica (ver main/replicas.py).
+    Después de un POST/PUT/PATCH/DELETE deja una cookie para que los requests
+    siguientes lean de la primaria mientras las réplicas se ponen al día.
     """
-    
-    def __init__(self, get_response):
-        self.get_response = get_response
 
-    def __call__(self, request):
-        if request.user.is_authenticated:
-            from django.utils import timezone
-            import datetime
-            
-            # Obtener última actividad
-            last_activity = request.session.get('last_activity')
-            
-            if last_activity:
-                # Convertir a datetime si es string
-                if isinstance(last_activity, str):
-                    last_activity = datetime.datetime.fromisoformat(last_activity)
-                
-                # Calcular tiempo de inactividad (en minutos)
-                inactive_time = (timezone.now() - last_activity).total_seconds() / 60
-                
-                # Si han pasado más de 30 minutos de inactividad, cerrar sesión
-                if inactive_time > 30:
-                    messages.info(
-                        request,
-                        'Tu sesión ha expirado por inactividad.'
-                    )
-                    logout(request)
-                    return redirect('login')
-            
-            # Actualizar última actividad
-            request.session['last_activity'] = timezone.now().isoformat()
+    def procesar(self, request):
+        self.iniciar(request)
+        return self.fijar(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        self.iniciar(request)
+        return self.fijar(request, await self.get_response(request))
 
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+    @staticmethod
+    def iniciar(request):
+        replicas.iniciar(request.method in replicas.METODOS_LECTURA and replicas.COOKIE_FIJACION not in request.COOKIES)
+
+    @staticmethod
+    def fijar(request, response):
+        if request.method not in replicas.METODOS_LECTURA and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                replicas.COOKIE_FIJACION, '1', max_age=settings.REPLICAS_FIJACION_SEGUNDOS,
+                httponly=True, samesite='Lax',
+            )
+        return response
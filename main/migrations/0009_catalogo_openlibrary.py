@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_alter_tutor_nivel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AutorCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=50, unique=True)),
+                ('nombre', models.CharField(max_length=255)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LibroCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=50, unique=True)),
+                ('titulo', models.CharField(max_length=500)),
+                ('autor', models.CharField(blank=True, max_length=255)),
+                ('anio', models.PositiveIntegerField(blank=True, null=True)),
+                ('temas', models.JSONField(blank=True, default=list)),
+                ('isbn', models.CharField(blank=True, max_length=20)),
+                ('paginas', models.PositiveIntegerField(blank=True, null=True)),
+                ('portada_id', models.PositiveBigIntegerField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TerminoCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('campo', models.CharField(choices=[('titulo', 'Título'), ('autor', 'Autor'), ('tema', 'Tema')], max_length=10)),
+                ('termino', models.CharField(max_length=64)),
+                ('libro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terminos', to='main.librocatalogo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['termino', 'libro', 'campo'], name='termino_libro_campo_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_versionmodelo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sesiontutoria',
+            index=models.Index(fields=['tutor', 'estado', 'fecha_programada'], name='sesion_tutor_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sesiontutoria',
+            index=models.Index(fields=['tutorado', 'estado', 'fecha_programada'], name='sesion_tutorado_estado_fch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sesiontutoria',
+            index=models.Index(fields=['estado', 'fecha_programada'], name='sesion_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sesiontutoria',
+            index=models.Index(fields=['fecha_programada'], name='sesion_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_indices_filtros_sesiones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Eliminacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=100)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='mensaje',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='notificacion',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='sesiontutoria',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='mensaje',
+            index=models.Index(fields=['sesion', 'fecha_actualizacion'], name='mensaje_sesion_actualiz_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', 'fecha_actualizacion'], name='notif_usuario_actualiz_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sesiontutoria',
+            index=models.Index(fields=['tutorado', 'fecha_actualizacion'], name='sesion_tutorado_actualiz_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sesiontutoria',
+            index=models.Index(fields=['tutor', 'fecha_actualizacion'], name='sesion_tutor_actualiz_idx'),
+        ),
+        migrations.AddField(
+            model_name='eliminacion',
+            name='usuario',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='eliminacion',
+            index=models.Index(fields=['usuario', 'fecha'], name='eliminacion_usuario_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_indices_mensajes_notificaciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SesionArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('modalidad', models.CharField(choices=[('Presencial', 'Presencial'), ('Online', 'Online')], max_length=15)),
+                ('fecha_programada', models.DateTimeField()),
+                ('duracion_minutos', models.PositiveIntegerField(default=60)),
+                ('estado', models.CharField(choices=[('Pendiente', 'Pendiente'), ('Aceptada', 'Aceptada'), ('Denegada', 'Denegada'), ('Completada', 'Completada'), ('Cancelada', 'Cancelada'), ('No_Show', 'No Show')], max_length=15)),
+                ('tema_solicitud', models.TextField()),
+                ('notas_tutor', models.TextField(blank=True)),
+                ('calificacion_tutor', models.PositiveIntegerField(blank=True, null=True)),
+                ('calificacion_tutorado', models.PositiveIntegerField(blank=True, null=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('razon_rechazo', models.TextField(blank=True, null=True)),
+                ('fecha_creacion', models.DateTimeField(null=True)),
+                ('fecha_actualizacion', models.DateTimeField()),
+                ('fecha_archivado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('asignatura', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='main.asignatura')),
+                ('tutor', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='main.tutor')),
+                ('tutorado', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'sesiones archivadas',
+                'ordering': ['-fecha_programada'],
+            },
+        ),
+        migrations.CreateModel(
+            name='NotificacionArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('Sesion_Agendada', 'Sesión Agendada'), ('Sesion_Aceptada', 'Sesión Aceptada'), ('Sesion_Rechazada', 'Sesión Rechazada'), ('Recordatorio', 'Recordatorio'), ('Cancelacion', 'Cancelación'), ('Evaluacion', 'Evaluación'), ('Logro', 'Logro'), ('Sistema', 'Sistema')], max_length=20)),
+                ('titulo', models.CharField(max_length=200)),
+                ('mensaje', models.TextField()),
+                ('leida', models.BooleanField(default=False)),
+                ('fecha_envio', models.DateTimeField()),
+                ('fecha_actualizacion', models.DateTimeField()),
+                ('sesion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notificaciones', to='main.sesionarchivada')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-fecha_envio'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MensajeArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('mensaje', models.TextField()),
+                ('fecha_envio', models.DateTimeField()),
+                ('fecha_actualizacion', models.DateTimeField()),
+                ('remitente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('sesion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mensajes', to='main.sesionarchivada')),
+            ],
+            options={
+                'ordering': ['fecha_envio'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='sesionarchivada',
+            index=models.Index(fields=['tutorado', 'estado', 'fecha_programada'], name='archivo_tutorado_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sesionarchivada',
+            index=models.Index(fields=['tutor', 'estado', 'fecha_programada'], name='archivo_tutor_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sesionarchivada',
+            index=models.Index(fields=['estado', 'fecha_programada'], name='archivo_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sesionarchivada',
+            index=models.Index(fields=['fecha_programada'], name='archivo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacionarchivada',
+            index=models.Index(fields=['usuario', 'fecha_envio'], name='archivo_notif_usuario_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensajearchivado',
+            index=models.Index(fields=['sesion', 'fecha_envio'], name='archivo_mensaje_sesion_idx'),
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:57
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+# Transición con la que se llega a cada estado (No_Show no tiene una)
+TRANSICION_A = {'Aceptada': 'aceptar', 'Denegada': 'denegar', 'Completada': 'finalizar', 'Cancelada': 'cancelar'}
+# Estado anterior cuando se deduce del actual (una Cancelada pudo estar Pendiente o Aceptada)
+ORIGEN = {'Aceptada': 'Pendiente', 'Denegada': 'Pendiente', 'Completada': 'Aceptada'}
+
+
+def historial_existente(apps, schema_editor):
+    """
+    Eventos de las sesiones existentes, en uso y archivadas: la solicitud y, si ya
+    no están pendientes, la transición a su estado actual (y la aceptación previa de las
+    completadas), marcados con datos.reconstruido
+    """
+    EventoSesion = apps.get_model('main', 'EventoSesion')
+    eventos = []
+    for nombre in ('SesionTutoria', 'SesionArchivada'):
+        sesiones = apps.get_model('main', nombre).objects.order_by('pk').values_list(
+            'pk', 'tutor_id', 'tutorado_id', 'estado', 'fecha_creacion', 'fecha_fin', 'fecha_actualizacion',
+        )
+        for pk, tutor_id, tutorado_id, estado, creacion, fin, actualizacion in sesiones.iterator(chunk_size=2000):
+            sesion = {'sesion_id': pk, 'tutor_id': tutor_id, 'tutorado_id': tutorado_id}
+            eventos.append(EventoSesion(
+                **sesion, tipo='solicitar', estado_destino='Pendiente', fecha=creacion or actualizacion,
+                datos={'reconstruido': True},
+            ))
+            if estado == 'Completada':
+                # Solo se llega a Completada desde Aceptada: la aceptación también se reconstruye
+                eventos.append(EventoSesion(
+                    **sesion, tipo='aceptar', estado_origen='Pendiente', estado_destino='Aceptada',
+                    fecha=creacion or actualizacion, datos={'reconstruido': True},
+                ))
+            if estado in TRANSICION_A:
+                eventos.append(EventoSesion(
+                    **sesion, tipo=TRANSICION_A[estado], estado_origen=ORIGEN.get(estado, ''), estado_destino=estado,
+                    datos={'reconstruido': True}, fecha=(fin if estado == 'Completada' else None) or actualizacion,
+                ))
+            if len(eventos) >= 2000:
+                EventoSesion.objects.bulk_create(eventos)
+                eventos = []
+    EventoSesion.objects.bulk_create(eventos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_archivo_historico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorEventosDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo', models.CharField(choices=[('solicitar', 'Solicitud'), ('aceptar', 'Aceptación'), ('denegar', 'Rechazo'), ('finalizar', 'Finalización'), ('cancelar', 'Cancelación')], max_length=20)),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'contadores de eventos por día',
+                'ordering': ['-fecha', 'tipo'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EstadisticaTutor',
+            fields=[
+                ('tutor', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='estadistica', serialize=False, to='main.tutor')),
+                ('solicitadas', models.PositiveIntegerField(default=0)),
+                ('aceptadas', models.PositiveIntegerField(default=0)),
+                ('denegadas', models.PositiveIntegerField(default=0)),
+                ('completadas', models.PositiveIntegerField(default=0)),
+                ('canceladas', models.PositiveIntegerField(default=0)),
+                ('aceptaciones_medidas', models.PositiveIntegerField(default=0)),
+                ('segundos_aceptacion', models.BigIntegerField(default=0)),
+                ('ultimo_evento', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'estadísticas de tutores',
+            },
+        ),
+        migrations.CreateModel(
+            name='PuntoControlProyeccion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('ultimo_evento', models.BigIntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EventoSesion',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('sesion_id', models.BigIntegerField()),
+                ('tutor_id', models.BigIntegerField()),
+                ('tutorado_id', models.BigIntegerField()),
+                ('tipo', models.CharField(choices=[('solicitar', 'Solicitud'), ('aceptar', 'Aceptación'), ('denegar', 'Rechazo'), ('finalizar', 'Finalización'), ('cancelar', 'Cancelación')], max_length=20)),
+                ('estado_origen', models.CharField(blank=True, max_length=15)),
+                ('estado_destino', models.CharField(max_length=15)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('datos', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+            options={
+                'verbose_name': 'evento de sesión',
+                'verbose_name_plural': 'eventos de sesiones',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['sesion_id', 'tipo'], name='evento_sesion_tipo_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='contadoreventosdia',
+            constraint=models.UniqueConstraint(fields=('fecha', 'tipo'), name='contador_fecha_tipo_unico'),
+        ),
+        migrations.RunPython(historial_existente, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,9 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.core.validators import RegexValidator, MinValueValidator, MaxValueValidator
+from datetime import timedelta
 from decimal import Decimal
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 
 class Usuario(AbstractUser):
@@ -189,9 +191,20 @@ class SesionTutoria(models.Model):
     fecha_fin = models.DateTimeField(blank=True, null=True)
     razon_rechazo = models.TextField(blank=True, null=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True, null=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)  # Sincronización incremental, ver main/sincronizacion.py
 
     class Meta:
         ordering = ['-fecha_programada']
+        # Respaldan los filtros y el orden de /api/sesiones/ (ver SesionTutoriaViewSet.filtros)
+        indexes = [
+            models.Index(fields=['tutor', 'estado', 'fecha_programada'], name='sesion_tutor_estado_fecha_idx'),
+            models.Index(fields=['tutorado', 'estado', 'fecha_programada'], name='sesion_tutorado_estado_fch_idx'),
+            models.Index(fields=['estado', 'fecha_programada'], name='sesion_estado_fecha_idx'),
+            models.Index(fields=['fecha_programada'], name='sesion_fecha_idx'),
+            # Cambios desde el último sync de cada participante (/api/sync/)
+            models.Index(fields=['tutorado', 'fecha_actualizacion'], name='sesion_tutorado_actualiz_idx'),
+            models.Index(fields=['tutor', 'fecha_actualizacion'], name='sesion_tutor_actualiz_idx'),
+        ]
 
     def __str__(self):
         return f"Sesión: {self.tutor.usuario.first_name} -> {self.tutorado.first_name} ({self.estado})"
@@ -210,12 +223,17 @@ class Mensaje(models.Model):
     remitente = models.ForeignKey(Usuario, on_delete=models.CASCADE)
     mensaje = models.TextField()
     fecha_envio = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['fecha_envio']
+        indexes = [
+            models.Index(fields=['sesion', 'fecha_envio'], name='mensaje_sesion_fecha_idx'),  # Chat
+            models.Index(fields=['sesion', 'fecha_actualizacion'], name='mensaje_sesion_actualiz_idx'),
+        ]
 
     def __str__(self):
-        return f"Mensaje de {self.remitente} en sesión {self.sesion.id}"
+        return f"Mensaje de {self.remitente} en sesión {self.sesion_id}"
 
 
 class RecursoEducativo(models.Model):
@@ -294,9 +312,282 @@ class Notificacion(models.Model):
     leida = models.BooleanField(default=False)
     sesion = models.ForeignKey(SesionTutoria, null=True, blank=True, on_delete=models.CASCADE)
     fecha_envio = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-fecha_envio']
+        indexes = [
+            # No leídas de cada usuario y su bandeja por fecha
+            models.Index(fields=['usuario', 'leida', 'fecha_envio'], name='notif_usuario_leida_fecha_idx'),
+            models.Index(fields=['usuario', 'fecha_actualizacion'], name='notif_usuario_actualiz_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.titulo} - {self.usuario.first_name}"
\ No newline at end of file
+        return f"{self.titulo} - {self.usuario.first_name}"
+
+# ===========================================
+# VERSIONES DE DATOS (CACHÉ HTTP DE LA API)
+# ===========================================
+class VersionModelo(models.Model):
+    """
+    Contador de cambios por modelo, incrementado en cada escritura (ver main/versiones.py).
+    La API lo usa para calcular ETag y Last-Modified sin leer los datos.
+    """
+    modelo = models.CharField(max_length=100, unique=True)  # app_label.model_name
+    version = models.PositiveBigIntegerField(default=0)
+    fecha_modificacion = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.modelo} v{self.version}"
+
+
+class Eliminacion(models.Model):
+    """
+    Registro de un objeto eliminado, para que /api/sync/ avise a cada usuario
+    que lo tenía (una fila por usuario afectado). Ver main/sincronizacion.py.
+    """
+    # Sin restricción de clave foránea: al eliminar un usuario sus sesiones y mensajes
+    # se registran aquí durante el mismo borrado. Las filas viejas se purgan con
+    # el comando purgar_eliminaciones (SYNC_RETENCION_DIAS)
+    usuario = models.ForeignKey(Usuario, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    modelo = models.CharField(max_length=100)  # app_label.model_name
+    objeto_id = models.PositiveBigIntegerField()
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'fecha'], name='eliminacion_usuario_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} #{self.objeto_id} eliminado"
+
+
+# ===========================================
+# ARCHIVO HISTÓRICO (ver main/archivo.py)
+# ===========================================
+# Sesiones de semestres anteriores con sus mensajes y notificaciones, movidas
+# por el comando archivar_sesiones. Mismas columnas e ids que en las tablas en
+# uso, así las vistas las muestran con las mismas plantillas.
+class SesionArchivada(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # El de la SesionTutoria original
+    tutor = models.ForeignKey(Tutor, on_delete=models.PROTECT, related_name='+')
+    tutorado = models.ForeignKey(Usuario, on_delete=models.PROTECT, related_name='+')
+    asignatura = models.ForeignKey(Asignatura, on_delete=models.PROTECT, related_name='+')
+    modalidad = models.CharField(max_length=15, choices=SesionTutoria.MODALIDAD_CHOICES)
+    fecha_programada = models.DateTimeField()
+    duracion_minutos = models.PositiveIntegerField(default=60)
+    estado = models.CharField(max_length=15, choices=SesionTutoria.ESTADO_CHOICES)
+    tema_solicitud = models.TextField()
+    notas_tutor = models.TextField(blank=True)
+    calificacion_tutor = models.PositiveIntegerField(blank=True, null=True)
+    calificacion_tutorado = models.PositiveIntegerField(blank=True, null=True)
+    fecha_inicio = models.DateTimeField(blank=True, null=True)
+    fecha_fin = models.DateTimeField(blank=True, null=True)
+    razon_rechazo = models.TextField(blank=True, null=True)
+    fecha_creacion = models.DateTimeField(null=True)
+    fecha_actualizacion = models.DateTimeField()
+    fecha_archivado = models.DateTimeField(default=timezone.now)
+
+    archivada = True
+
+    class Meta:
+        ordering = ['-fecha_programada']
+        verbose_name_plural = 'sesiones archivadas'
+        indexes = [
+            models.Index(fields=['tutorado', 'estado', 'fecha_programada'], name='archivo_tutorado_estado_idx'),
+            models.Index(fields=['tutor', 'estado', 'fecha_programada'], name='archivo_tutor_estado_idx'),
+            models.Index(fields=['estado', 'fecha_programada'], name='archivo_estado_fecha_idx'),
+            models.Index(fields=['fecha_programada'], name='archivo_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"Sesión archivada #{self.pk} ({self.estado})"
+
+
+class MensajeArchivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    sesion = models.ForeignKey(SesionArchivada, on_delete=models.CASCADE, related_name='mensajes')
+    remitente = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='+')
+    mensaje = models.TextField()
+    fecha_envio = models.DateTimeField()
+    fecha_actualizacion = models.DateTimeField()
+
+    class Meta:
+        ordering = ['fecha_envio']
+        indexes = [
+            models.Index(fields=['sesion', 'fecha_envio'], name='archivo_mensaje_sesion_idx'),
+        ]
+
+    def __str__(self):
+        return f"Mensaje archivado de la sesión {self.sesion_id}"
+
+
+class NotificacionArchivada(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='+')
+    tipo = models.CharField(max_length=20, choices=Notificacion.TIPO_CHOICES)
+    titulo = models.CharField(max_length=200)
+    mensaje = models.TextField()
+    leida = models.BooleanField(default=False)
+    sesion = models.ForeignKey(SesionArchivada, null=True, blank=True, on_delete=models.CASCADE,
+                               related_name='notificaciones')
+    fecha_envio = models.DateTimeField()
+    fecha_actualizacion = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-fecha_envio']
+        indexes = [
+            models.Index(fields=['usuario', 'fecha_envio'], name='archivo_notif_usuario_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.titulo} (archivada)"
+
+
+# ===========================================
+# HISTORIAL DE EVENTOS Y PROYECCIONES (ver main/eventos.py y main/proyecciones.py)
+# ===========================================
+class EventoSesion(models.Model):
+    """
+    Un cambio de estado de una sesión. Solo se agregan filas: el historial no se
+    modifica ni se borra (tampoco al archivar la sesión), por eso guarda los ids
+    sin claves foráneas.
+    """
+    TIPO_CHOICES = [
+        ('solicitar', 'Solicitud'),
+        ('aceptar', 'Aceptación'),
+        ('denegar', 'Rechazo'),
+        ('finalizar', 'Finalización'),
+        ('cancelar', 'Cancelación'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)  # Orden de los eventos para las proyecciones
+    sesion_id = models.BigIntegerField()
+    tutor_id = models.BigIntegerField()
+    tutorado_id = models.BigIntegerField()
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    estado_origen = models.CharField(max_length=15, blank=True)  # Vacío en la solicitud y si se desconoce
+    estado_destino = models.CharField(max_length=15)
+    fecha = models.DateTimeField(default=timezone.now)
+    datos = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)  # Otros campos escritos
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'evento de sesión'
+        verbose_name_plural = 'eventos de sesiones'
+        indexes = [
+            models.Index(fields=['sesion_id', 'tipo'], name='evento_sesion_tipo_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Los eventos de sesión no se modifican')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('Los eventos de sesión no se eliminan')
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} de la sesión {self.sesion_id}"
+
+
+class PuntoControlProyeccion(models.Model):
+    """Último evento aplicado por cada proyección"""
+    nombre = models.CharField(max_length=50, unique=True)
+    ultimo_evento = models.BigIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nombre} (evento {self.ultimo_evento})"
+
+
+class EstadisticaTutor(models.Model):
+    """Proyección 'estadisticas_tutor': totales de cada tutor y su tiempo de aceptación"""
+    tutor = models.OneToOneField(Tutor, primary_key=True, on_delete=models.DO_NOTHING,
+                                 db_constraint=False, related_name='estadistica')
+    solicitadas = models.PositiveIntegerField(default=0)
+    aceptadas = models.PositiveIntegerField(default=0)
+    denegadas = models.PositiveIntegerField(default=0)
+    completadas = models.PositiveIntegerField(default=0)
+    canceladas = models.PositiveIntegerField(default=0)
+    aceptaciones_medidas = models.PositiveIntegerField(default=0)  # Con la solicitud en el historial
+    segundos_aceptacion = models.BigIntegerField(default=0)  # Suma de solicitud -> aceptación
+    ultimo_evento = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'estadísticas de tutores'
+
+    def promedio_aceptacion(self):
+        """Tiempo promedio entre la solicitud y la aceptación, o None si no hay mediciones"""
+        if not self.aceptaciones_medidas:
+            return None
+        return timedelta(seconds=self.segundos_aceptacion / self.aceptaciones_medidas)
+
+    def __str__(self):
+        return f"Estadísticas del tutor {self.tutor_id}"
+
+
+class ContadorEventosDia(models.Model):
+    """Proyección 'eventos_por_dia': cantidad de eventos de cada tipo por día"""
+    fecha = models.DateField()
+    tipo = models.CharField(max_length=20, choices=EventoSesion.TIPO_CHOICES)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-fecha', 'tipo']
+        verbose_name_plural = 'contadores de eventos por día'
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'tipo'], name='contador_fecha_tipo_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.tipo}: {self.total}"
+
+
+# ===========================================
+# CATÁLOGO LOCAL DE OPEN LIBRARY
+# ===========================================
+class AutorCatalogo(models.Model):
+    """Autor importado del dump de Open Library (ver comando importar_openlibrary)"""
+    clave = models.CharField(max_length=50, unique=True)  # /authors/OL123A
+    nombre = models.CharField(max_length=255)
+
+    def __str__(self):
+        return self.nombre
+
+
+class LibroCatalogo(models.Model):
+    """Obra importada del dump de Open Library, usada por el proxy como fuente local"""
+    clave = models.CharField(max_length=50, unique=True)  # /works/OL123W
+    titulo = models.CharField(max_length=500)
+    autor = models.CharField(max_length=255, blank=True)
+    anio = models.PositiveIntegerField(blank=True, null=True)
+    temas = models.JSONField(default=list, blank=True)
+    isbn = models.CharField(max_length=20, blank=True)
+    paginas = models.PositiveIntegerField(blank=True, null=True)
+    portada_id = models.PositiveBigIntegerField(blank=True, null=True)
+
+    def __str__(self):
+        return self.titulo
+
+
+class TerminoCatalogo(models.Model):
+    """Índice invertido: una fila por palabra normalizada del título, autor o temas de cada libro"""
+    CAMPO_CHOICES = [
+        ('titulo', 'Título'),
+        ('autor', 'Autor'),
+        ('tema', 'Tema'),
+    ]
+
+    libro = models.ForeignKey(LibroCatalogo, on_delete=models.CASCADE, related_name='terminos')
+    campo = models.CharField(max_length=10, choices=CAMPO_CHOICES)
+    termino = models.CharField(max_length=64)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['termino', 'libro', 'campo'], name='termino_libro_campo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.termino} ({self.campo})"
@@ -0,0 +1,528 @@
+"""
+Cliente de Open Library usado por el proxy de búsqueda de libros.
+
+Las respuestas se guardan en la caché 'openlibrary' con un TTL. Cuando una
+entrada vence sigue sirviéndose durante una ventana de gracia
+(stale-while-revalidate) mientras un hilo en segundo plano la refresca.
+
+Las consultas idénticas simultáneas se coalescen (single-flight): dentro del
+proceso comparten una sola llamada en curso, y entre workers se coordinan con
+un cerrojo en la caché 'default' mientras el primero deja el resultado en la
+caché compartida.
+
+Según settings.OPENLIBRARY_FUENTE, buscar() puede usar el catálogo local
+importado con importar_openlibrary como fuente principal o de respaldo.
+
+abuscar_libros es la variante async usada por proxy_openlibrary_async: la
+llamada a la API no bloquea el event loop y comparte caché y métricas con la
+versión síncrona.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .cliente_http import CircuitoAbierto, ErrorClienteHTTP, obtener_cliente, obtener_cliente_async
+from .portadas import url_portada
+
+logger = logging.getLogger(__name__)
+
+OPENLIBRARY_CAMPOS = 'title,author_name,first_publish_year,subject,isbn,number_of_pages_median,key,cover_i'
+
+LIMITE_POR_DEFECTO = 10
+LIMITE_MAXIMO = 20
+
+# Estados de caché reportados en el header X-Cache
+CACHE_HIT = 'HIT'
+CACHE_MISS = 'MISS'
+CACHE_STALE = 'STALE'
+CACHE_LOCAL = 'LOCAL'  # Resultado del catálogo local, no pasa por la caché
+
+# Fuentes de búsqueda (settings.OPENLIBRARY_FUENTE)
+FUENTE_REMOTA = 'remota'  # Solo la API de Open Library
+FUENTE_LOCAL = 'local'  # Solo el catálogo local
+FUENTE_LOCAL_PRIMERO = 'local_primero'  # Catálogo local; la API si no hay resultados locales
+FUENTE_LOCAL_RESPALDO = 'local_respaldo'  # La API; el catálogo local si la API falla
+
+_METRICAS = ('hit', 'miss', 'stale', 'coalescida', 'upstream', 'error')
+
+# Claves que se están refrescando en este proceso
+_refrescando = set()
+_refrescando_lock = threading.Lock()
+
+# Llamadas en curso por clave, compartidas por los hilos de este proceso
+_vuelos = {}
+_vuelos_lock = threading.Lock()
+
+# Llamadas async en curso por clave, una tabla por event loop
+_vuelos_async = weakref.WeakKeyDictionary()
+
+# Intervalo de sondeo mientras otro worker consulta la misma clave
+INTERVALO_ESPERA = 0.05  # segundos
+
+
+class ErrorOpenLibrary(Exception):
+    """Error al consultar Open Library (status distinto de 200, timeout, etc.)"""
+
+
+class OpenLibraryNoDisponible(ErrorOpenLibrary):
+    """El circuito hacia Open Library está abierto; se falla sin llamar a la API"""
+
+    def __init__(self, mensaje, reintentar_en):
+        super().__init__(mensaje)
+        self.reintentar_en = reintentar_en
+
+
+def _cache():
+    return caches['openlibrary']
+
+
+def normalizar_consulta(query, limit):
+    """
+    Normaliza la búsqueda para que consultas equivalentes compartan entrada de caché.
+    Retorna (query_normalizada, limite) con el límite acotado entre 1 y 20.
+    """
+    query_normalizada = ' '.join(str(query).split()).casefold()
+
+    try:
+        limite = int(limit)
+        if limite > LIMITE_MAXIMO:
+            limite = LIMITE_MAXIMO  # Máximo 20 resultados
+        elif limite < 1:
+            limite = 1
+    except (ValueError, TypeError):
+        limite = LIMITE_POR_DEFECTO
+
+    return query_normalizada, limite
+
+
+def clave_cache(query, limite):
+    # Hash de la consulta: las claves quedan cortas y sin espacios (compatibles con memcached)
+    digest = hashlib.sha1(query.encode('utf-8')).hexdigest()
+    return f'busqueda:{limite}:{digest}'
+
+
+def formatear_libros(data, limite):
+    """Formatea la respuesta de search.json al formato que entrega el proxy"""
+    books = []
+    for doc in data.get('docs', [])[:limite]:
+        # Construir URL del libro en Open Library
+        book_key = doc.get('key', '')
+        book_url = f'https://openlibrary.org{book_key}' if book_key else None
+
+        # Portada servida por nuestro proxy con caché en disco
+        cover_url = url_portada(doc.get('cover_i'))
+
+        books.append({
+            'title': doc.get('title', 'Sin título'),
+            'author': doc.get('author_name', ['Autor desconocido'])[0] if doc.get('author_name') else 'Autor desconocido',
+            'year': doc.get('first_publish_year', 'N/A'),
+            'subjects': doc.get('subject', [])[:3],  # Primeros 3 temas
+            'isbn': doc.get('isbn', ['N/A'])[0] if doc.get('isbn') else 'N/A',
+            'pages': doc.get('number_of_pages_median', 'N/A'),
+            'url': book_url,
+            'cover_url': cover_url
+        })
+
+    return {
+        'total_results': data.get('numFound', 0),
+        'books': books
+    }
+
+
+def _parametros_busqueda(query, limite):
+    return {
+        'q': query,
+        'limit': limite,
+        'fields': OPENLIBRARY_CAMPOS
+    }
+
+
+def consultar_openlibrary(query, limite):
+    """Consulta search.json directamente, sin pasar por la caché"""
+    _contar('upstream')
+    try:
+        response = obtener_cliente('openlibrary').get('/search.json', params=_parametros_busqueda(query, limite))
+    except CircuitoAbierto as e:
+        raise OpenLibraryNoDisponible(str(e), e.reintentar_en) from e
+    except ErrorClienteHTTP as e:
+        raise ErrorOpenLibrary(str(e)) from e
+
+    return _procesar_respuesta(response, limite)
+
+
+def _procesar_respuesta(response, limite):
+    if response.status_code != 200:
+        raise ErrorOpenLibrary(f'Error en la API: {response.status_code}')
+
+    try:
+        data = response.json()
+    except ValueError as e:
+        raise ErrorOpenLibrary(f'Respuesta inválida de la API: {e}') from e
+
+    return formatear_libros(data, limite)
+
+
+def _nueva_entrada(datos):
+    return {'datos': datos, 'guardado': time.time()}
+
+
+def _timeout_entrada():
+    return settings.OPENLIBRARY_CACHE_TTL + settings.OPENLIBRARY_CACHE_STALE
+
+
+def _esta_fresca(entrada):
+    return time.time() - entrada['guardado'] < settings.OPENLIBRARY_CACHE_TTL
+
+
+def _guardar(clave, datos):
+    _cache().set(clave, _nueva_entrada(datos), _timeout_entrada())
+
+
+def _refrescar(clave, query, limite):
+    try:
+        _consultar_entre_workers(clave, query, limite, refrescar=True)
+    except ErrorOpenLibrary as e:
+        # Se sigue sirviendo la copia vencida hasta que termine la ventana de gracia
+        logger.warning('No se pudo refrescar %s: %s', clave, e)
+    finally:
+        with _refrescando_lock:
+            _refrescando.discard(clave)
+
+
+def _refrescar_en_segundo_plano(clave, query, limite):
+    with _refrescando_lock:
+        if clave in _refrescando:
+            return
+        _refrescando.add(clave)
+
+    threading.Thread(
+        target=_refrescar,
+        args=(clave, query, limite),
+        name=f'openlibrary-refresh-{clave}',
+        daemon=True,
+    ).start()
+
+
+def buscar_libros(query, limit):
+    """
+    Busca libros usando la caché.
+    Retorna (datos, estado_cache) donde estado_cache es HIT, MISS o STALE.
+    Lanza ErrorOpenLibrary si no hay copia en caché y la API falla.
+    """
+    query, limite = normalizar_consulta(query, limit)
+    clave = clave_cache(query, limite)
+
+    entrada = _cache().get(clave)
+    if entrada is not None:
+        if _esta_fresca(entrada):
+            _contar('hit')
+            return entrada['datos'], CACHE_HIT
+
+        _contar('stale')
+        _refrescar_en_segundo_plano(clave, query, limite)
+        return entrada['datos'], CACHE_STALE
+
+    if not settings.OPENLIBRARY_COALESCER:
+        _contar('miss')
+        datos = _consultar_y_guardar(clave, query, limite)
+        return datos, CACHE_MISS
+
+    return _consultar_coalescido(clave, query, limite), CACHE_MISS
+
+
+def _consultar_y_guardar(clave, query, limite):
+    try:
+        datos = consultar_openlibrary(query, limite)
+    except ErrorOpenLibrary:
+        _contar('error')
+        raise
+    _guardar(clave, datos)
+    return datos
+
+
+def _buscar_local(query, limit):
+    from .catalogo import buscar_en_catalogo
+
+    query, limite = normalizar_consulta(query, limit)
+    return buscar_en_catalogo(query, limite), CACHE_LOCAL
+
+
+def buscar(query, limit):
+    """
+    Punto de entrada del proxy: busca en la fuente configurada en
+    settings.OPENLIBRARY_FUENTE. Retorna (datos, estado_cache) como buscar_libros.
+    """
+    fuente = settings.OPENLIBRARY_FUENTE
+    if fuente == FUENTE_LOCAL:
+        return _buscar_local(query, limit)
+
+    if fuente == FUENTE_LOCAL_PRIMERO:
+        datos, estado = _buscar_local(query, limit)
+        if datos['books']:
+            return datos, estado
+
+    try:
+        return buscar_libros(query, limit)
+    except ErrorOpenLibrary as e:
+        if fuente != FUENTE_LOCAL_RESPALDO:
+            raise
+        logger.warning('Open Library no disponible, se usa el catálogo local: %s', e)
+        return _buscar_local(query, limit)
+
+
+# ============================================
+# COALESCENCIA DE CONSULTAS (SINGLE-FLIGHT)
+# ============================================
+def _cerrojo(clave):
+    return f'openlibrary:vuelo:{clave}'
+
+
+def _duracion_maxima():
+    # Tiempo máximo de una llamada con todos sus reintentos
+    return settings.OPENLIBRARY_TIMEOUT * (settings.CLIENTES_HTTP['openlibrary'].get('reintentos', 0) + 1)
+
+
+class _Vuelo:
+    """Llamada en curso cuyo resultado esperan los demás hilos"""
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.datos = None
+        self.error = None
+
+
+def _consultar_coalescido(clave, query, limite):
+    with _vuelos_lock:
+        vuelo = _vuelos.get(clave)
+        es_lider = vuelo is None
+        if es_lider:
+            vuelo = _vuelos[clave] = _Vuelo()
+
+    if not es_lider:
+        _contar('coalescida')
+        vuelo.listo.wait()
+        if vuelo.error is not None:
+            raise vuelo.error
+        return vuelo.datos
+
+    _contar('miss')
+    try:
+        vuelo.datos = _consultar_entre_workers(clave, query, limite)
+        return vuelo.datos
+    except Exception as e:
+        # Cualquier error, no solo ErrorOpenLibrary: los demás hilos lo reciben en vez de None
+        vuelo.error = e
+        raise
+    finally:
+        with _vuelos_lock:
+            _vuelos.pop(clave, None)
+        vuelo.listo.set()
+
+
+def _consultar_entre_workers(clave, query, limite, refrescar=False):
+    """
+    Solo el worker que obtiene el cerrojo llama a la API. Los demás sondean la
+    caché compartida hasta que aparece el resultado, y si el cerrojo se libera
+    sin resultado (la llamada falló o expiró) consultan por su cuenta.
+    Con refrescar=True la entrada vencida presente en la caché no cuenta como resultado.
+    """
+    cache = caches['default']
+    cerrojo = _cerrojo(clave)
+    duracion_maxima = _duracion_maxima()
+
+    if cache.add(cerrojo, 1, duracion_maxima):
+        try:
+            return _consultar_y_guardar(clave, query, limite)
+        finally:
+            cache.delete(cerrojo)
+
+    if refrescar:
+        # Otro worker ya está refrescando esta clave
+        return None
+
+    fin_espera = time.monotonic() + duracion_maxima
+    while time.monotonic() < fin_espera:
+        time.sleep(INTERVALO_ESPERA)
+        entrada = _cache().get(clave)
+        if entrada is not None:
+            return entrada['datos']
+        if cache.get(cerrojo) is None:
+            break
+
+    return _consultar_y_guardar(clave, query, limite)
+
+
+# ============================================
+# VERSIÓN ASYNC
+# ============================================
+async def aconsultar_openlibrary(query, limite):
+    """Igual que consultar_openlibrary, sin bloquear el event loop"""
+    await _acontar('upstream')
+    try:
+        response = await obtener_cliente_async('openlibrary').get('/search.json', params=_parametros_busqueda(query, limite))
+    except CircuitoAbierto as e:
+        raise OpenLibraryNoDisponible(str(e), e.reintentar_en) from e
+    except ErrorClienteHTTP as e:
+        raise ErrorOpenLibrary(str(e)) from e
+
+    return _procesar_respuesta(response, limite)
+
+
+async def abuscar(query, limit):
+    """Igual que buscar, para vistas async"""
+    fuente = settings.OPENLIBRARY_FUENTE
+    buscar_local = sync_to_async(_buscar_local)
+    if fuente == FUENTE_LOCAL:
+        return await buscar_local(query, limit)
+
+    if fuente == FUENTE_LOCAL_PRIMERO:
+        datos, estado = await buscar_local(query, limit)
+        if datos['books']:
+            return datos, estado
+
+    try:
+        return await abuscar_libros(query, limit)
+    except ErrorOpenLibrary as e:
+        if fuente != FUENTE_LOCAL_RESPALDO:
+            raise
+        logger.warning('Open Library no disponible, se usa el catálogo local: %s', e)
+        return await buscar_local(query, limit)
+
+
+async def abuscar_libros(query, limit):
+    """Igual que buscar_libros, para vistas async"""
+    query, limite = normalizar_consulta(query, limit)
+    clave = clave_cache(query, limite)
+
+    entrada = await _cache().aget(clave)
+    if entrada is not None:
+        if _esta_fresca(entrada):
+            await _acontar('hit')
+            return entrada['datos'], CACHE_HIT
+
+        await _acontar('stale')
+        # El refresco corre en un hilo aparte, no bloquea el loop
+        _refrescar_en_segundo_plano(clave, query, limite)
+        return entrada['datos'], CACHE_STALE
+
+    if not settings.OPENLIBRARY_COALESCER:
+        await _acontar('miss')
+        return await _aconsultar_y_guardar(clave, query, limite), CACHE_MISS
+
+    return await _aconsultar_coalescido(clave, query, limite), CACHE_MISS
+
+
+async def _aconsultar_y_guardar(clave, query, limite):
+    try:
+        datos = await aconsultar_openlibrary(query, limite)
+    except ErrorOpenLibrary:
+        await _acontar('error')
+        raise
+    await _cache().aset(clave, _nueva_entrada(datos), _timeout_entrada())
+    return datos
+
+
+async def _aconsultar_coalescido(clave, query, limite):
+    loop = asyncio.get_running_loop()
+    vuelos = _vuelos_async.setdefault(loop, {})
+
+    futuro = vuelos.get(clave)
+    if futuro is not None:
+        await _acontar('coalescida')
+        try:
+            # shield: si este request se cancela no cancela la llamada del líder
+            return await asyncio.shield(futuro)
+        except asyncio.CancelledError:
+            if not futuro.cancelled():
+                raise  # Se canceló este request
+            # Se canceló el request del líder, no este: se consulta de nuevo
+            return await _aconsultar_coalescido(clave, query, limite)
+
+    futuro = vuelos[clave] = loop.create_future()
+    try:
+        await _acontar('miss')
+        datos = await _aconsultar_entre_workers(clave, query, limite)
+    except asyncio.CancelledError:
+        # El request del líder se canceló: los que esperaban no deben quedar colgados
+        futuro.cancel()
+        raise
+    except BaseException as e:
+        futuro.set_exception(e)
+        # Evita el aviso de excepción no recuperada si nadie más esperaba
+        futuro.exception()
+        raise
+    else:
+        futuro.set_result(datos)
+        return datos
+    finally:
+        vuelos.pop(clave, None)
+
+
+async def _aconsultar_entre_workers(clave, query, limite):
+    cache = caches['default']
+    cerrojo = _cerrojo(clave)
+    duracion_maxima = _duracion_maxima()
+
+    if await cache.aadd(cerrojo, 1, duracion_maxima):
+        try:
+            return await _aconsultar_y_guardar(clave, query, limite)
+        finally:
+            await cache.adelete(cerrojo)
+
+    fin_espera = time.monotonic() + duracion_maxima
+    while time.monotonic() < fin_espera:
+        await asyncio.sleep(INTERVALO_ESPERA)
+        entrada = await _cache().aget(clave)
+        if entrada is not None:
+            return entrada['datos']
+        if await cache.aget(cerrojo) is None:
+            break
+
+    return await _aconsultar_y_guardar(clave, query, limite)
+
+
+# ============================================
+# MÉTRICAS DE CACHÉ
+# ============================================
+def _clave_metrica(nombre):
+    return f'openlibrary:metricas:{nombre}'
+
+
+def _contar(nombre):
+    # Se guardan en la caché por defecto para no competir con las respuestas por espacio
+    cache = caches['default']
+    clave = _clave_metrica(nombre)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        if not cache.add(clave, 1, None):
+            cache.incr(clave)
+
+
+async def _acontar(nombre):
+    cache = caches['default']
+    clave = _clave_metrica(nombre)
+    try:
+        await cache.aincr(clave)
+    except ValueError:
+        if not await cache.aadd(clave, 1, None):
+            await cache.aincr(clave)
+
+
+def obtener_metricas():
+    """Contadores de hit/miss/stale/coalescida/upstream/error y tasas de acierto"""
+    valores = caches['default'].get_many([_clave_metrica(nombre) for nombre in _METRICAS])
+    metricas = {nombre: valores.get(_clave_metrica(nombre), 0) for nombre in _METRICAS}
+    consultas = metricas['hit'] + metricas['stale'] + metricas['miss']
+    metricas['tasa_aciertos'] = round((metricas['hit'] + metricas['stale']) / consultas, 4) if consultas else 0.0
+    # Consultas que no llegaron a la API gracias a la caché o a la coalescencia
+    solicitudes = consultas + metricas['coalescida']
+    metricas['tasa_ahorro_upstream'] = round(1 - metricas['upstream'] / solicitudes, 4) if solicitudes else 0.0
+    return metricas
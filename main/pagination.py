@@ -0,0 +1,73 @@
+"""
+Paginación de la API REST.
+
+Por defecto las listas se paginan por cursor sobre un orden indexado (la
+clave primaria si el viewset no declara otro): cada página es un
+WHERE id < cursor ORDER BY id DESC LIMIT n por índice, sin
+COUNT(*) ni OFFSET, y sin filas repetidas ni saltadas aunque se inserten o
+eliminen registros entre una página y otra.
+
+La paginación por número de página (count, ?page=) queda disponible pidiendo
+?paginacion=paginas, para los clientes que aún la usan (api_client.html).
+"""
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+PARAMETRO_MODO = 'paginacion'
+MODO_PAGINAS = 'paginas'
+
+# Orden estable e indexado por defecto, común a ambos modos. Los viewsets pueden
+# declarar otro (ordering) y permitir ?ordering=, ver main/filtros.py
+ORDEN = ('-pk',)
+
+
+class PaginacionPorPagina(PageNumberPagination):
+    """Modo heredado: count + ?page=, con su COUNT(*) y OFFSET"""
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return settings.API_PAGE_SIZE_MAXIMO
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Respeta el orden pedido con ?ordering= (filtros.OrdenIndexado)
+        if not queryset.query.order_by:
+            queryset = queryset.order_by(*ORDEN)
+        return super().paginate_queryset(queryset, request, view)
+
+
+class PaginacionCursor(CursorPagination):
+    """
+    Paginación por cursor (?cursor=, ?page_size= hasta API_PAGE_SIZE_MAXIMO).
+    Con ?paginacion=paginas delega en PaginacionPorPagina.
+    """
+    ordering = ORDEN
+    page_size_query_param = 'page_size'
+    heredada = None
+
+    @property
+    def max_page_size(self):
+        return settings.API_PAGE_SIZE_MAXIMO
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(PARAMETRO_MODO) == MODO_PAGINAS:
+            self.heredada = PaginacionPorPagina()
+            pagina = self.heredada.paginate_queryset(queryset, request, view)
+            self.display_page_controls = self.heredada.display_page_controls
+            return pagina
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.heredada is not None:
+            return self.heredada.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.heredada is not None:
+            return self.heredada.get_html_context()
+        return super().get_html_context()
+
+    def to_html(self):
+        if self.heredada is not None:
+            return self.heredada.to_html()
+        return super().to_html()
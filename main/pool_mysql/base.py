@@ -0,0 +1,95 @@
+"""
+Backend MySQL (PyMySQL) con pool de conexiones: ENGINE 'main.pool_mysql'.
+
+Igual que django.db.backends.mysql, salvo que al cerrar la conexión (al
+terminar cada request, con CONN_MAX_AGE=0) se devuelve al pool del proceso
+en vez de cerrarse, y al abrirla se toma del pool: los requests no pagan la
+conexión TCP ni la autenticación. Se configura con la clave POOL de la base
+de datos (ver _mysql() en settings.py):
+
+    'POOL': {'TAMANO': 10, 'ESPERA': 5, 'RECICLAR': 1800, 'VERIFICAR': 30}
+
+TAMANO es el máximo de conexiones abiertas por proceso, ESPERA los segundos
+que un request espera una conexión libre, RECICLAR la edad máxima de una
+conexión y VERIFICAR cuánto puede estar libre sin comprobarse con un ping.
+"""
+import os
+import threading
+
+from django.db.backends.mysql import base
+from pymysql.constants import SERVER_STATUS
+
+from .pool import Pool, PoolAgotado
+
+Database = base.Database
+
+# {alias: (pid, Pool)}: después de un fork el proceso hijo arma su propio pool
+_pools = {}
+_lock = threading.Lock()
+
+
+def _ping(conexion):
+    try:
+        conexion.ping(reconnect=False)
+    except Database.Error:
+        return False
+    return True
+
+
+def pool_de(alias, crear=None):
+    """El pool del alias en este proceso; si no existe y se indica crear(), lo crea con él"""
+    with _lock:
+        pid, pool = _pools.get(alias, (None, None))
+        if pid != os.getpid():
+            pool = None
+            if crear is not None:
+                pool = crear()
+                _pools[alias] = (os.getpid(), pool)
+        return pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def _crear_pool(self, conn_params):
+        opciones = self.settings_dict.get('POOL', {})
+        return Pool(
+            conectar=lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+            cerrar=lambda conexion: conexion.close(),
+            esta_viva=_ping,
+            tamano=opciones.get('TAMANO', 10),
+            espera=opciones.get('ESPERA', 5),
+            reciclar=opciones.get('RECICLAR', 1800),
+            verificar=opciones.get('VERIFICAR', 30),
+        )
+
+    def get_new_connection(self, conn_params):
+        pool = pool_de(self.alias, crear=lambda: self._crear_pool(conn_params))
+        try:
+            return pool.obtener()
+        except PoolAgotado as e:
+            raise Database.OperationalError(str(e)) from e
+
+    def init_connection_state(self):
+        # Las variables de sesión (SQL_AUTO_IS_NULL, nivel de aislamiento) sobreviven en el pool
+        if getattr(self.connection, 'estado_inicializado', False):
+            return
+        super().init_connection_state()
+        self.connection.estado_inicializado = True
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool = pool_de(self.alias)
+        if pool is None:
+            # Conexión abierta antes de un fork: no pertenece al pool de este proceso
+            with self.wrap_database_errors:
+                return self.connection.close()
+        # Con errores sin resolver la conexión puede estar rota: no vuelve al pool
+        descartar = self.errors_occurred
+        if not descartar and self.connection.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+            # Cerrada dentro de una transacción: se devuelve sin nada pendiente
+            try:
+                self.connection.rollback()
+            except Database.Error:
+                descartar = True
+        pool.devolver(self.connection, descartar=descartar)
@@ -0,0 +1,107 @@
+"""
+Pool de conexiones acotado y seguro entre hilos.
+
+Las conexiones libres se entregan de la más reciente a la más antigua (así
+las que sobran envejecen y se reciclan), y al sacar una:
+
+- si tiene más de `reciclar` segundos se cierra y se usa otra;
+- si estuvo libre más de `verificar` segundos se comprueba con esta_viva()
+  antes de entregarla (el servidor pudo cerrarla por wait_timeout).
+
+Nunca hay más de `tamano` conexiones abiertas: con todas en uso, obtener()
+espera hasta `espera` segundos a que se devuelva una y luego lanza PoolAgotado.
+"""
+import threading
+import time
+from collections import deque
+
+
+class PoolAgotado(Exception):
+    pass
+
+
+class Pool:
+    def __init__(self, conectar, cerrar, esta_viva, tamano=10, espera=5, reciclar=1800, verificar=30):
+        self.conectar = conectar
+        self.cerrar = cerrar
+        self.esta_viva = esta_viva
+        self.tamano = tamano
+        self.espera = espera
+        self.reciclar = reciclar
+        self.verificar = verificar
+        self._cupos = threading.BoundedSemaphore(tamano)
+        self._libres = deque()  # (conexion, creada, devuelta)
+        self._creadas = {}  # {id(conexion): creada} de las que están en uso
+        self._lock = threading.Lock()
+        self.estadisticas = {'creadas': 0, 'reutilizadas': 0, 'descartadas': 0, 'agotado': 0}
+
+    def obtener(self):
+        if not self._cupos.acquire(timeout=self.espera):
+            with self._lock:
+                self.estadisticas['agotado'] += 1
+            raise PoolAgotado(f'Las {self.tamano} conexiones del pool siguen en uso después de {self.espera} s')
+        try:
+            while True:
+                with self._lock:
+                    libre = self._libres.pop() if self._libres else None
+                if libre is None:
+                    conexion = self.conectar()
+                    creada = time.monotonic()
+                    with self._lock:
+                        self.estadisticas['creadas'] += 1
+                        self._creadas[id(conexion)] = creada
+                    return conexion
+
+                conexion, creada, devuelta = libre
+                ahora = time.monotonic()
+                if ahora - creada >= self.reciclar or (
+                    ahora - devuelta >= self.verificar and not self.esta_viva(conexion)
+                ):
+                    self._descartar(conexion)
+                    continue
+                with self._lock:
+                    self.estadisticas['reutilizadas'] += 1
+                    self._creadas[id(conexion)] = creada
+                return conexion
+        except BaseException:
+            self._cupos.release()
+            raise
+
+    def devolver(self, conexion, descartar=False):
+        """Devuelve una conexión obtenida con obtener(); con descartar se cierra en vez de reutilizarse"""
+        with self._lock:
+            creada = self._creadas.pop(id(conexion), None)
+        if creada is None:
+            self._descartar(conexion)  # No salió de este pool: no ocupa un cupo
+            return
+        try:
+            if descartar or time.monotonic() - creada >= self.reciclar:
+                self._descartar(conexion)
+            else:
+                with self._lock:
+                    self._libres.append((conexion, creada, time.monotonic()))
+        finally:
+            self._cupos.release()
+
+    def _descartar(self, conexion):
+        with self._lock:
+            self.estadisticas['descartadas'] += 1
+        try:
+            self.cerrar(conexion)
+        except Exception:
+            pass  # Ya estaba cerrada o el servidor no responde: no queda nada que liberar
+
+    def cerrar_libres(self):
+        with self._lock:
+            libres, self._libres = list(self._libres), deque()
+        for conexion, _, _ in libres:
+            self._descartar(conexion)
+
+    def estado(self):
+        with self._lock:
+            return {
+                **self.estadisticas,
+                'tamano': self.tamano,
+                'en_uso': len(self._creadas),
+                'libres': len(self._libres),
+            }
@@ -0,0 +1,200 @@
+"""
+Caché en disco de las portadas de Open Library.
+
+Cada portada se descarga una sola vez de covers.openlibrary.org y se sirve
+desde disco. El directorio tiene un tamaño máximo: al superarlo se eliminan
+las portadas usadas hace más tiempo (la fecha de modificación del archivo se
+actualiza en cada lectura, así funciona como LRU).
+
+El tamaño del directorio se lleva en memoria y se suma en cada descarga; solo
+se recorre el directorio al superar el máximo o cada PORTADAS_RECUENTO_CADA
+descargas (para contar lo que escribieron los otros workers). Las portadas que
+Open Library no tiene se recuerdan en la caché por OPENLIBRARY_PORTADAS_404_TTL.
+"""
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.urls import reverse
+
+from .cliente_http import ErrorClienteHTTP, obtener_cliente
+
+logger = logging.getLogger(__name__)
+
+TAMANOS = ('S', 'M', 'L')
+
+# Al limpiar se baja hasta este porcentaje del máximo, para no limpiar en cada descarga
+FRACCION_TRAS_LIMPIEZA = 0.9
+
+# Descargas entre recuentos completos del directorio
+PORTADAS_RECUENTO_CADA = 100
+
+_descargando = {}
+_descargando_lock = threading.Lock()
+_limpieza_lock = threading.Lock()
+
+# Bytes en el directorio según el último recuento más lo descargado desde entonces (None: sin contar)
+_total_bytes = None
+_descargas_sin_recuento = 0
+_total_lock = threading.Lock()
+
+
+class PortadaNoEncontrada(Exception):
+    """Open Library no tiene portada con ese id"""
+
+
+class ErrorPortada(Exception):
+    """No se pudo descargar la portada"""
+
+
+def url_portada(cover_id, tamano='M'):
+    """URL local de la portada, para los resultados del proxy"""
+    if not cover_id:
+        return None
+    return reverse('portada_openlibrary', args=[cover_id, tamano])
+
+
+def _directorio():
+    directorio = Path(settings.OPENLIBRARY_PORTADAS_DIR)
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def _ruta(cover_id, tamano):
+    return _directorio() / f'{cover_id}-{tamano}.jpg'
+
+
+def _clave_no_encontrada(cover_id, tamano):
+    return f'portadas:404:{cover_id}-{tamano}'
+
+
+def _lock_de(clave):
+    with _descargando_lock:
+        return _descargando.setdefault(clave, threading.Lock())
+
+
+def _descargar(cover_id, tamano, ruta):
+    try:
+        # default=false: Open Library responde 404 en vez de una imagen vacía
+        response = obtener_cliente('openlibrary_portadas').get(
+            f'/b/id/{cover_id}-{tamano}.jpg', params={'default': 'false'}
+        )
+    except ErrorClienteHTTP as e:
+        raise ErrorPortada(str(e)) from e
+
+    if response.status_code == 404:
+        caches['default'].set(_clave_no_encontrada(cover_id, tamano), True, settings.OPENLIBRARY_PORTADAS_404_TTL)
+        raise PortadaNoEncontrada(f'Portada {cover_id} no encontrada')
+    if response.status_code != 200:
+        raise ErrorPortada(f'Error en la API: {response.status_code}')
+
+    # Se escribe a un temporal y se renombra: nunca se sirve un archivo a medio escribir
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(response.content)
+        os.replace(temporal, ruta)
+    except OSError:
+        if os.path.exists(temporal):
+            os.unlink(temporal)
+        raise
+
+    _registrar_descarga(len(response.content))
+
+
+def obtener_portada(cover_id, tamano):
+    """
+    Retorna la ruta en disco de la portada, descargándola si no está.
+    Lanza PortadaNoEncontrada o ErrorPortada.
+    """
+    ruta = _ruta(cover_id, tamano)
+    if not ruta.exists():
+        if caches['default'].get(_clave_no_encontrada(cover_id, tamano)):
+            raise PortadaNoEncontrada(f'Portada {cover_id} no encontrada')
+        # Un solo hilo descarga cada portada; los demás esperan y la leen de disco
+        try:
+            with _lock_de(ruta.name):
+                if not ruta.exists():
+                    _descargar(cover_id, tamano, ruta)
+        finally:
+            # También tras un 404 o un error: los ids vienen del cliente y el dict no debe crecer
+            with _descargando_lock:
+                _descargando.pop(ruta.name, None)
+    else:
+        try:
+            os.utime(ruta)  # Marca de uso reciente para la expulsión LRU
+        except OSError:
+            pass
+    return ruta
+
+
+def abrir_portada(cover_id, tamano):
+    """
+    Retorna (archivo abierto, etag) de la portada. Si la limpieza la borra entre
+    obtenerla y abrirla se descarga de nuevo; ya abierta, borrarla no la afecta.
+    Lanza PortadaNoEncontrada o ErrorPortada.
+    """
+    for intento in range(2):
+        ruta = obtener_portada(cover_id, tamano)
+        try:
+            archivo = open(ruta, 'rb')
+        except FileNotFoundError:
+            if intento:
+                raise ErrorPortada(f'Portada {cover_id} eliminada mientras se servía')
+            continue
+        return archivo, etag_portada(ruta, os.fstat(archivo.fileno()).st_size)
+
+
+def etag_portada(ruta, tamano_bytes):
+    # Las portadas de Open Library no cambian para un mismo id y tamaño
+    return f'"{ruta.stem}-{tamano_bytes:x}"'
+
+
+def _registrar_descarga(tamano_bytes):
+    """Suma la descarga al total del directorio; limpia si supera el máximo o toca recontar"""
+    global _total_bytes, _descargas_sin_recuento
+    with _total_lock:
+        _descargas_sin_recuento += 1
+        recontar = _total_bytes is None or _descargas_sin_recuento >= PORTADAS_RECUENTO_CADA
+        if not recontar:
+            _total_bytes += tamano_bytes
+            recontar = _total_bytes > settings.OPENLIBRARY_PORTADAS_MAX_BYTES
+    if recontar:
+        _limpiar_si_excede()
+
+
+def _limpiar_si_excede():
+    global _total_bytes, _descargas_sin_recuento
+    maximo = settings.OPENLIBRARY_PORTADAS_MAX_BYTES
+    if not _limpieza_lock.acquire(blocking=False):
+        return  # Otro hilo ya está limpiando
+    try:
+        archivos = []
+        total = 0
+        for entrada in os.scandir(_directorio()):
+            if entrada.is_file() and entrada.name.endswith('.jpg'):
+                estado = entrada.stat()
+                archivos.append((estado.st_mtime, estado.st_size, entrada.path))
+                total += estado.st_size
+
+        if total > maximo:
+            objetivo = maximo * FRACCION_TRAS_LIMPIEZA
+            for _, tamano, ruta in sorted(archivos):
+                if total <= objetivo:
+                    break
+                try:
+                    os.unlink(ruta)
+                    total -= tamano
+                except FileNotFoundError:
+                    pass
+            logger.info('Caché de portadas reducida a %s bytes', total)
+
+        with _total_lock:
+            _total_bytes = total
+            _descargas_sin_recuento = 0
+    finally:
+        _limpieza_lock.release()
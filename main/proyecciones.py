@@ -0,0 +1,154 @@
+"""
+Proyecciones del historial de eventos de las sesiones (main/eventos.py).
+
+Una proyección mantiene tablas derivadas de EventoSesion (estadísticas por
+tutor, contadores por día) aplicando los eventos en orden de id desde su
+punto de control (PuntoControlProyeccion): cada actualización solo procesa
+los eventos nuevos, por lotes de PROYECCIONES_LOTE, y guarda el punto de
+control en la misma transacción que las tablas.
+
+Los eventos de los últimos PROYECCIONES_MARGEN_SEGUNDOS se dejan para la
+siguiente actualización: una transacción que aún no terminaba puede confirmar
+un evento con un id menor que los ya visibles (igual que en main/sincronizacion.py).
+
+    python manage.py actualizar_proyecciones                 # Eventos nuevos
+    python manage.py actualizar_proyecciones --reconstruir   # Desde cero, en paralelo
+
+Para agregar una proyección se hereda de Proyeccion, se registra con
+@proyeccion e implementa aplicar(eventos).
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ContadorEventosDia, EstadisticaTutor, EventoSesion, PuntoControlProyeccion
+
+PROYECCIONES = {}
+
+
+def proyeccion(clase):
+    PROYECCIONES[clase.nombre] = clase()
+    return clase
+
+
+class Proyeccion:
+    nombre = None
+    modelos = ()  # Tablas que mantiene, se vacían al reconstruir
+
+    def aplicar(self, eventos):
+        """Aplica un lote de eventos, en orden de id, a las tablas de la proyección"""
+        raise NotImplementedError
+
+    def reiniciar(self):
+        for modelo in self.modelos:
+            modelo.objects.all().delete()
+
+
+def actualizar(nombre, lote=None):
+    """Aplica a la proyección los eventos posteriores a su punto de control; retorna cuántos"""
+    proyeccion = PROYECCIONES[nombre]
+    lote = lote or settings.PROYECCIONES_LOTE
+    aplicados = 0
+    while True:
+        with transaction.atomic():
+            # Bloqueado: dos actualizaciones de la misma proyección no aplican el mismo lote
+            punto, _ = PuntoControlProyeccion.objects.select_for_update().get_or_create(nombre=nombre)
+            limite = timezone.now() - timedelta(seconds=settings.PROYECCIONES_MARGEN_SEGUNDOS)
+            leidos = list(EventoSesion.objects.filter(pk__gt=punto.ultimo_evento).order_by('pk')[:lote])
+            eventos = []
+            for evento in leidos:
+                if evento.fecha >= limite:
+                    break
+                eventos.append(evento)
+            if eventos:
+                proyeccion.aplicar(eventos)
+                punto.ultimo_evento = eventos[-1].pk
+                punto.save(update_fields=['ultimo_evento', 'fecha_actualizacion'])
+        aplicados += len(eventos)
+        if len(eventos) < lote:
+            return aplicados
+
+
+def reconstruir(nombre, lote=None):
+    """Vacía la proyección y vuelve a aplicar todo el historial, en una transacción; retorna cuántos eventos"""
+    with transaction.atomic():
+        PROYECCIONES[nombre].reiniciar()
+        PuntoControlProyeccion.objects.update_or_create(nombre=nombre, defaults={'ultimo_evento': 0})
+        return actualizar(nombre, lote)
+
+
+# ===========================================
+# PROYECCIONES
+# ===========================================
+
+@proyeccion
+class EstadisticasTutor(Proyeccion):
+    nombre = 'estadisticas_tutor'
+    modelos = (EstadisticaTutor,)
+    contadores = {
+        'solicitar': 'solicitadas',
+        'aceptar': 'aceptadas',
+        'denegar': 'denegadas',
+        'finalizar': 'completadas',
+        'cancelar': 'canceladas',
+    }
+
+    def aplicar(self, eventos):
+        # Fecha de solicitud de las sesiones aceptadas en el lote (del lote o de lotes anteriores)
+        aceptadas = {evento.sesion_id for evento in eventos if evento.tipo == 'aceptar'}
+        solicitudes = dict(
+            EventoSesion.objects.filter(sesion_id__in=aceptadas, tipo='solicitar').values_list('sesion_id', 'fecha')
+        ) if aceptadas else {}
+
+        estadisticas = EstadisticaTutor.objects.in_bulk({evento.tutor_id for evento in eventos})
+        nuevas = {}
+        for evento in eventos:
+            estadistica = estadisticas.get(evento.tutor_id)
+            if estadistica is None:
+                estadistica = estadisticas[evento.tutor_id] = nuevas[evento.tutor_id] = EstadisticaTutor(
+                    tutor_id=evento.tutor_id
+                )
+            campo = self.contadores[evento.tipo]
+            setattr(estadistica, campo, getattr(estadistica, campo) + 1)
+            solicitud = solicitudes.get(evento.sesion_id)
+            # Los eventos reconstruidos de la migración no tienen la fecha real de aceptación
+            if (evento.tipo == 'aceptar' and solicitud is not None and solicitud <= evento.fecha
+                    and not evento.datos.get('reconstruido')):
+                estadistica.aceptaciones_medidas += 1
+                estadistica.segundos_aceptacion += int((evento.fecha - solicitud).total_seconds())
+            estadistica.ultimo_evento = evento.fecha
+
+        EstadisticaTutor.objects.bulk_create(nuevas.values())
+        existentes = [estadistica for tutor_id, estadistica in estadisticas.items() if tutor_id not in nuevas]
+        if existentes:
+            EstadisticaTutor.objects.bulk_update(
+                existentes, [*self.contadores.values(), 'aceptaciones_medidas', 'segundos_aceptacion', 'ultimo_evento'],
+            )
+
+
+@proyeccion
+class EventosPorDia(Proyeccion):
+    nombre = 'eventos_por_dia'
+    modelos = (ContadorEventosDia,)
+
+    def aplicar(self, eventos):
+        totales = Counter((timezone.localdate(evento.fecha), evento.tipo) for evento in eventos)
+        fechas = {fecha for fecha, _ in totales}
+        contadores = {
+            (contador.fecha, contador.tipo): contador
+            for contador in ContadorEventosDia.objects.filter(fecha__in=fechas)
+        }
+        nuevos, existentes = [], []
+        for clave, total in totales.items():
+            contador = contadores.get(clave)
+            if contador is None:
+                nuevos.append(ContadorEventosDia(fecha=clave[0], tipo=clave[1], total=total))
+            else:
+                contador.total += total
+                existentes.append(contador)
+        ContadorEventosDia.objects.bulk_create(nuevos)
+        if existentes:
+            ContadorEventosDia.objects.bulk_update(existentes, ['total'])
@@ -0,0 +1,203 @@
+"""
+Herramientas para medir consultas SQL sobre una base de datos sembrada.
+
+Las usan los comandos de verificación (verificar_consultas) y los
+benchmarks: crean una base de datos de prueba desechable, la siembran con un
+conjunto de datos representativo y miden cada request con el cliente de test.
+"""
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import Group, Permission
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import (CaptureQueriesContext, setup_databases, setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+from django.urls import URLResolver, reverse
+from django.utils import timezone
+
+from .models import (Asignatura, Carrera, Mensaje, Notificacion, RecursoEducativo, SesionTutoria,
+                     Tutor, Usuario)
+
+# Rutas de main/urls.py que no se recorren, {nombre: motivo}
+RUTAS_EXCLUIDAS = {
+    'logout': 'cierra la sesión del cliente que hace el recorrido',
+    'portada_openlibrary': 'descarga la portada desde covers.openlibrary.org',
+}
+
+
+@contextmanager
+def base_de_datos_temporal():
+    """Crea la base de datos de test (test_<NAME>) y la elimina al salir"""
+    setup_test_environment()
+    configuracion = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(configuracion, verbosity=0)
+        teardown_test_environment()
+
+
+def sembrar_datos(tutores=12, estudiantes=30, sesiones_por_tutor=15, mensajes_por_sesion=3, recursos_por_tutor=3):
+    """
+    Siembra un conjunto de datos representativo y retorna los usuarios de cada rol:
+    {'admin': ..., 'tutor': ..., 'estudiante': ...}
+    """
+    carrera = Carrera.objects.create(
+        nombre='Ingeniería en Informática', codigo='INFO', area='Tecnologia',
+        nivel='Profesional', duracion_semestres=8,
+    )
+    asignaturas = Asignatura.objects.bulk_create([
+        Asignatura(nombre=f'Asignatura {n}', codigo=f'ASG{n:03d}', carrera=carrera, semestre=n % 8 + 1)
+        for n in range(10)
+    ])
+
+    admin = Usuario.objects.create_superuser(
+        rut='11111111-1', username='11111111-1', email='admin@inacap.cl', password='clave-admin',
+        first_name='Admin', last_name='Sistema',
+    )
+    usuarios_tutores = Usuario.objects.bulk_create([
+        Usuario(rut=f'19{n:06d}-1', username=f'19{n:06d}-1', first_name=f'Tutor{n}', last_name='Prueba',
+                email=f'tutor{n}@inacap.cl', es_tutor=True)
+        for n in range(tutores)
+    ])
+    usuarios_estudiantes = Usuario.objects.bulk_create([
+        Usuario(rut=f'20{n:06d}-2', username=f'20{n:06d}-2', first_name=f'Estudiante{n}', last_name='Prueba',
+                email=f'estudiante{n}@inacap.cl')
+        for n in range(estudiantes)
+    ])
+
+    grupo = Group.objects.create(name='Estudiantes')
+    grupo.permissions.set(Permission.objects.filter(content_type__app_label='main')[:6])
+    grupo.user_set.add(*usuarios_estudiantes)
+
+    perfiles = Tutor.objects.bulk_create([
+        Tutor(usuario=usuario, fecha_certificacion=date(2024, 1, 1), calificacion_promedio=Decimal('4.50'),
+              especialidades='Programación, Cálculo', horas_acumuladas=Decimal('12.00'))
+        for usuario in usuarios_tutores
+    ])
+
+    ahora = timezone.now()
+    estados = ['Pendiente', 'Aceptada', 'Completada', 'Denegada', 'Cancelada']
+    sesiones = SesionTutoria.objects.bulk_create([
+        SesionTutoria(
+            tutor=tutor,
+            tutorado=usuarios_estudiantes[(i + n) % estudiantes],
+            asignatura=asignaturas[n % len(asignaturas)],
+            modalidad='Online',
+            fecha_programada=ahora + timedelta(days=n - sesiones_por_tutor // 2, hours=i),
+            estado=estados[n % len(estados)],
+            tema_solicitud='Repaso para la prueba',
+        )
+        for i, tutor in enumerate(perfiles)
+        for n in range(sesiones_por_tutor)
+    ])
+
+    Mensaje.objects.bulk_create([
+        Mensaje(sesion=sesion, remitente=sesion.tutorado, mensaje=f'Mensaje {n}')
+        for sesion in sesiones
+        for n in range(mensajes_por_sesion)
+    ])
+    Notificacion.objects.bulk_create([
+        Notificacion(usuario=sesion.tutorado, tipo='Sesion_Agendada', titulo='Solicitud enviada',
+                     mensaje='Tu solicitud fue enviada', sesion=sesion, leida=n % 2 == 0)
+        for n, sesion in enumerate(sesiones)
+    ])
+    RecursoEducativo.objects.bulk_create([
+        RecursoEducativo(tutor=tutor, asignatura=asignaturas[n % len(asignaturas)], titulo=f'Guía {n}',
+                         tipo='Guia', descripcion='Guía de ejercicios')
+        for tutor in perfiles
+        for n in range(recursos_por_tutor)
+    ])
+
+    return {
+        'admin': admin,
+        'tutor': usuarios_tutores[0],
+        'estudiante': usuarios_estudiantes[0],
+    }
+
+
+# Vistas HTML que se pueden pedir con GET sin modificar datos ni llamar a servicios externos
+VISTAS_GET = (
+    'index', 'dashboard', 'buscar_tutor', 'perfil_tutor', 'mis_sesiones', 'agendar_sesion',
+    'lista_recursos', 'crear_recurso', 'notificaciones', 'perfil_usuario', 'mi_disponibilidad', 'chat',
+    'api_client', 'admin_dashboard', 'admin_usuarios', 'admin_editar_usuario', 'admin_sesiones',
+    'admin_tutores', 'admin_grupos_permisos',
+)
+
+
+def recorrido_vistas(usuario):
+    """[(nombre, url)] de cada vista de VISTAS_GET, con argumentos que el usuario puede ver"""
+    sesion = (
+        SesionTutoria.objects.filter(Q(tutorado=usuario) | Q(tutor__usuario=usuario)).order_by('pk').first()
+        or SesionTutoria.objects.order_by('pk').first()
+    )
+    tutor = Tutor.objects.order_by('pk').first()
+    argumentos = {
+        'perfil_tutor': [tutor.pk],
+        'agendar_sesion': [tutor.pk],
+        'chat': [sesion.pk],
+        'admin_editar_usuario': [usuario.pk],
+    }
+    return [(nombre, reverse(nombre, args=argumentos.get(nombre, []))) for nombre in VISTAS_GET]
+
+
+def _patrones_con_nombre(patrones):
+    for patron in patrones:
+        if isinstance(patron, URLResolver):
+            yield from _patrones_con_nombre(patron.url_patterns)
+        elif patron.name:
+            yield patron
+
+
+def recorrido_urls(usuario):
+    """
+    [(nombre, url)] de cada ruta con nombre de main/urls.py (incluidas las de la API)
+    salvo RUTAS_EXCLUIDAS, con argumentos que el usuario puede ver
+    """
+    from .urls import router, urlpatterns
+
+    sesion = (
+        SesionTutoria.objects.filter(Q(tutorado=usuario) | Q(tutor__usuario=usuario)).order_by('pk').first()
+        or SesionTutoria.objects.order_by('pk').first()
+    )
+    argumentos = {
+        'tutor_id': Tutor.objects.order_by('pk').values_list('pk', flat=True).first(),
+        'sesion_id': sesion.pk,
+        'recurso_id': RecursoEducativo.objects.order_by('pk').values_list('pk', flat=True).first(),
+        'usuario_id': usuario.pk,
+    }
+    modelos_api = {basename: viewset.queryset.model for _, viewset, basename in router.registry}
+
+    recorrido = {}
+    for patron in _patrones_con_nombre(urlpatterns):
+        if patron.name in recorrido or patron.name in RUTAS_EXCLUIDAS:
+            continue
+        parametros = set(patron.pattern.regex.groupindex)
+        if 'format' in parametros:
+            continue  # Variante .json/.api de la misma ruta de la API
+        kwargs = {parametro: argumentos.get(parametro) for parametro in parametros}
+        if 'pk' in kwargs:
+            modelo = modelos_api[patron.name.rsplit('-', 1)[0]]
+            kwargs['pk'] = modelo.objects.order_by('pk').values_list('pk', flat=True).first()
+        recorrido[patron.name] = reverse(patron.name, kwargs=kwargs)
+    return list(recorrido.items())
+
+
+def medir(cliente, url, metodo='get', **kwargs):
+    """
+    Ejecuta el request y retorna (response, consultas, tiempo_db_ms).
+    El tiempo de base de datos se suma a partir de lo capturado por connection.queries.
+    """
+    with CaptureQueriesContext(connection) as capturadas:
+        inicio = time.perf_counter()
+        response = getattr(cliente, metodo)(url, **kwargs)
+        if response.streaming:
+            # Las respuestas transmitidas consultan la base de datos a medida que se leen
+            response.streaming_content = [b''.join(response.streaming_content)]
+        duracion = time.perf_counter() - inicio
+    tiempo_db = sum(float(consulta['time']) for consulta in capturadas.captured_queries) * 1000
+    response.duracion_ms = duracion * 1000
+    return response, len(capturadas.captured_queries), tiempo_db
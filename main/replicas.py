@@ -0,0 +1,111 @@
+"""
+Lecturas en réplicas de la base de datos (DATABASE_REPLICA_URLS).
+
+Los requests GET, HEAD y OPTIONS (vistas HTML, la API y sus exportaciones)
+leen de una réplica elegida al azar al primer acceso; todo lo demás lee y
+escribe en la primaria ('default'):
+
+- los requests POST, PUT, PATCH y DELETE, y durante REPLICAS_FIJACION_SEGUNDOS
+  después de uno, los requests del mismo navegador (cookie de fijación): el
+  usuario ve lo que acaba de escribir aunque la réplica vaya atrasada;
+- lo que se lea después de una escritura en el mismo request, o dentro de
+  una transacción;
+- los comandos de manage.py y cualquier código fuera de un request.
+
+Si una réplica no responde se prueba con otra, y si ninguna responde se lee
+de la primaria. La réplica caída no se vuelve a intentar hasta pasados
+REPLICAS_REINTENTO_SEGUNDOS.
+
+Sin réplicas configuradas el router siempre responde 'default'.
+"""
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+COOKIE_FIJACION = 'leer_primaria'
+METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+# Escrituras que no obligan a leer de la primaria el resto del request
+APPS_SIN_EFECTO = ('sessions',)
+
+
+class _Lectura:
+    """Estado de un request que puede leer de réplicas"""
+
+    def __init__(self):
+        self.alias = None  # Réplica elegida al primer acceso
+        self.escribio = False
+
+
+# None fuera de un request de lectura: se usa la primaria
+_lectura = ContextVar('lectura_replicas', default=None)
+
+# {alias: time.monotonic() hasta el que no se vuelve a intentar}
+_caidas = {}
+
+
+def iniciar(usar_replicas):
+    """Marca el comienzo de un request; con usar_replicas sus lecturas pueden ir a una réplica"""
+    _lectura.set(_Lectura() if usar_replicas and settings.DATABASE_REPLICAS else None)
+
+
+@receiver(request_finished)
+def terminar(**kwargs):
+    # Después de transmitir la respuesta (las exportaciones leen mientras se envían)
+    _lectura.set(None)
+
+
+def elegir_replica():
+    """Una réplica que responda, o la primaria si ninguna responde"""
+    ahora = time.monotonic()
+    disponibles = [alias for alias in settings.DATABASE_REPLICAS if _caidas.get(alias, 0) <= ahora]
+    random.shuffle(disponibles)
+    for alias in disponibles:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError as e:
+            logger.warning('Réplica %s no disponible, se lee de otra: %s', alias, e)
+            _caidas[alias] = ahora + settings.REPLICAS_REINTENTO_SEGUNDOS
+            continue
+        _caidas.pop(alias, None)
+        return alias
+    return DEFAULT_DB_ALIAS
+
+
+def alias_lectura():
+    lectura = _lectura.get()
+    if lectura is None or lectura.escribio or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    if lectura.alias is None:
+        lectura.alias = elegir_replica()
+    return lectura.alias
+
+
+class RouterReplicas:
+    """Router de DATABASE_ROUTERS: lecturas según alias_lectura(), escrituras siempre en la primaria"""
+
+    def db_for_read(self, model, **hints):
+        return alias_lectura()
+
+    def db_for_write(self, model, **hints):
+        lectura = _lectura.get()
+        # La sesión se guarda al final del request (la última actividad, ver SessionTimeoutMiddleware),
+        # incluso antes de transmitir una exportación: no cambia los datos que se leen
+        if lectura is not None and model._meta.app_label not in APPS_SIN_EFECTO:
+            lectura.escribio = True
+        # Explícito: sin respuesta Django escribiría en la base de la que se leyó la instancia
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas tienen los mismos datos que la primaria
+        bases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
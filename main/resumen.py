@@ -0,0 +1,185 @@
+"""
+Resumen del dashboard para la API (GET /api/dashboard/).
+
+Reúne en una sola respuesta lo que el front pedía por separado a
+/api/sesiones/, las notificaciones y /api/tutores/: próximas sesiones,
+solicitudes pendientes, contadores y tutores destacados. Se arma con tres
+consultas (contadores con subconsultas escalares, sesiones con una ventana
+ROW_NUMBER por grupo y tutores) y se guarda en caché por usuario, con la
+versión de los modelos que usa en la clave (main/versiones.py): cualquier
+escritura en ellos lo invalida. Con la consulta de versiones son a lo más 4.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Case, F, Func, IntegerField, OuterRef, Q, Subquery, Value, When, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import versiones
+from .models import Asignatura, Notificacion, SesionArchivada, SesionTutoria, Tutor, Usuario
+
+# Modelos de los que depende el resumen: su versión forma parte de la clave de caché
+MODELOS_RESUMEN = (SesionTutoria, Tutor, Usuario, Asignatura, Notificacion)
+
+# Sesiones completadas necesarias para cada rango, de mayor a menor
+RANGOS = (
+    (200, 'Iluminado'),
+    (100, 'Erudito'),
+    (50, 'Avanzado'),
+    (25, 'Intermedio'),
+    (10, 'Principiante'),
+)
+
+SESIONES_POR_GRUPO = 5
+TUTORES_DESTACADOS = 5
+ESTADOS_PROXIMOS = ('Pendiente', 'Aceptada')
+
+_fecha = serializers.DateTimeField().to_representation
+
+
+def rango_por_sesiones(terminadas):
+    for minimo, rango in RANGOS:
+        if terminadas >= minimo:
+            return rango
+    return 'Novato'
+
+
+def _contar(queryset):
+    # COUNT como función y no como agregado: la subconsulta no agrupa por la columna externa
+    total = queryset.order_by().annotate(total=Func(F('pk'), function='COUNT')).values('total')
+    return Coalesce(Subquery(total, output_field=IntegerField()), 0)
+
+
+def _contadores(usuario, ahora):
+    como_tutor = SesionTutoria.objects.filter(tutor__usuario=OuterRef('pk'))
+    archivadas = SesionArchivada.objects.filter(tutor__usuario=OuterRef('pk'))
+    contadores = Usuario.objects.filter(pk=usuario.pk).annotate(
+        id_tutor=Subquery(Tutor.objects.filter(usuario=OuterRef('pk')).values('pk')[:1]),
+        notificaciones_no_leidas=_contar(Notificacion.objects.filter(usuario=OuterRef('pk'), leida=False)),
+        solicitudes_pendientes=_contar(como_tutor.filter(estado='Pendiente')),
+        sesiones_completadas=_contar(como_tutor.filter(estado='Completada')),
+        sesiones_terminadas=_contar(como_tutor.filter(estado='Completada', fecha_programada__lt=ahora)),
+        # Las de semestres anteriores (archivo histórico) ya pasaron: cuentan en ambos contadores
+        completadas_archivadas=_contar(archivadas.filter(estado='Completada')),
+        proximas_como_tutorado=_contar(SesionTutoria.objects.filter(
+            tutorado=OuterRef('pk'), estado__in=ESTADOS_PROXIMOS, fecha_programada__gte=ahora,
+        )),
+    ).values(
+        'id_tutor', 'notificaciones_no_leidas', 'solicitudes_pendientes',
+        'sesiones_completadas', 'sesiones_terminadas', 'proximas_como_tutorado', 'completadas_archivadas',
+    ).get()
+    anteriores = contadores.pop('completadas_archivadas')
+    contadores['sesiones_completadas'] += anteriores
+    contadores['sesiones_terminadas'] += anteriores
+    return contadores
+
+
+def _sesion(fila):
+    return {
+        'id': fila['pk'],
+        'fecha_programada': _fecha(fila['fecha_programada']),
+        'duracion_minutos': fila['duracion_minutos'],
+        'modalidad': fila['modalidad'],
+        'estado': fila['estado'],
+        'tema_solicitud': fila['tema_solicitud'],
+        'asignatura': {'id': fila['asignatura_id'], 'nombre': fila['asignatura__nombre']},
+        'tutor': {
+            'id': fila['tutor_id'],
+            'nombre': f"{fila['tutor__usuario__first_name']} {fila['tutor__usuario__last_name']}",
+        },
+        'tutorado': {
+            'id': fila['tutorado_id'],
+            'nombre': f"{fila['tutorado__first_name']} {fila['tutorado__last_name']}",
+        },
+    }
+
+
+def _sesiones(usuario, id_tutor, ahora):
+    """
+    Las próximas SESIONES_POR_GRUPO sesiones de cada grupo en una consulta:
+    'proximas' como tutorado, y como tutor 'solicitudes' (pendientes) y 'como_tutor' (aceptadas)
+    """
+    condicion = Q(tutorado=usuario)
+    if id_tutor is not None:
+        condicion |= Q(tutor_id=id_tutor)
+    grupo = Case(
+        When(tutorado=usuario, then=Value('proximas')),
+        When(estado='Pendiente', then=Value('solicitudes')),
+        default=Value('como_tutor'),
+    )
+    filas = (
+        SesionTutoria.objects
+        .filter(condicion, estado__in=ESTADOS_PROXIMOS, fecha_programada__gte=ahora)
+        .annotate(
+            grupo=grupo,
+            fila=Window(RowNumber(), partition_by=[grupo], order_by=[F('fecha_programada').asc(), F('pk').asc()]),
+        )
+        .filter(fila__lte=SESIONES_POR_GRUPO)
+        .order_by('fecha_programada', 'pk')
+        .values(
+            'pk', 'grupo', 'fecha_programada', 'duracion_minutos', 'modalidad', 'estado', 'tema_solicitud',
+            'asignatura_id', 'asignatura__nombre', 'tutor_id', 'tutor__usuario__first_name',
+            'tutor__usuario__last_name', 'tutorado_id', 'tutorado__first_name', 'tutorado__last_name',
+        )
+    )
+    grupos = {'proximas': [], 'solicitudes': [], 'como_tutor': []}
+    for fila in filas:
+        grupos[fila['grupo']].append(_sesion(fila))
+    return grupos
+
+
+def _tutores_destacados():
+    filas = (
+        Tutor.objects.filter(activo=True)
+        .order_by('-calificacion_promedio', 'pk')
+        .values(
+            'pk', 'nivel', 'calificacion_promedio', 'total_sesiones', 'especialidades',
+            'usuario__first_name', 'usuario__last_name',
+        )[:TUTORES_DESTACADOS]
+    )
+    return [
+        {
+            'id': fila['pk'],
+            'nombre': f"{fila['usuario__first_name']} {fila['usuario__last_name']}",
+            'nivel': fila['nivel'],
+            'calificacion_promedio': str(fila['calificacion_promedio']),
+            'total_sesiones': fila['total_sesiones'],
+            'especialidades': fila['especialidades'],
+        }
+        for fila in filas
+    ]
+
+
+def armar(usuario):
+    """El resumen del usuario, leído de la base de datos (3 consultas)"""
+    ahora = timezone.now()
+    contadores = _contadores(usuario, ahora)
+    id_tutor = contadores.pop('id_tutor')
+    sesiones = _sesiones(usuario, id_tutor, ahora)
+    return {
+        'es_tutor': id_tutor is not None,
+        'rango': rango_por_sesiones(contadores['sesiones_terminadas']) if id_tutor is not None else None,
+        'contadores': contadores,
+        'proximas_sesiones': sesiones['proximas'],
+        'solicitudes_pendientes': sesiones['solicitudes'],
+        'sesiones_como_tutor': sesiones['como_tutor'],
+        'tutores_destacados': _tutores_destacados(),
+        'generado': _fecha(ahora),
+    }
+
+
+def obtener(usuario):
+    """
+    El resumen desde la caché si ningún modelo cambió desde que se armó.
+    Expira igual a los DASHBOARD_CACHE_SEGUNDOS: las sesiones que ya pasaron
+    dejan de ser próximas sin que nada se escriba.
+    """
+    firma, _ = versiones.obtener(*MODELOS_RESUMEN)
+    cache = caches['default']
+    clave = f'dashboard:{usuario.pk}:{firma}'
+    resumen = cache.get(clave)
+    if resumen is None:
+        resumen = armar(usuario)
+        cache.set(clave, resumen, settings.DASHBOARD_CACHE_SEGUNDOS)
+    return resumen
@@ -1,30 +1,132 @@
 from rest_framework import serializers
 from .models import *
 
-class MensajeSerializer(serializers.ModelSerializer):
+
+def ruta_serializer(serializer):
+    """Ruta con puntos desde el serializer raíz, ej. 'sesiones.' para el hijo de TutorSerializer.sesiones"""
+    partes = []
+    nodo = serializer
+    while nodo.parent is not None:
+        if nodo.field_name:
+            partes.append(nodo.field_name)
+        nodo = nodo.parent
+    return ''.join(f'{parte}.' for parte in reversed(partes))
+
+
+class ExpandibleMixin:
+    """
+    Las relaciones listadas en Meta.expandibles solo se serializan si se piden
+    con ?expand= (rutas con punto para anidadas, ej. ?expand=sesiones.mensajes).
+    El conjunto pedido llega en context['expand'], ver api.ConsultaOptimizadaMixin.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expand = self.context.get('expand', frozenset())
+        prefijo = ruta_serializer(self)
+        for nombre in getattr(self.Meta, 'expandibles', ()):
+            if f'{prefijo}{nombre}' not in expand:
+                fields.pop(nombre, None)
+        return fields
+
+
+class CamposDinamicosMixin:
+    """
+    Con ?fields= solo se serializan los campos pedidos (rutas con punto para
+    los anidados, ej. ?fields=id,usuario.first_name). Sin el parámetro, o si no
+    se pidió ningún campo de este serializer, se entregan todos. Un campo que no
+    existe responde 400 con los campos válidos.
+    El conjunto pedido llega en context['fields'], ver api.ConsultaOptimizadaMixin.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        pedidos = self.context.get('fields')
+        if not pedidos:
+            return fields
+        prefijo = ruta_serializer(self)
+        rutas = [ruta[len(prefijo):] for ruta in pedidos if ruta.startswith(prefijo)]
+        nombres = {ruta.split('.')[0] for ruta in rutas}
+        if not nombres:
+            return fields
+
+        # Las relaciones expandibles no pedidas con ?expand= también son campos válidos
+        validos = set(fields) | set(getattr(self.Meta, 'expandibles', ()))
+        desconocidos = []
+        for ruta in rutas:
+            nombre, _, anidado = ruta.partition('.')
+            # Una ruta con punto debe pasar por un serializer anidado
+            plano = nombre in fields and not isinstance(fields[nombre], serializers.BaseSerializer)
+            if nombre not in validos or (anidado and plano):
+                desconocidos.append(f'{prefijo}{ruta}')
+        if desconocidos:
+            raise serializers.ValidationError({'fields': [
+                f"Campos desconocidos: {', '.join(sorted(desconocidos))}. "
+                f"Campos válidos{f' en {prefijo[:-1]}' if prefijo else ''}: {', '.join(sorted(validos))}"
+            ]})
+        return {nombre: campo for nombre, campo in fields.items() if nombre in nombres}
+
+
+class RelacionPrecargada(serializers.PrimaryKeyRelatedField):
+    """
+    Clave foránea que en las escrituras masivas se resuelve contra los objetos
+    ya cargados en context['precargados'][modelo] (por pk como texto), en vez
+    de una consulta por ítem. Las relaciones acotadas a los objetos del usuario
+    se cargan aparte, en context['precargados'][(modelo, campo)].
+    Ver api.EscrituraMasivaMixin.
+    """
+
+    def to_internal_value(self, data):
+        todos = self.context.get('precargados', {})
+        modelo = self.get_queryset().model
+        precargados = todos.get((modelo, self.field_name), todos.get(modelo))
+        if precargados is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool) or not isinstance(data, (int, str)):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        objeto = precargados.get(str(data))
+        if objeto is None:
+            self.fail('does_not_exist', pk_value=data)
+        return objeto
+
+
+class MensajeSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    serializer_related_field = RelacionPrecargada
     class Meta:
         model = Mensaje
         fields = '__all__'
 
-class RecursoEducativoSerializer(serializers.ModelSerializer):
+class RecursoEducativoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    serializer_related_field = RelacionPrecargada
     class Meta:
         model = RecursoEducativo
         fields = '__all__'
 
-class SesionTutoriaSerializer(serializers.ModelSerializer):
+class SesionTutoriaSerializer(CamposDinamicosMixin, ExpandibleMixin, serializers.ModelSerializer):
+    serializer_related_field = RelacionPrecargada
     mensajes = MensajeSerializer(many=True, read_only=True)
     class Meta:
         model = SesionTutoria
         fields = '__all__'
+        expandibles = ('mensajes',)
 
-class UsuarioSerializer(serializers.ModelSerializer):
+class NotificacionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    serializer_related_field = RelacionPrecargada
     class Meta:
-        model = Usuario
+        model = Notificacion
         fields = '__all__'
 
-class TutorSerializer(serializers.ModelSerializer):
+class UsuarioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Usuario
+        # Nunca se exponen el hash de la contraseña ni los permisos
+        exclude = ('password', 'groups', 'user_permissions')
+        read_only_fields = ('is_superuser', 'is_staff', 'last_login', 'date_joined')
+
+class TutorSerializer(CamposDinamicosMixin, ExpandibleMixin, serializers.ModelSerializer):
     usuario = UsuarioSerializer(read_only=True)
-    sesiones = SesionTutoriaSerializer(many=True, read_only=True)
+    sesiones = SesionTutoriaSerializer(source='sesiones_como_tutor', many=True, read_only=True)
     class Meta:
         model = Tutor
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        expandibles = ('sesiones',)
@@ -0,0 +1,40 @@
+"""
+Señales que mantienen al día las versiones de datos (main/versiones.py) y el
+registro de eliminaciones de la sincronización incremental (main/sincronizacion.py),
+incluidos los cambios de estado de las sesiones (main/transiciones.py), que no pasan por save(),
+y el historial de eventos de las sesiones (main/eventos.py).
+Se conectan en MainConfig.ready().
+"""
+from django.db.models.signals import post_delete, post_save
+
+from . import eventos, sincronizacion, versiones
+from .models import Asignatura, Mensaje, Notificacion, RecursoEducativo, SesionTutoria, Tutor, Usuario
+from .transiciones import sesion_transicion
+
+# Modelos que entrega la API REST (Notificacion por /api/sync/ y /api/dashboard/)
+MODELOS_VERSIONADOS = (Usuario, Tutor, SesionTutoria, Mensaje, RecursoEducativo, Asignatura, Notificacion)
+# Modelos que entrega /api/sync/
+MODELOS_SINCRONIZADOS = tuple(modelo for _, modelo, *_ in sincronizacion.ENTIDADES)
+
+
+def marcar_modificado(sender, **kwargs):
+    versiones.incrementar(sender)
+
+
+def registrar_eliminacion(sender, instance, **kwargs):
+    sincronizacion.registrar_eliminacion(instance)
+
+
+# Conectadas por modelo: una señal sin sender desactivaría el borrado rápido
+# (sin cargar los objetos) de todos los demás modelos
+for modelo in MODELOS_VERSIONADOS:
+    post_save.connect(marcar_modificado, sender=modelo, dispatch_uid=f'version_save_{modelo.__name__}')
+    post_delete.connect(marcar_modificado, sender=modelo, dispatch_uid=f'version_delete_{modelo.__name__}')
+
+for modelo in MODELOS_SINCRONIZADOS:
+    post_delete.connect(registrar_eliminacion, sender=modelo, dispatch_uid=f'eliminacion_{modelo.__name__}')
+
+sesion_transicion.connect(marcar_modificado, sender=SesionTutoria, dispatch_uid='version_transicion_SesionTutoria')
+
+post_save.connect(eventos.registrar_solicitud, sender=SesionTutoria, dispatch_uid='evento_solicitud')
+sesion_transicion.connect(eventos.registrar_transicion, sender=SesionTutoria, dispatch_uid='evento_transicion')
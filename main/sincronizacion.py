@@ -0,0 +1,216 @@
+"""
+Sincronización incremental para clientes móviles y offline (GET /api/sync/).
+
+El cliente guarda el token de la última respuesta y lo envía en ?since=: se
+entregan solo las sesiones, mensajes y notificaciones del usuario creados o
+modificados desde entonces (por fecha_actualizacion, con índices compuestos
+usuario + fecha_actualizacion) y los ids de los eliminados (tabla Eliminacion,
+que llenan las señales de main/signals.py). El costo depende de cuánto cambió
+y no del total de datos del usuario.
+
+El token es una posición (fecha_actualizacion, pk) por tipo de dato, firmada
+para que el cliente no pueda alterarla. Las filas modificadas en los últimos
+SYNC_MARGEN_SEGUNDOS se vuelven a enviar en el siguiente sync: una transacción
+que aún no terminaba puede confirmar filas con una fecha anterior a la de la
+respuesta. Aplicar un cambio dos veces no tiene efecto en el cliente.
+
+Sin token, o con uno más viejo que SYNC_RETENCION_DIAS (las eliminaciones ya
+se purgaron), se entrega todo con "completo": true y el cliente debe
+reemplazar su copia local. Con más de SYNC_MAXIMO filas de un tipo, la
+respuesta trae "hay_mas": true y se pide de nuevo con el token entregado.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+
+from . import lectura_rapida
+from .models import Eliminacion, Mensaje, Notificacion, SesionTutoria, Tutor
+from .serializers import MensajeSerializer, NotificacionSerializer, SesionTutoriaSerializer
+
+SALT_TOKEN = 'main.sincronizacion'
+VERSION_TOKEN = 1
+
+
+class TokenInvalido(Exception):
+    pass
+
+
+def etiqueta(modelo):
+    return modelo._meta.label_lower
+
+
+# ===========================================
+# QUÉ VE CADA USUARIO
+# ===========================================
+
+def sesiones_de(usuario):
+    # Con el id del tutor (y no tutor__usuario) cada rama del OR usa su índice
+    tutor_id = Tutor.objects.filter(usuario=usuario).values_list('pk', flat=True).first()
+    condicion = Q(tutorado=usuario)
+    if tutor_id is not None:
+        condicion |= Q(tutor_id=tutor_id)
+    return SesionTutoria.objects.filter(condicion)
+
+
+def mensajes_de(usuario, sesiones):
+    return Mensaje.objects.filter(sesion__in=sesiones.values('pk'))
+
+
+def notificaciones_de(usuario, sesiones):
+    return Notificacion.objects.filter(usuario=usuario)
+
+
+# (nombre en la respuesta, modelo, serializer, queryset de lo que ve el usuario a partir de sus sesiones)
+ENTIDADES = (
+    ('sesiones', SesionTutoria, SesionTutoriaSerializer, lambda usuario, sesiones: sesiones),
+    ('mensajes', Mensaje, MensajeSerializer, mensajes_de),
+    ('notificaciones', Notificacion, NotificacionSerializer, notificaciones_de),
+)
+
+
+def usuarios_afectados(instancia):
+    """Ids de los usuarios que tenían la instancia en su copia local"""
+    if isinstance(instancia, SesionTutoria):
+        tutor = Tutor.objects.filter(pk=instancia.tutor_id).values_list('usuario_id', flat=True).first()
+        return {instancia.tutorado_id, tutor} - {None}
+    if isinstance(instancia, Mensaje):
+        sesion = (
+            SesionTutoria.objects.filter(pk=instancia.sesion_id)
+            .values_list('tutorado_id', 'tutor__usuario_id').first()
+        )
+        return set(sesion or ()) - {None}
+    if isinstance(instancia, Notificacion):
+        return {instancia.usuario_id}
+    return set()
+
+
+def registrar_eliminacion(instancia):
+    ahora = timezone.now()
+    Eliminacion.objects.bulk_create([
+        Eliminacion(usuario_id=usuario_id, modelo=etiqueta(type(instancia)), objeto_id=instancia.pk, fecha=ahora)
+        for usuario_id in usuarios_afectados(instancia)
+    ])
+
+
+def purgar_eliminaciones():
+    """Elimina los registros más viejos que SYNC_RETENCION_DIAS. Retorna cuántos"""
+    limite = timezone.now() - timedelta(days=settings.SYNC_RETENCION_DIAS)
+    eliminadas, _ = Eliminacion.objects.filter(fecha__lt=limite).delete()
+    return eliminadas
+
+
+# ===========================================
+# TOKEN
+# ===========================================
+
+def generar_token(posiciones):
+    """posiciones: {nombre: (fecha, pk)} para cada entidad y 'eliminados'"""
+    datos = {nombre: [fecha.isoformat(), pk] for nombre, (fecha, pk) in posiciones.items()}
+    datos['v'] = VERSION_TOKEN
+    return signing.dumps(datos, salt=SALT_TOKEN, compress=True)
+
+
+def leer_token(token):
+    try:
+        datos = signing.loads(token, salt=SALT_TOKEN)
+        if datos.pop('v') != VERSION_TOKEN:
+            raise TokenInvalido
+        posiciones = {nombre: (datetime.fromisoformat(fecha), int(pk)) for nombre, (fecha, pk) in datos.items()}
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise TokenInvalido
+    nombres = {nombre for nombre, *_ in ENTIDADES} | {'eliminados'}
+    if set(posiciones) != nombres:
+        raise TokenInvalido
+    return posiciones
+
+
+# ===========================================
+# SYNC
+# ===========================================
+
+def _despues_de(campo, posicion):
+    fecha, pk = posicion
+    # El >= redundante le da al índice (usuario, fecha) un rango por donde empezar
+    return Q(**{f'{campo}__gte': fecha}) & (Q(**{f'{campo}__gt': fecha}) | Q(pk__gt=pk))
+
+
+def _cambios(queryset, serializer, posicion, maximo):
+    """(filas serializadas, posición de la última, hay más) de los cambios después de posicion"""
+    if posicion is not None:
+        queryset = queryset.filter(_despues_de('fecha_actualizacion', posicion))
+    queryset = queryset.order_by('fecha_actualizacion', 'pk')[:maximo + 1]
+
+    plan = lectura_rapida.compilar(serializer, queryset.model)
+    if plan is not None:
+        filas = list(queryset.values(*dict.fromkeys([*plan.columnas, 'fecha_actualizacion'])))
+        hay_mas = len(filas) > maximo
+        filas = filas[:maximo]
+        ultima = (filas[-1]['fecha_actualizacion'], filas[-1]['pk']) if filas else None
+        return [plan.armar(fila) for fila in filas], ultima, hay_mas
+
+    objetos = list(queryset)
+    hay_mas = len(objetos) > maximo
+    objetos = objetos[:maximo]
+    ultima = (objetos[-1].fecha_actualizacion, objetos[-1].pk) if objetos else None
+    return [serializer.to_representation(objeto) for objeto in objetos], ultima, hay_mas
+
+
+def sincronizar(usuario, token=None, maximo=None):
+    """
+    Cambios del usuario desde el token (o todo si es None). Retorna el cuerpo
+    de la respuesta de /api/sync/. Lanza TokenInvalido si el token no es válido.
+    """
+    maximo = maximo or settings.SYNC_MAXIMO
+    ahora = timezone.now()
+    # Hasta aquí se considera sincronizado; lo posterior se reenvía la próxima vez
+    corte = (ahora - timedelta(seconds=settings.SYNC_MARGEN_SEGUNDOS), 0)
+
+    posiciones = leer_token(token) if token else None
+    retencion = ahora - timedelta(days=settings.SYNC_RETENCION_DIAS)
+    completo = posiciones is None or posiciones['eliminados'][0] < retencion
+    if completo:
+        posiciones = dict.fromkeys([nombre for nombre, *_ in ENTIDADES], None)
+        posiciones['eliminados'] = corte  # La copia local se reemplaza: no hay nada que eliminar
+
+    respuesta = {}
+    nuevas = {}
+    hay_mas = False
+    eliminados = {}
+    posicion = posiciones['eliminados']
+    if not completo:
+        registros = (
+            Eliminacion.objects.filter(Q(usuario=usuario) & _despues_de('fecha', posicion))
+            .order_by('fecha', 'pk').values_list('pk', 'fecha', 'modelo', 'objeto_id')[:maximo + 1]
+        )
+        registros = list(registros)
+        if len(registros) > maximo:
+            hay_mas = True
+            registros = registros[:maximo]
+            posicion = (registros[-1][1], registros[-1][0])
+        else:
+            posicion = max(posicion, corte)
+        for _, _, modelo, objeto_id in registros:
+            eliminados.setdefault(modelo, []).append(objeto_id)
+    nuevas['eliminados'] = posicion
+
+    sesiones = sesiones_de(usuario)
+    for nombre, modelo, clase_serializer, queryset_de in ENTIDADES:
+        serializer = clase_serializer(context={})
+        queryset = queryset_de(usuario, sesiones)
+        cambios, ultima, truncado = _cambios(queryset, serializer, posiciones[nombre], maximo)
+        if truncado:
+            hay_mas = True
+            nuevas[nombre] = ultima
+        else:
+            nuevas[nombre] = max(posiciones[nombre] or corte, corte)
+        respuesta[nombre] = {'cambios': cambios, 'eliminados': eliminados.get(etiqueta(modelo), [])}
+
+    respuesta.update({
+        'completo': completo,
+        'hay_mas': hay_mas,
+        'token': generar_token(nuevas),
+    })
+    return respuesta
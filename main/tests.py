@@ -1,3 +1,1893 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import warnings
+from collections import Counter
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import AnonymousUser
+from django.test import (AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from pymysql.constants import SERVER_STATUS
+from rest_framework.renderers import JSONRenderer
+
+from . import (archivo, catalogo, cliente_http, lectura_rapida, limites, openlibrary, portadas, proyecciones,
+               renderers, sincronizacion, transiciones, versiones)
+from .benchmarks import openlibrary_apuntando_a, servidor_stub_openlibrary
+from .cliente_http import CircuitBreaker, CircuitoAbierto, ClienteHTTP, ClienteHTTPAsync, ErrorClienteHTTP
+from .middleware import LecturaReplicasMiddleware, OneSessionPerUserMiddleware, SessionTimeoutMiddleware
+from .management.commands import verificar_consultas, verificar_planes, verificar_presupuestos, verificar_replicas
+from .models import (ContadorEventosDia, Eliminacion, EstadisticaTutor, EventoSesion, LibroCatalogo, Mensaje,
+                     MensajeArchivado, Notificacion, NotificacionArchivada, PuntoControlProyeccion, SesionArchivada,
+                     SesionTutoria, TerminoCatalogo, Tutor, Usuario)
+from .pool_mysql import base as pool_base, pool as pool_mysql
+from .rendimiento import sembrar_datos
+
+
+def esperar(condicion, timeout=5):
+    """Espera a que se cumpla la condición (trabajo en otro hilo); retorna si se cumplió"""
+    fin = time.monotonic() + timeout
+    while time.monotonic() < fin:
+        if condicion():
+            return True
+        time.sleep(0.01)
+    return condicion()
+
+
+# ============================================
+# CACHÉ DEL PROXY DE OPEN LIBRARY
+# ============================================
+class CacheOpenLibraryTests(SimpleTestCase):
+    """buscar_libros contra un servidor local que imita search.json"""
+
+    def setUp(self):
+        contexto = servidor_stub_openlibrary(latencia=0)
+        self.servidor = contexto.__enter__()
+        self.addCleanup(contexto.__exit__, None, None, None)
+
+    def apuntar(self, **ajustes):
+        contexto = openlibrary_apuntando_a(self.servidor, **ajustes)
+        contexto.__enter__()
+        self.addCleanup(contexto.__exit__, None, None, None)
+
+    def test_hit_dentro_del_ttl(self):
+        self.apuntar()
+        datos, estado = openlibrary.buscar_libros('Cálculo', 10)
+        self.assertEqual(estado, openlibrary.CACHE_MISS)
+        self.assertEqual(datos['books'][0]['title'], 'Cálculo Diferencial')
+
+        # Consulta equivalente tras normalizar: misma entrada
+        datos_cache, estado = openlibrary.buscar_libros('  cálculo ', '10')
+        self.assertEqual(estado, openlibrary.CACHE_HIT)
+        self.assertEqual(datos_cache, datos)
+        self.assertEqual(self.servidor.llamadas, 1)
+
+    def test_vencida_se_sirve_y_se_refresca_en_segundo_plano(self):
+        self.apuntar(OPENLIBRARY_CACHE_TTL=60, OPENLIBRARY_CACHE_STALE=600)
+        openlibrary.buscar_libros('algebra', 5)
+        clave = openlibrary.clave_cache('algebra', 5)
+        entrada = caches['openlibrary'].get(clave)
+        entrada['guardado'] -= 61  # Vencida, dentro de la ventana de gracia
+        caches['openlibrary'].set(clave, entrada)
+
+        datos, estado = openlibrary.buscar_libros('algebra', 5)
+        self.assertEqual(estado, openlibrary.CACHE_STALE)
+        self.assertEqual(datos, entrada['datos'])
+
+        def refrescada():
+            return caches['openlibrary'].get(clave)['guardado'] > entrada['guardado'] + 60
+
+        self.assertTrue(esperar(refrescada))
+        self.assertTrue(esperar(lambda: clave not in openlibrary._refrescando))
+        self.assertEqual(self.servidor.llamadas, 2)
+        self.assertEqual(openlibrary.buscar_libros('algebra', 5)[1], openlibrary.CACHE_HIT)
+
+    def test_refresco_fallido_sigue_sirviendo_la_copia_vencida(self):
+        self.apuntar(OPENLIBRARY_CACHE_TTL=60, OPENLIBRARY_CACHE_STALE=600)
+        datos, _ = openlibrary.buscar_libros('fisica', 5)
+        clave = openlibrary.clave_cache('fisica', 5)
+        entrada = caches['openlibrary'].get(clave)
+        entrada['guardado'] -= 61
+        caches['openlibrary'].set(clave, entrada)
+        self.servidor.fallos = [404]
+
+        self.assertEqual(openlibrary.buscar_libros('fisica', 5), (datos, openlibrary.CACHE_STALE))
+        self.assertTrue(esperar(lambda: clave not in openlibrary._refrescando))
+        self.assertEqual(openlibrary.buscar_libros('fisica', 5), (datos, openlibrary.CACHE_STALE))
+
+    def test_desalojo_de_la_entrada_menos_usada(self):
+        caches_pequenas = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+            'openlibrary': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'tests-openlibrary',
+                'OPTIONS': {'MAX_ENTRIES': 3, 'CULL_FREQUENCY': 3},
+            },
+        }
+        with override_settings(CACHES=caches_pequenas), openlibrary_apuntando_a(self.servidor):
+            for query in ('uno', 'dos', 'tres'):
+                openlibrary.buscar_libros(query, 1)
+            openlibrary.buscar_libros('uno', 1)  # 'dos' queda como la menos usada
+            openlibrary.buscar_libros('cuatro', 1)
+            self.assertEqual(self.servidor.llamadas, 4)
+
+            self.assertEqual(openlibrary.buscar_libros('uno', 1)[1], openlibrary.CACHE_HIT)
+            self.assertEqual(openlibrary.buscar_libros('cuatro', 1)[1], openlibrary.CACHE_HIT)
+            self.assertEqual(openlibrary.buscar_libros('dos', 1)[1], openlibrary.CACHE_MISS)
+            self.assertEqual(self.servidor.llamadas, 5)
+
+    def test_seguidores_reciben_cualquier_error_del_lider(self):
+        self.apuntar()
+        liberar = threading.Event()
+        resultados = {}
+
+        def consulta_que_falla(*args, **kwargs):
+            liberar.wait(5)
+            raise KeyError('inesperado')
+
+        def consultar(nombre):
+            try:
+                resultados[nombre] = openlibrary._consultar_coalescido('clave', 'algebra', 5)
+            except Exception as e:
+                resultados[nombre] = e
+
+        with mock.patch.object(openlibrary, '_consultar_entre_workers', side_effect=consulta_que_falla):
+            lider = threading.Thread(target=consultar, args=('lider',))
+            lider.start()
+            self.assertTrue(esperar(lambda: 'clave' in openlibrary._vuelos))
+            seguidor = threading.Thread(target=consultar, args=('seguidor',))
+            seguidor.start()
+            self.assertTrue(esperar(lambda: openlibrary.obtener_metricas()['coalescida'] == 1))
+            liberar.set()
+            lider.join(5)
+            seguidor.join(5)
+
+        self.assertIsInstance(resultados['lider'], KeyError)
+        self.assertIs(resultados['seguidor'], resultados['lider'])
+        self.assertNotIn('clave', openlibrary._vuelos)
+
+
+# ============================================
+# PROXY ASYNC
+# ============================================
+class ProxyAsyncTests(TestCase):
+    """Versión async del proxy: coalescencia, ciclo de vida del cliente y la cadena ASGI"""
+
+    def setUp(self):
+        contexto = servidor_stub_openlibrary(latencia=0)
+        self.servidor = contexto.__enter__()
+        self.addCleanup(contexto.__exit__, None, None, None)
+        contexto = openlibrary_apuntando_a(self.servidor)
+        contexto.__enter__()
+        self.addCleanup(contexto.__exit__, None, None, None)
+
+    def test_seguidor_no_queda_colgado_si_se_cancela_el_lider(self):
+        async def escenario():
+            bloqueo = asyncio.Event()
+            original = openlibrary._aconsultar_entre_workers
+
+            async def lenta(*args):
+                await bloqueo.wait()
+                return await original(*args)
+
+            with mock.patch.object(openlibrary, '_aconsultar_entre_workers', side_effect=lenta):
+                lider = asyncio.create_task(openlibrary.abuscar_libros('algebra', 5))
+                await asyncio.sleep(0.01)
+                seguidor = asyncio.create_task(openlibrary.abuscar_libros('algebra', 5))
+                await asyncio.sleep(0.01)
+                lider.cancel()
+                await asyncio.sleep(0.01)
+                bloqueo.set()
+                return await asyncio.wait_for(seguidor, 5), lider.cancelled()
+
+        (datos, estado), lider_cancelado = asyncio.run(escenario())
+        self.assertTrue(lider_cancelado)
+        self.assertEqual(estado, openlibrary.CACHE_MISS)
+        self.assertEqual(datos['books'][0]['title'], 'Cálculo Diferencial')
+        self.assertEqual(self.servidor.llamadas, 1)
+
+    def test_seguidor_recibe_cualquier_error_del_lider(self):
+        async def escenario():
+            async def falla(*args):
+                await asyncio.sleep(0.05)
+                raise KeyError('inesperado')
+
+            with mock.patch.object(openlibrary, '_aconsultar_entre_workers', side_effect=falla):
+                return await asyncio.gather(
+                    openlibrary.abuscar_libros('algebra', 5), openlibrary.abuscar_libros('algebra', 5),
+                    return_exceptions=True,
+                )
+
+        lider, seguidor = asyncio.run(escenario())
+        self.assertIsInstance(lider, KeyError)
+        self.assertIs(seguidor, lider)
+
+    def test_cliente_async_se_cierra_con_su_event_loop(self):
+        cliente = ClienteHTTPAsync('prueba', base_url=f'http://127.0.0.1:{self.servidor.server_port}')
+
+        async def llamar():
+            response = await cliente.get('/search.json')
+            return response.status_code, (await cliente._recursos())[0]
+
+        status, cliente_httpx = asyncio.run(llamar())
+        self.assertEqual(status, 200)
+        self.assertTrue(cliente_httpx.is_closed)
+
+    def test_middleware_del_proyecto_corre_async_bajo_asgi(self):
+        async def vista(request):
+            return HttpResponse()
+
+        for clase in (OneSessionPerUserMiddleware, SessionTimeoutMiddleware, LecturaReplicasMiddleware):
+            self.assertTrue(iscoroutinefunction(clase(vista)), clase)
+            self.assertFalse(iscoroutinefunction(clase(lambda request: HttpResponse())), clase)
+
+    async def test_proxy_async_por_la_cadena_asgi(self):
+        usuario = await Usuario.objects.acreate(rut='12345678-5', username='12345678-5', first_name='Ana')
+        cliente = AsyncClient()
+        await sync_to_async(cliente.force_login)(usuario)
+
+        response = await cliente.get(reverse('proxy_openlibrary_async'), {'q': 'algebra'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], openlibrary.CACHE_MISS)
+        self.assertIn(SessionTimeoutMiddleware.COOKIE, response.cookies)
+        response = await cliente.get(reverse('proxy_openlibrary_async'), {'q': 'algebra'})
+        self.assertEqual(response['X-Cache'], openlibrary.CACHE_HIT)
+
+
+# ============================================
+# CACHÉ EN DISCO DE PORTADAS
+# ============================================
+class _StubPortadas(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.llamadas += 1
+        cover_id = int(self.path.split('/')[-1].split('-')[0])
+        if cover_id >= 900:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        cuerpo = b'\xff\xd8' + bytes(98)  # 100 bytes
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class PortadasTests(TestCase):
+    """main/portadas.py contra un servidor local que imita covers.openlibrary.org"""
+
+    def setUp(self):
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _StubPortadas)
+        self.servidor.llamadas = 0
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = Path(directorio.name)
+        clientes = {
+            **settings.CLIENTES_HTTP,
+            'openlibrary_portadas': {'base_url': f'http://127.0.0.1:{self.servidor.server_port}', 'reintentos': 0},
+        }
+        ajustes = override_settings(
+            OPENLIBRARY_PORTADAS_DIR=str(self.directorio), OPENLIBRARY_PORTADAS_MAX_BYTES=350, CLIENTES_HTTP=clientes,
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        cliente_http._clientes.pop('openlibrary_portadas', None)
+        self.addCleanup(cliente_http._clientes.pop, 'openlibrary_portadas', None)
+        caches['default'].clear()
+        portadas._total_bytes = None
+        portadas._descargas_sin_recuento = 0
+
+    def test_se_descarga_una_sola_vez(self):
+        ruta = portadas.obtener_portada(1, 'M')
+        self.assertEqual(portadas.obtener_portada(1, 'M'), ruta)
+        self.assertEqual(ruta.read_bytes()[:2], b'\xff\xd8')
+        self.assertEqual(self.servidor.llamadas, 1)
+
+    def test_portada_inexistente_se_recuerda(self):
+        for _ in range(3):
+            with self.assertRaises(portadas.PortadaNoEncontrada):
+                portadas.obtener_portada(901, 'M')
+        self.assertEqual(self.servidor.llamadas, 1)
+        self.assertFalse(any(self.directorio.iterdir()))
+
+    def test_errores_no_dejan_locks_de_descarga(self):
+        with self.assertRaises(portadas.PortadaNoEncontrada):
+            portadas.obtener_portada(902, 'M')
+        with mock.patch.object(portadas, 'obtener_cliente', side_effect=ErrorClienteHTTP('caído')):
+            with self.assertRaises(portadas.ErrorPortada):
+                portadas.obtener_portada(5, 'M')
+        self.assertEqual(portadas._descargando, {})
+
+    def test_recorre_el_directorio_solo_al_superar_el_maximo(self):
+        with mock.patch.object(portadas.os, 'scandir', wraps=os.scandir) as scandir:
+            for cover_id in (1, 2, 3):
+                portadas.obtener_portada(cover_id, 'M')
+            self.assertEqual(scandir.call_count, 1)  # El recuento inicial
+            portadas.obtener_portada(4, 'M')  # 400 bytes > 350
+            self.assertEqual(scandir.call_count, 2)
+
+    def test_expulsa_las_menos_usadas(self):
+        for cover_id in (1, 2, 3):
+            ruta = portadas.obtener_portada(cover_id, 'M')
+            os.utime(ruta, (cover_id, cover_id))
+        portadas.obtener_portada(1, 'M')  # Uso reciente
+        portadas.obtener_portada(4, 'M')
+
+        restantes = sorted(ruta.name for ruta in self.directorio.glob('*.jpg'))
+        self.assertEqual(restantes, ['1-M.jpg', '3-M.jpg', '4-M.jpg'])
+        self.assertEqual(portadas._total_bytes, 300)
+
+    def test_recuento_periodico_incluye_lo_escrito_por_otros_workers(self):
+        portadas.obtener_portada(1, 'M')
+        (self.directorio / '50-L.jpg').write_bytes(bytes(300))  # Otro worker
+        with mock.patch.object(portadas, 'PORTADAS_RECUENTO_CADA', 2):
+            portadas.obtener_portada(2, 'M')
+            portadas.obtener_portada(3, 'M')  # Según el total en memoria son 300 bytes, pero toca recontar
+        self.assertLessEqual(sum(ruta.stat().st_size for ruta in self.directorio.glob('*.jpg')), 350)
+
+    def test_vista_descarga_de_nuevo_si_la_limpieza_borra_la_portada(self):
+        usuario = Usuario.objects.create(rut='12345678-5', username='12345678-5')
+        self.client.force_login(usuario)
+        obtener = portadas.obtener_portada
+
+        def obtener_y_limpiar(cover_id, tamano):
+            ruta = obtener(cover_id, tamano)
+            if self.servidor.llamadas == 1:
+                ruta.unlink()  # La limpieza de otro request la borra justo ahora
+            return ruta
+
+        with mock.patch.object(portadas, 'obtener_portada', side_effect=obtener_y_limpiar):
+            response = self.client.get(reverse('portada_openlibrary', args=[7, 'M']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content)[:2], b'\xff\xd8')
+        self.assertEqual(self.servidor.llamadas, 2)
+
+    def test_vista_compara_etags_exactos(self):
+        usuario = Usuario.objects.create(rut='12345678-5', username='12345678-5')
+        self.client.force_login(usuario)
+        url = reverse('portada_openlibrary', args=[1, 'M'])
+        response = self.client.get(url)
+        response.close()
+        etag = response['ETag']
+
+        for valor, estado in (
+            (etag, 304), (f'W/{etag}, "otra"', 304), ('*', 304),
+            (etag.replace('"1-', '"11-'), 200),  # Antes bastaba con contener el ETag
+            (f'"x{etag[1:]}', 200),
+        ):
+            with self.subTest(valor=valor):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=valor)
+                self.assertEqual(response.status_code, estado)
+                self.assertEqual(response['ETag'], etag)
+                if estado == 200:
+                    response.close()
+
+
+# ============================================
+# CIRCUIT BREAKER
+# ============================================
+class CircuitBreakerTests(SimpleTestCase):
+
+    def test_prueba_interrumpida_por_excepcion_no_prevista_libera_el_circuito(self):
+        cliente = ClienteHTTP('prueba', base_url='http://127.0.0.1:9', umbral_fallos=1, tiempo_reapertura=0)
+        cliente.circuito.registrar_fallo()
+        self.assertEqual(cliente.circuito.estado, CircuitBreaker.ABIERTO)
+
+        with mock.patch.object(cliente, '_enviar', side_effect=RuntimeError('inesperado')):
+            with self.assertRaises(RuntimeError):
+                cliente.get('/')
+        # Sin liberar la prueba el circuito quedaría semiabierto rechazando todo para siempre
+        self.assertEqual(cliente.circuito.permitir(), (0, True))
+
+    def test_semiabierto_deja_pasar_una_sola_prueba(self):
+        circuito = CircuitBreaker(umbral_fallos=1, tiempo_reapertura=0)
+        circuito.registrar_fallo()
+        self.assertEqual(circuito.permitir(), (0, True))
+        reintentar_en, es_prueba = circuito.permitir()
+        self.assertGreater(reintentar_en, 0)
+        self.assertFalse(es_prueba)
+        circuito.registrar_exito()
+        self.assertEqual(circuito.permitir(), (0, False))
+
+
+# ============================================
+# CLIENTE HTTP: REINTENTOS, JITTER Y CIRCUITO
+# ============================================
+class ClienteHTTPTests(SimpleTestCase):
+    """ClienteHTTP contra el servidor local, con fallas y latencia programadas"""
+
+    def setUp(self):
+        contexto = servidor_stub_openlibrary(latencia=0)
+        self.servidor = contexto.__enter__()
+        self.addCleanup(contexto.__exit__, None, None, None)
+
+    def cliente(self, **opciones):
+        opciones = {'reintentos': 2, 'backoff_base': 0.001, 'backoff_max': 0.01, 'timeout': 1, **opciones}
+        return ClienteHTTP('prueba', base_url=f'http://127.0.0.1:{self.servidor.server_port}', **opciones)
+
+    def test_reintenta_fallas_transitorias(self):
+        self.servidor.fallos = [503, 502]
+        response = self.cliente().get('/search.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.servidor.llamadas, 3)
+
+    def test_agota_los_reintentos(self):
+        self.servidor.fallos = [503] * 3
+        with self.assertRaisesMessage(ErrorClienteHTTP, 'Error en la API: 503'):
+            self.cliente().get('/search.json')
+        self.assertEqual(self.servidor.llamadas, 3)
+
+    def test_no_reintenta_errores_del_cliente(self):
+        self.servidor.fallos = [404]
+        self.assertEqual(self.cliente().get('/search.json').status_code, 404)
+        self.assertEqual(self.servidor.llamadas, 1)
+
+    def test_no_reintenta_metodos_no_idempotentes(self):
+        self.servidor.fallos = [503]
+        with self.assertRaises(ErrorClienteHTTP):
+            self.cliente().request('POST', '/search.json')
+        self.assertEqual(self.servidor.llamadas, 1)
+
+    def test_reintenta_timeouts(self):
+        self.servidor.latencia = 0.3
+        with self.assertRaises(ErrorClienteHTTP):
+            self.cliente(timeout=0.05, reintentos=1).get('/search.json')
+        self.assertTrue(esperar(lambda: self.servidor.llamadas == 2))
+
+    def test_backoff_con_jitter_completo(self):
+        cliente = self.cliente(backoff_base=0.2, backoff_max=1.0)
+        for intento, tope in ((0, 0.2), (1, 0.4), (2, 0.8), (5, 1.0)):
+            esperas = [cliente._espera_backoff(intento) for _ in range(200)]
+            self.assertTrue(all(0 <= espera <= tope for espera in esperas), (intento, max(esperas)))
+            # Aleatorias en todo el rango, no un valor fijo por intento
+            self.assertGreater(len(set(esperas)), 100)
+            self.assertLess(min(esperas), tope * 0.25)
+            self.assertGreater(max(esperas), tope * 0.75)
+
+    def test_circuito_se_abre_y_falla_sin_llamar(self):
+        cliente = self.cliente(reintentos=0, umbral_fallos=2, tiempo_reapertura=30)
+        self.servidor.fallos = [503, 503]
+        for _ in range(2):
+            with self.assertRaises(ErrorClienteHTTP):
+                cliente.get('/search.json')
+
+        with self.assertRaises(CircuitoAbierto) as contexto:
+            cliente.get('/search.json')
+        self.assertGreater(contexto.exception.reintentar_en, 0)
+        self.assertEqual(self.servidor.llamadas, 2)
+
+    def test_prueba_semiabierta_cierra_o_reabre_el_circuito(self):
+        cliente = self.cliente(reintentos=0, umbral_fallos=1, tiempo_reapertura=0.1)
+        self.servidor.fallos = [503, 503]
+        with self.assertRaises(ErrorClienteHTTP):
+            cliente.get('/search.json')
+        with self.assertRaises(CircuitoAbierto):
+            cliente.get('/search.json')
+
+        time.sleep(0.15)
+        with self.assertRaises(ErrorClienteHTTP):
+            cliente.get('/search.json')  # La prueba falla: vuelve a abrirse
+        self.assertEqual(cliente.circuito.estado, CircuitBreaker.ABIERTO)
+        with self.assertRaises(CircuitoAbierto):
+            cliente.get('/search.json')
+
+        time.sleep(0.15)
+        self.assertEqual(cliente.get('/search.json').status_code, 200)
+        self.assertEqual(cliente.circuito.estado, CircuitBreaker.CERRADO)
+        self.assertEqual(self.servidor.llamadas, 3)
+
+
+# ============================================
+# VERIFICACIONES DE RENDIMIENTO (main/management/commands/verificar_*)
+# ============================================
+# Sin límite de requests, y plantillas renderizadas sin collectstatic (sin el manifiesto de whitenoise)
+AJUSTES_VERIFICACION = {
+    'LIMITES_ACTIVOS': False,
+    'STATICFILES_STORAGE': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+}
+
+
+class VerificacionTestCase(TestCase):
+    """
+    Corre un comando verificar_* sobre la base de datos de test, sembrada como en
+    el comando (main/rendimiento.py); la salida del comando acompaña la falla.
+    """
+    comando = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = sembrar_datos()
+
+    def setUp(self):
+        ajustes = override_settings(**AJUSTES_VERIFICACION)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        caches['default'].clear()
+        self.salida = StringIO()
+        self.verificacion = self.comando.Command(stdout=self.salida, no_color=True)
+
+    def assertSinFallas(self, fallidos):
+        self.assertIn('OK', self.salida.getvalue(), 'La verificación no recorrió nada')
+        self.assertEqual(fallidos, [], self.salida.getvalue())
+
+
+class TopesDeConsultasTests(VerificacionTestCase):
+    comando = verificar_consultas
+
+    def test_endpoints_dentro_de_su_tope_de_consultas(self):
+        self.assertSinFallas(self.verificacion.verificar(self.usuarios))
+
+
+class PlanesDeConsultaTests(VerificacionTestCase):
+    comando = verificar_planes
+
+    def test_filtros_y_ordenes_de_la_api_usan_indices(self):
+        fallidos = []
+        verificar_planes.preparar_conexion()
+        self.verificacion.verificar_api(self.usuarios, fallidos)
+        self.assertSinFallas(fallidos)
+
+    def test_vistas_no_recorren_tablas_que_crecen(self):
+        fallidos = []
+        verificar_planes.preparar_conexion()
+        self.verificacion.verificar_vistas(self.usuarios, fallidos)
+        self.assertSinFallas(fallidos)
+
+
+@override_settings(LIMITES_ACTIVOS=False)
+class FiltrosDeclarativosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = sembrar_datos()
+
+    def setUp(self):
+        self.client.force_login(self.usuarios['admin'])
+
+    def ids(self, **parametros):
+        response = self.client.get('/api/sesiones/exportar/', {**parametros, 'fields': 'id'})
+        self.assertEqual(response.status_code, 200)
+        return sorted(fila['id'] for fila in json.loads(b''.join(response.streaming_content)))
+
+    def test_fecha_sin_zona_se_interpreta_en_la_zona_actual(self):
+        mediana = SesionTutoria.objects.order_by('fecha_programada').values_list('fecha_programada', flat=True)[
+            SesionTutoria.objects.count() // 2
+        ]
+        local = timezone.localtime(mediana).replace(tzinfo=None)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)  # "received a naive datetime"
+            obtenidos = self.ids(desde=local.isoformat())
+        esperados = list(SesionTutoria.objects.filter(fecha_programada__gte=mediana).order_by('pk').values_list('pk', flat=True))
+        self.assertEqual(obtenidos, esperados)
+        self.assertEqual(self.ids(desde=mediana.isoformat()), esperados)
+
+    def test_varios_valores_separados_por_coma(self):
+        esperados = list(SesionTutoria.objects.filter(estado__in=['Pendiente', 'Aceptada']).order_by('pk').values_list('pk', flat=True))
+        self.assertTrue(esperados)
+        self.assertEqual(self.ids(estado='Pendiente, Aceptada'), esperados)
+
+    def test_valor_invalido_responde_400_por_parametro(self):
+        response = self.client.get('/api/sesiones/', {'desde': 'ayer', 'tutor': 'x', 'estado': 'Pendiente'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'desde', 'tutor'})
+
+
+class PresupuestosDeRutasTests(VerificacionTestCase):
+    comando = verificar_presupuestos
+
+    @override_settings(OPENLIBRARY_FUENTE='local')
+    def test_rutas_dentro_de_su_presupuesto(self):
+        medidos = self.verificacion.medir_rutas(self.usuarios)
+        self.assertSinFallas(self.verificacion.comparar(medidos))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Las réplicas de prueba se copian con la API de respaldo de SQLite')
+class ReplicasTests(TransactionTestCase):
+    """
+    Sin la transacción de TestCase: dentro de una transacción el router siempre
+    lee de la primaria, y las réplicas se copian de lo ya confirmado.
+    """
+
+    def setUp(self):
+        ajustes = override_settings(**AJUSTES_VERIFICACION)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        caches['default'].clear()
+        self.usuarios = sembrar_datos()
+
+    def test_router_de_replicas(self):
+        salida = StringIO()
+        fallidos = verificar_replicas.Command(stdout=salida, no_color=True).verificar_con_replicas(
+            self.usuarios['estudiante']
+        )
+        self.assertIn('OK', salida.getvalue())
+        self.assertEqual(fallidos, [], salida.getvalue())
+
+
+# ============================================
+# API: ?fields=
+# ============================================
+class CamposDinamicosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_superuser(
+            rut='11111111-1', username='11111111-1', email='admin@inacap.cl', password='clave', first_name='Admin',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_campos_pedidos(self):
+        response = self.client.get('/api/usuarios/', {'fields': 'id,first_name'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'first_name'})
+
+    def test_campo_desconocido_responde_400_con_los_validos(self):
+        response = self.client.get('/api/usuarios/', {'fields': 'id,nope'})
+        self.assertEqual(response.status_code, 400)
+        mensaje = response.json()['fields'][0]
+        self.assertIn('nope', mensaje)
+        self.assertIn('first_name', mensaje)
+
+    def test_ruta_anidada_sobre_un_campo_plano_responde_400(self):
+        response = self.client.get('/api/sesiones/', {'fields': 'id,tutor.nombre'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('tutor.nombre', response.json()['fields'][0])
+
+    def test_relacion_expandible_sin_expandir_es_valida(self):
+        self.assertEqual(self.client.get('/api/sesiones/', {'fields': 'id,mensajes.mensaje'}).status_code, 200)
+        self.assertEqual(self.client.get('/api/sesiones/exportar/', {'fields': 'nope'}).status_code, 400)
+
+
+# ============================================
+# API: PAGINACIÓN (main/pagination.py)
+# ============================================
+@override_settings(**AJUSTES_VERIFICACION)
+class PaginacionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = sembrar_datos(tutores=3, estudiantes=10, sesiones_por_tutor=5)
+
+    def setUp(self):
+        self.client.force_login(self.usuarios['admin'])
+
+    def pagina(self, url, parametros=None):
+        response = self.client.get(url, parametros or {})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def recorrer(self, url, parametros, siguiente='next'):
+        """Sigue los enlaces desde la primera página; retorna las páginas"""
+        paginas = [self.pagina(url, parametros)]
+        while paginas[-1][siguiente] and len(paginas) < 50:
+            paginas.append(self.pagina(paginas[-1][siguiente]))
+        return paginas
+
+    def test_cursor_recorre_todo_sin_count(self):
+        paginas = self.recorrer('/api/usuarios/', {'page_size': 4})
+        ids = [fila['id'] for pagina in paginas for fila in pagina['results']]
+        self.assertEqual(ids, list(Usuario.objects.order_by('-pk').values_list('pk', flat=True)))
+        self.assertTrue(all(len(pagina['results']) == 4 for pagina in paginas[:-1]))
+        self.assertNotIn('count', paginas[0])
+        self.assertIsNone(paginas[0]['previous'])
+        self.assertIn('cursor=', paginas[0]['next'])
+        self.assertIn('page_size=4', paginas[0]['next'])
+
+    def test_previous_vuelve_a_la_pagina_anterior(self):
+        paginas = self.recorrer('/api/usuarios/', {'page_size': 4})
+        self.assertGreater(len(paginas), 2)
+        anterior = self.pagina(paginas[2]['previous'])
+        self.assertEqual(anterior['results'], paginas[1]['results'])
+        self.assertEqual(self.pagina(anterior['previous'])['results'], paginas[0]['results'])
+
+    def test_cursor_no_repite_filas_si_se_insertan_entre_paginas(self):
+        primera = self.pagina('/api/usuarios/', {'page_size': 4})
+        Usuario.objects.create(rut='12345678-5', username='12345678-5')
+        segunda = self.pagina(primera['next'])
+        vistos = [fila['id'] for fila in primera['results']]
+        self.assertFalse(set(vistos) & {fila['id'] for fila in segunda['results']})
+        self.assertLess(segunda['results'][0]['id'], vistos[-1])
+
+    def test_cursor_sigue_el_orden_del_viewset(self):
+        paginas = self.recorrer('/api/sesiones/', {'page_size': 7})
+        fechas = [fila['fecha_programada'] for pagina in paginas for fila in pagina['results']]
+        self.assertEqual(len(fechas), SesionTutoria.objects.count())
+        self.assertEqual(
+            [parse_datetime(fecha) for fecha in fechas],
+            list(SesionTutoria.objects.order_by('-fecha_programada').values_list('fecha_programada', flat=True)),
+        )
+
+    @override_settings(API_PAGE_SIZE_MAXIMO=5)
+    def test_page_size_maximo_en_ambos_modos(self):
+        self.assertEqual(len(self.pagina('/api/usuarios/', {'page_size': 50})['results']), 5)
+        datos = self.pagina('/api/usuarios/', {'page_size': 50, 'paginacion': 'paginas'})
+        self.assertEqual(len(datos['results']), 5)
+        self.assertEqual(datos['count'], Usuario.objects.count())
+        # El tope es para ?page_size=; sin él rige PAGE_SIZE
+        self.assertEqual(len(self.pagina('/api/usuarios/')['results']), settings.REST_FRAMEWORK['PAGE_SIZE'])
+
+    def test_paginacion_por_paginas_para_api_client(self):
+        total = Usuario.objects.count()
+        datos = self.pagina('/api/usuarios/', {'paginacion': 'paginas', 'page_size': 4})
+        self.assertEqual(set(datos), {'count', 'next', 'previous', 'results'})
+        self.assertEqual(datos['count'], total)
+        self.assertIsNone(datos['previous'])
+        self.assertIn('page=2', datos['next'])
+        self.assertIn('paginacion=paginas', datos['next'])
+
+        paginas = self.recorrer('/api/usuarios/', {'paginacion': 'paginas', 'page_size': 4})
+        ids = [fila['id'] for pagina in paginas for fila in pagina['results']]
+        self.assertEqual(ids, list(Usuario.objects.order_by('-pk').values_list('pk', flat=True)))
+        self.assertTrue(all(pagina['count'] == total for pagina in paginas))
+
+        # Las llamadas de templates/api_client.html
+        for url in ('/api/tutores/', '/api/sesiones/', '/api/usuarios/', '/api/recursos/'):
+            with self.subTest(url=url):
+                self.assertIn('count', self.pagina(url, {'paginacion': 'paginas'}))
+
+    @skipUnless(settings.API_NAVEGABLE, 'BrowsableAPIRenderer solo con API_NAVEGABLE')
+    def test_api_navegable_en_ambos_modos(self):
+        for parametros, enlace in (
+            ({'page_size': 4}, 'cursor='),
+            ({'page_size': 4, 'paginacion': 'paginas'}, 'page=2'),
+        ):
+            with self.subTest(parametros=parametros):
+                response = self.client.get('/api/usuarios/', parametros, HTTP_ACCEPT='text/html')
+                self.assertContains(response, enlace)
+
+
+# ============================================
+# API: LECTURA RÁPIDA (main/lectura_rapida.py)
+# ============================================
+@override_settings(LIMITES_ACTIVOS=False)
+class LecturaRapidaTests(TestCase):
+    """Las listas armadas con el plan compilado entregan el mismo JSON que el serializer"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = sembrar_datos(tutores=4, estudiantes=5, sesiones_por_tutor=5, mensajes_por_sesion=2)
+        # Valores que pasan por los convertidores: fechas, decimales y nulos
+        sesion = SesionTutoria.objects.order_by('pk').first()
+        SesionTutoria.objects.filter(pk=sesion.pk).update(
+            fecha_inicio=sesion.fecha_programada, fecha_fin=sesion.fecha_programada + timedelta(minutes=45),
+            calificacion_tutor=5, razon_rechazo=None, notas_tutor='Notas con tildes: ñandú',
+        )
+        Tutor.objects.filter(pk=Tutor.objects.order_by('pk').first().pk).update(calificacion_promedio=Decimal('3.75'))
+
+    def setUp(self):
+        self.client.force_login(self.usuarios['admin'])
+
+    def pedir(self, url, parametros):
+        response = self.client.get(url, parametros)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def comparar(self, url, parametros, con_plan=True):
+        """Compara la respuesta (y la página siguiente) con y sin plan; retorna la rápida"""
+        with mock.patch.object(lectura_rapida.Plan, 'armar', autospec=True, side_effect=lectura_rapida.Plan.armar) as armar:
+            rapida = self.pedir(url, parametros)
+            siguiente = self.pedir(rapida['next'], {}) if rapida.get('next') else None
+        self.assertEqual(armar.called, con_plan)
+        with mock.patch.object(lectura_rapida, 'compilar', return_value=None):
+            self.assertEqual(rapida, self.pedir(url, parametros))
+            if siguiente is not None:
+                self.assertEqual(siguiente, self.pedir(rapida['next'], {}))
+        return rapida
+
+    def test_tutores(self):
+        casos = (
+            ({}, True),
+            ({'page_size': 3}, True),
+            ({'fields': 'id,calificacion_promedio,fecha_certificacion,usuario.first_name'}, True),
+            ({'fields': 'usuario', 'paginacion': 'paginas'}, True),
+            ({'expand': 'sesiones'}, False),
+            ({'fields': 'id,sesiones.estado', 'expand': 'sesiones'}, False),
+        )
+        for parametros, con_plan in casos:
+            with self.subTest(parametros=parametros):
+                datos = self.comparar('/api/tutores/', parametros, con_plan)
+                self.assertTrue(datos['results'])
+
+    def test_sesiones(self):
+        casos = (
+            ({}, True),
+            ({'page_size': 4, 'estado': 'Completada'}, True),
+            ({'fields': 'id,estado,fecha_programada,fecha_inicio,calificacion_tutor,tutor'}, True),
+            ({'ordering': 'id', 'paginacion': 'paginas', 'page': 2}, True),
+            ({'expand': 'mensajes'}, False),
+            ({'fields': 'id,mensajes.mensaje', 'expand': 'mensajes'}, False),
+        )
+        for parametros, con_plan in casos:
+            with self.subTest(parametros=parametros):
+                datos = self.comparar('/api/sesiones/', parametros, con_plan)
+                self.assertTrue(datos['results'])
+
+    def test_plan_solo_pide_las_columnas_necesarias(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.pedir('/api/sesiones/', {'fields': 'id,estado'})
+        tabla = f'FROM {connection.ops.quote_name(SesionTutoria._meta.db_table)}'
+        select = next(c['sql'] for c in consultas.captured_queries if tabla in c['sql'])
+        self.assertNotIn('tema_solicitud', select)
+        self.assertIn(connection.ops.quote_name('estado'), select)
+
+
+# ============================================
+# API: ESCRITURAS MASIVAS (/bulk/)
+# ============================================
+@override_settings(LIMITES_ACTIVOS=False)
+class EscrituraMasivaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = sembrar_datos()
+        cls.estudiante = cls.usuarios['estudiante']
+        cls.propia = SesionTutoria.objects.filter(tutorado=cls.estudiante, estado='Pendiente').first()
+        cls.ajena = SesionTutoria.objects.exclude(tutorado=cls.estudiante).exclude(
+            tutor__usuario=cls.estudiante).first()
+
+    def setUp(self):
+        self.client.force_login(self.estudiante)
+
+    def bulk(self, metodo, url, items):
+        return getattr(self.client, metodo)(url, items, content_type='application/json')
+
+    def test_patch_no_encuentra_sesiones_ajenas(self):
+        response = self.bulk('patch', '/api/sesiones/bulk/', [{'id': self.ajena.pk, 'tema_solicitud': 'Ajena'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('id', response.json()['errores'][0]['errores'])
+        self.assertNotEqual(SesionTutoria.objects.get(pk=self.ajena.pk).tema_solicitud, 'Ajena')
+
+    def test_patch_de_sesiones_propias(self):
+        response = self.bulk('patch', '/api/sesiones/bulk/', [{'id': self.propia.pk, 'tema_solicitud': 'Propia'}])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(SesionTutoria.objects.get(pk=self.propia.pk).tema_solicitud, 'Propia')
+
+    def test_estado_no_se_escribe_en_bulk(self):
+        response = self.bulk('patch', '/api/sesiones/bulk/', [{'id': self.propia.pk, 'estado': 'Completada'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('estado', response.json()['errores'][0]['errores'])
+        self.assertEqual(SesionTutoria.objects.get(pk=self.propia.pk).estado, 'Pendiente')
+
+    def test_mensajes_creados_a_nombre_del_usuario(self):
+        otro = self.usuarios['tutor']
+        response = self.bulk('post', '/api/mensajes/bulk/', [
+            {'sesion': self.propia.pk, 'remitente': otro.pk, 'mensaje': 'Suplantado'},
+        ])
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Mensaje.objects.get(mensaje='Suplantado').remitente_id, self.estudiante.pk)
+
+    def test_mensajes_en_sesiones_ajenas_se_rechazan(self):
+        response = self.bulk('post', '/api/mensajes/bulk/', [{'sesion': self.ajena.pk, 'mensaje': 'Intruso'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sesion', response.json()['errores'][0]['errores'])
+        self.assertFalse(Mensaje.objects.filter(mensaje='Intruso').exists())
+
+    def test_remitente_no_se_cambia_en_patch(self):
+        mensaje = Mensaje.objects.create(sesion=self.propia, remitente=self.estudiante, mensaje='Original')
+        response = self.bulk('patch', '/api/mensajes/bulk/', [{'id': mensaje.pk, 'remitente': self.usuarios['tutor'].pk}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Mensaje.objects.get(pk=mensaje.pk).remitente_id, self.estudiante.pk)
+
+    def test_staff_escribe_a_nombre_de_otros(self):
+        self.client.force_login(self.usuarios['admin'])
+        response = self.bulk('post', '/api/mensajes/bulk/', [
+            {'sesion': self.ajena.pk, 'remitente': self.ajena.tutorado_id, 'mensaje': 'Importado'},
+        ])
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Mensaje.objects.get(mensaje='Importado').remitente_id, self.ajena.tutorado_id)
+
+
+# ============================================
+# CODIFICACIÓN JSON DE LA API
+# ============================================
+class CodificacionJSONTests(SimpleTestCase):
+
+    def assertIgualQueDRF(self, datos):
+        self.assertEqual(renderers.codificar(datos), JSONRenderer().render(datos))
+
+    def test_mismo_resultado_que_drf(self):
+        casos = {
+            'fechas': {
+                'utc': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+                'local': datetime(2024, 5, 1, 12, 30, tzinfo=dt_timezone(timedelta(hours=-4))),
+                'ingenua': datetime(2024, 5, 1, 12, 30, 15, 500),
+                'dia': date(2024, 5, 1),
+                'hora': dt_time(8, 15, 0, 250000),
+            },
+            'claves_no_str': {1: 'uno', 2.5: 'dos', True: 'si', None: 'nada'},
+            'separadores': 'línea\u2028párrafo\u2029fin',
+            'entero_grande': 2 ** 70,
+            'negativo_grande': [-(2 ** 64), 1],
+            'otros': [Decimal('1.50'), uuid.UUID(int=7), 'ñandú'],
+        }
+        for nombre, datos in casos.items():
+            with self.subTest(nombre):
+                self.assertIgualQueDRF(datos)
+
+    def test_exportacion_con_el_mismo_formato(self):
+        filas = [{'id': 1, 'texto': 'a\u2028b'}, {'id': 2 ** 65, 'fecha': datetime(2024, 1, 1, tzinfo=dt_timezone.utc)}]
+        self.assertEqual(b''.join(renderers.transmitir_json(filas)), JSONRenderer().render(filas))
+
+
+@override_settings(LIMITES_ACTIVOS=False)
+class PermisosExportacionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = sembrar_datos()
+
+    def test_solo_administradores_exportan_usuarios_y_mensajes(self):
+        for url in ('/api/usuarios/exportar/', '/api/mensajes/exportar/'):
+            with self.subTest(url):
+                self.client.force_login(self.usuarios['estudiante'])
+                self.assertEqual(self.client.get(url).status_code, 403)
+                self.client.force_login(self.usuarios['admin'])
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                response.close()
+
+    def test_los_demas_endpoints_siguen_exportando(self):
+        self.client.force_login(self.usuarios['estudiante'])
+        response = self.client.get('/api/tutores/exportar/')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+
+# ============================================
+# CATÁLOGO LOCAL DE OPEN LIBRARY
+# ============================================
+class CatalogoTests(TestCase):
+
+    def test_tokeniza_cualquier_alfabeto(self):
+        casos = {
+            'Cien años de Soledad': ['cien', 'anos', 'de', 'soledad'],
+            'Преступление и наказание': ['преступление', 'наказание'],
+            'Ἰλιάς ΟΜΗΡΟΥ': ['ιλιασ', 'ομηρου'],  # casefold() unifica la sigma final
+            'Søren Kierkegaard, Łódź': ['søren', 'kierkegaard', 'łodz'],
+            'STRASSE straße': ['strasse'],
+            'snake_case, 3D-modelado': ['snake', 'case', '3d', 'modelado'],
+        }
+        for texto, esperado in casos.items():
+            with self.subTest(texto):
+                self.assertEqual(catalogo.tokenizar(texto), esperado)
+
+    def test_busca_titulos_en_otros_alfabetos(self):
+        libro = LibroCatalogo.objects.create(clave='/works/OL1W', titulo='Преступление и наказание', autor='Достоевский')
+        TerminoCatalogo.objects.bulk_create(catalogo.terminos_de_libro(libro))
+        resultado = catalogo.buscar_en_catalogo('наказание ДОСТОЕВСКИЙ', 10)
+        self.assertEqual(resultado['total_results'], 1)
+        self.assertEqual(resultado['books'][0]['title'], libro.titulo)
+
+    def test_reindexar_regenera_los_terminos(self):
+        libro = LibroCatalogo.objects.create(clave='/works/OL2W', titulo='Søren', autor='Garff')
+        TerminoCatalogo.objects.create(libro=libro, campo='titulo', termino='ren')  # Tokenización anterior
+        call_command('importar_openlibrary', reindexar=True, lote=1, stdout=StringIO())
+        self.assertEqual(
+            sorted(libro.terminos.values_list('campo', 'termino')), [('autor', 'garff'), ('titulo', 'søren')],
+        )
+
+
+# ============================================
+# TRANSICIONES DE ESTADO
+# ============================================
+@override_settings(LIMITES_ACTIVOS=False)
+class TransicionesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = sembrar_datos()
+        cls.tutor = cls.usuarios['tutor']
+
+    def setUp(self):
+        self.sesion = SesionTutoria.objects.filter(tutor__usuario=self.tutor).order_by('pk').first()
+        SesionTutoria.objects.filter(pk=self.sesion.pk).update(estado='Pendiente', razon_rechazo=None)
+        self.senales = []
+        transiciones.sesion_transicion.connect(self.registrar, sender=SesionTutoria, dispatch_uid='transiciones_tests')
+        self.addCleanup(transiciones.sesion_transicion.disconnect, sender=SesionTutoria, dispatch_uid='transiciones_tests')
+
+    def registrar(self, sender, **kwargs):
+        self.senales.append(kwargs)
+
+    def estado(self):
+        return SesionTutoria.objects.get(pk=self.sesion.pk).estado
+
+    def test_de_dos_aceptaciones_simultaneas_gana_una(self):
+        # Dos requests cargaron la sesión pendiente y aceptan a la vez
+        primera = SesionTutoria.objects.get(pk=self.sesion.pk)
+        segunda = SesionTutoria.objects.get(pk=self.sesion.pk)
+        version = versiones.obtener(SesionTutoria)[0]
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertTrue(transiciones.transicionar(primera, 'aceptar'))
+        self.assertFalse(transiciones.transicionar(segunda, 'aceptar'))
+
+        self.assertEqual((primera.estado, segunda.estado, self.estado()), ('Aceptada', 'Pendiente', 'Aceptada'))
+        updates = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith('UPDATE "main_sesiontutoria"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"estado" IN', updates[0])
+        self.assertNotIn('"tema_solicitud"', updates[0])  # Solo las columnas que cambian
+        self.assertNotEqual(versiones.obtener(SesionTutoria)[0], version)
+        self.assertEqual([(senal['transicion'], senal['ids']) for senal in self.senales], [('aceptar', [self.sesion.pk])])
+
+    def test_denegar_despues_de_aceptar_se_rechaza(self):
+        segunda = SesionTutoria.objects.get(pk=self.sesion.pk)
+        transiciones.transicionar(self.sesion, 'aceptar')
+        self.assertFalse(transiciones.transicionar(segunda, 'denegar', razon_rechazo='Tarde'))
+        guardada = SesionTutoria.objects.get(pk=self.sesion.pk)
+        self.assertEqual((guardada.estado, guardada.razon_rechazo), ('Aceptada', None))
+        self.assertEqual(len(self.senales), 1)  # La rechazada no envía señal
+
+    def test_transicionar_varias_mueve_solo_las_de_un_estado_de_origen(self):
+        sesiones = SesionTutoria.objects.filter(tutor__usuario=self.tutor)
+        origen = sesiones.filter(estado__in=transiciones.TRANSICIONES['cancelar'][0])
+        esperadas = set(origen.values_list('pk', flat=True))
+        self.assertEqual(transiciones.transicionar_varias(sesiones, 'cancelar'), len(esperadas))
+        self.assertEqual(set(self.senales[-1]['ids']), esperadas)
+        self.assertFalse(origen.exists())
+        self.assertEqual(transiciones.transicionar_varias(sesiones, 'cancelar'), 0)
+        self.assertEqual(len(self.senales), 1)
+
+    def test_acciones_del_admin_usan_transicionar_varias(self):
+        self.client.force_login(self.usuarios['admin'])
+        aceptada = SesionTutoria.objects.filter(estado='Aceptada').first()
+        denegada = SesionTutoria.objects.filter(estado='Denegada').first()
+        response = self.client.post('/admin/main/sesiontutoria/', {
+            'action': 'marcar_como_completada', '_selected_action': [self.sesion.pk, aceptada.pk, denegada.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        estados = dict(SesionTutoria.objects.filter(pk__in=[self.sesion.pk, aceptada.pk, denegada.pk]).values_list('pk', 'estado'))
+        self.assertEqual(estados, {self.sesion.pk: 'Pendiente', aceptada.pk: 'Completada', denegada.pk: 'Denegada'})
+        self.assertEqual([(senal['transicion'], senal['ids']) for senal in self.senales], [('finalizar', [aceptada.pk])])
+        self.assertIsNotNone(SesionTutoria.objects.get(pk=aceptada.pk).fecha_fin)
+
+    def test_calificar_solo_sesiones_completadas(self):
+        self.assertFalse(transiciones.calificar(self.sesion, 'calificacion_tutorado', 5))
+        self.client.force_login(self.sesion.tutorado)
+        url = reverse('calificar_desde_notificacion', args=[self.sesion.pk])
+        self.assertEqual(self.client.post(url, {'calificacion': 4}).status_code, 400)
+        self.assertIsNone(SesionTutoria.objects.get(pk=self.sesion.pk).calificacion_tutorado)
+
+        transiciones.transicionar(self.sesion, 'aceptar')
+        transiciones.transicionar(self.sesion, 'finalizar', fecha_fin=timezone.now())
+        self.assertEqual(self.client.post(url, {'calificacion': 4}).status_code, 200)
+        self.assertEqual(SesionTutoria.objects.get(pk=self.sesion.pk).calificacion_tutorado, 4)
+
+    def test_vistas_de_aceptar_denegar_y_finalizar(self):
+        self.client.force_login(self.tutor)
+        SesionTutoria.objects.filter(pk=self.sesion.pk).update(estado='Denegada')
+        self.assertEqual(self.client.post(reverse('aceptar_sesion', args=[self.sesion.pk])).status_code, 400)
+        self.assertEqual(self.estado(), 'Denegada')
+
+        SesionTutoria.objects.filter(pk=self.sesion.pk).update(estado='Pendiente')
+        self.assertEqual(self.client.post(reverse('aceptar_sesion', args=[self.sesion.pk])).status_code, 200)
+        self.assertEqual(self.estado(), 'Aceptada')
+        response = self.client.post(reverse('denegar_sesion', args=[self.sesion.pk]), '{}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.client.post(reverse('finalizar_sesion', args=[self.sesion.pk]))
+        guardada = SesionTutoria.objects.get(pk=self.sesion.pk)
+        self.assertEqual(guardada.estado, 'Completada')
+        self.assertIsNotNone(guardada.fecha_fin)
+
+    # PUT/PATCH de la API (SesionTutoriaViewSet.perform_update)
+
+    def patch(self, **datos):
+        self.client.force_login(self.usuarios['admin'])
+        return self.client.patch(f'/api/sesiones/{self.sesion.pk}/', datos, content_type='application/json')
+
+    def test_patch_de_estado_pasa_por_la_transicion(self):
+        response = self.patch(estado='Denegada', razon_rechazo='Sin horario')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['estado'], 'Denegada')
+        evento = EventoSesion.objects.get(sesion_id=self.sesion.pk, tipo='denegar')
+        self.assertEqual((evento.estado_origen, evento.estado_destino), ('Pendiente', 'Denegada'))
+        self.assertEqual(evento.datos, {'razon_rechazo': 'Sin horario'})
+
+    def test_patch_sin_transicion_responde_400(self):
+        response = self.patch(estado='Completada')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('estado', response.json())
+        self.assertEqual(SesionTutoria.objects.get(pk=self.sesion.pk).estado, 'Pendiente')
+        self.assertFalse(EventoSesion.objects.filter(sesion_id=self.sesion.pk).exclude(tipo='solicitar').exists())
+
+    def test_patch_sin_cambio_de_estado_no_deja_evento(self):
+        antes = EventoSesion.objects.count()
+        self.assertEqual(self.patch(estado='Pendiente', tema_solicitud='Otro tema').status_code, 200)
+        self.assertEqual(EventoSesion.objects.count(), antes)
+
+
+
+# ============================================
+# HISTORIAL DE EVENTOS Y PROYECCIONES
+# ============================================
+class _Revertir(Exception):
+    pass
+
+
+@override_settings(LIMITES_ACTIVOS=False, PROYECCIONES_MARGEN_SEGUNDOS=0)
+class HistorialEventosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = sembrar_datos()
+        cls.tutor = Tutor.objects.get(usuario=cls.usuarios['tutor'])
+        cls.otro = Tutor.objects.exclude(pk=cls.tutor.pk).order_by('pk').first()
+
+    def setUp(self):
+        # Solo el historial que arma cada test (sembrar_datos crea las sesiones con bulk_create, sin eventos)
+        EventoSesion.objects.all().delete()
+
+    def solicitar(self, tutor, cantidad):
+        plantilla = SesionTutoria.objects.filter(tutor=tutor).first()
+        return [
+            SesionTutoria.objects.create(
+                tutor=tutor, tutorado=self.usuarios['estudiante'], asignatura_id=plantilla.asignatura_id,
+                modalidad='Online', fecha_programada=timezone.now(), tema_solicitud='Evento',
+            )
+            for _ in range(cantidad)
+        ]
+
+    def historial(self):
+        """Seis solicitudes al tutor y dos al otro: 2 aceptadas, 1 completada, 1 denegada, 5 canceladas"""
+        sesiones = self.solicitar(self.tutor, 6) + self.solicitar(self.otro, 2)
+        transiciones.transicionar(sesiones[0], 'aceptar')
+        transiciones.transicionar(sesiones[1], 'aceptar')
+        transiciones.transicionar(sesiones[0], 'finalizar', fecha_fin=timezone.now())
+        transiciones.transicionar(sesiones[2], 'denegar', razon_rechazo='Sin horario')
+        transiciones.transicionar_varias(SesionTutoria.objects.filter(pk__in=[s.pk for s in sesiones[3:]]), 'cancelar')
+        return sesiones
+
+    def instantanea(self):
+        return (
+            sorted(EstadisticaTutor.objects.values_list(
+                'tutor_id', 'solicitadas', 'aceptadas', 'denegadas', 'completadas', 'canceladas',
+                'aceptaciones_medidas', 'segundos_aceptacion',
+            )),
+            sorted(ContadorEventosDia.objects.values_list('fecha', 'tipo', 'total')),
+        )
+
+    def test_solicitudes_y_transiciones_dejan_eventos(self):
+        sesiones = self.solicitar(self.tutor, 3)
+        self.assertEqual(EventoSesion.objects.filter(tipo='solicitar').count(), 3)
+        transiciones.transicionar(sesiones[0], 'denegar', razon_rechazo='Sin horario')
+        evento = EventoSesion.objects.get(sesion_id=sesiones[0].pk, tipo='denegar')
+        self.assertEqual((evento.estado_origen, evento.estado_destino), ('Pendiente', 'Denegada'))
+        self.assertEqual(evento.datos, {'razon_rechazo': 'Sin horario'})
+
+        with self.assertRaises(_Revertir), transaction.atomic():
+            transiciones.transicionar(sesiones[1], 'aceptar')
+            raise _Revertir
+        self.assertFalse(EventoSesion.objects.filter(sesion_id=sesiones[1].pk, tipo='aceptar').exists())
+
+        with self.assertRaises(ValueError):
+            evento.tipo = 'aceptar'
+            evento.save()
+
+    def test_transicion_masiva_escribe_sus_eventos_con_un_insert(self):
+        sesiones = self.solicitar(self.tutor, 4)
+        with CaptureQueriesContext(connection) as consultas:
+            canceladas = transiciones.transicionar_varias(
+                SesionTutoria.objects.filter(pk__in=[sesion.pk for sesion in sesiones]), 'cancelar',
+            )
+        inserts = [q for q in consultas.captured_queries if q['sql'].startswith('INSERT INTO "main_eventosesion"')]
+        self.assertEqual((canceladas, len(inserts)), (4, 1))
+        self.assertEqual(EventoSesion.objects.filter(tipo='cancelar').count(), 4)
+
+    def test_actualizacion_por_lotes_desde_el_punto_de_control(self):
+        self.historial()
+        total = EventoSesion.objects.count()
+        for nombre in proyecciones.PROYECCIONES:
+            self.assertEqual(proyecciones.actualizar(nombre, lote=3), total, nombre)
+
+        estadistica = EstadisticaTutor.objects.get(tutor=self.tutor)
+        self.assertEqual(
+            (estadistica.solicitadas, estadistica.aceptadas, estadistica.completadas, estadistica.denegadas,
+             estadistica.canceladas, estadistica.aceptaciones_medidas),
+            (6, 2, 1, 1, 3, 2),
+        )
+        self.assertIsNotNone(estadistica.promedio_aceptacion())
+        por_tipo = Counter(EventoSesion.objects.values_list('tipo', flat=True))
+        contados = Counter()
+        for tipo, cantidad in ContadorEventosDia.objects.values_list('tipo', 'total'):
+            contados[tipo] += cantidad
+        self.assertEqual(contados, por_tipo)
+        ultimo = EventoSesion.objects.order_by('-pk').values_list('pk', flat=True).first()
+        self.assertEqual(set(PuntoControlProyeccion.objects.values_list('ultimo_evento', flat=True)), {ultimo})
+        for nombre in proyecciones.PROYECCIONES:
+            self.assertEqual(proyecciones.actualizar(nombre), 0)
+
+    def test_margen_e_incremental_igual_a_reconstruir(self):
+        self.historial()
+        for nombre in proyecciones.PROYECCIONES:
+            proyecciones.actualizar(nombre)
+
+        nueva = self.solicitar(self.tutor, 1)[0]
+        with override_settings(PROYECCIONES_MARGEN_SEGUNDOS=60):
+            self.assertEqual(proyecciones.actualizar('estadisticas_tutor'), 0)  # Dentro del margen: espera
+        transiciones.transicionar(nueva, 'aceptar')
+        self.assertEqual(proyecciones.actualizar('estadisticas_tutor'), 2)
+        self.assertEqual(proyecciones.actualizar('eventos_por_dia'), 2)
+        incremental = self.instantanea()
+
+        call_command('actualizar_proyecciones', reconstruir=True, stdout=StringIO())
+        self.assertEqual(self.instantanea(), incremental)
+
+    def test_historial_reconstruido_no_mide_aceptaciones(self):
+        migracion = importlib.import_module('main.migrations.0015_historial_eventos')
+        sesion = SesionTutoria.objects.filter(tutor__isnull=False).first()
+        SesionTutoria.objects.filter(pk=sesion.pk).update(estado='Completada', fecha_fin=timezone.now())
+        EventoSesion.objects.all().delete()
+
+        migracion.historial_existente(django_apps, None)
+        tipos = list(EventoSesion.objects.filter(sesion_id=sesion.pk).order_by('pk').values_list('tipo', 'estado_origen'))
+        self.assertEqual(tipos, [('solicitar', ''), ('aceptar', 'Pendiente'), ('finalizar', 'Aceptada')])
+
+        proyecciones.actualizar('estadisticas_tutor')
+        estadistica = EstadisticaTutor.objects.get(tutor_id=sesion.tutor_id)
+        self.assertEqual(estadistica.aceptadas, estadistica.completadas + SesionTutoria.objects.filter(
+            tutor_id=sesion.tutor_id, estado='Aceptada').count())
+        self.assertEqual(estadistica.aceptaciones_medidas, 0)
+        self.assertIsNone(estadistica.promedio_aceptacion())
+
+
+# ============================================
+# CIERRE DE SESIÓN POR INACTIVIDAD
+# ============================================
+@override_settings(LIMITES_ACTIVOS=False, SESION_INACTIVIDAD_MINUTOS=30)
+class SesionInactividadTests(TestCase):
+    COOKIE = SessionTimeoutMiddleware.COOKIE
+
+    def iniciar(self, rut):
+        cliente = self.client_class()
+        cliente.force_login(Usuario.objects.create(rut=rut, username=rut))
+        self.assertEqual(cliente.get('/api/').status_code, 200)
+        return cliente
+
+    def envejecer(self, cliente):
+        sesion = cliente.session
+        sesion['last_activity'] = (timezone.now() - timedelta(minutes=31)).isoformat()
+        sesion.save()
+
+    def test_cookie_no_lleva_el_session_key(self):
+        cliente = self.iniciar('12345678-5')
+        self.assertNotIn(cliente.session.session_key, cliente.cookies[self.COOKIE].value)
+
+    def test_cookie_reciente_mantiene_la_sesion(self):
+        cliente = self.iniciar('12345678-5')
+        self.envejecer(cliente)
+        self.assertEqual(cliente.get('/api/').status_code, 200)
+
+    def test_cookie_de_otra_sesion_no_cuenta(self):
+        ajena = self.iniciar('12345678-5').cookies[self.COOKIE].value
+        cliente = self.iniciar('11111111-1')
+        self.envejecer(cliente)
+        cliente.cookies[self.COOKIE] = ajena
+        response = cliente.get('/api/')
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+
+
+# ============================================
+# SINCRONIZACIÓN INCREMENTAL (/api/sync/)
+# ============================================
+@override_settings(LIMITES_ACTIVOS=False, SYNC_MARGEN_SEGUNDOS=0)
+class SincronizacionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = sembrar_datos(tutores=3, estudiantes=4, sesiones_por_tutor=6)
+        cls.estudiante = cls.usuarios['estudiante']
+
+    def setUp(self):
+        self.client.force_login(self.estudiante)
+
+    def sync(self, since=None):
+        response = self.client.get('/api/sync/', {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def ids(self, datos, nombre):
+        return sorted(fila['id'] for fila in datos[nombre]['cambios'])
+
+    def test_sync_completo_sin_token(self):
+        datos = self.sync()
+        self.assertTrue(datos['completo'])
+        self.assertFalse(datos['hay_mas'])
+        sesiones = sincronizacion.sesiones_de(self.estudiante)
+        self.assertEqual(self.ids(datos, 'sesiones'), sorted(sesiones.values_list('pk', flat=True)))
+        self.assertEqual(
+            self.ids(datos, 'mensajes'), sorted(Mensaje.objects.filter(sesion__in=sesiones).values_list('pk', flat=True)),
+        )
+        self.assertEqual(
+            self.ids(datos, 'notificaciones'),
+            sorted(Notificacion.objects.filter(usuario=self.estudiante).values_list('pk', flat=True)),
+        )
+
+    def test_token_vencido_entrega_todo(self):
+        viejo = timezone.now() - timedelta(days=settings.SYNC_RETENCION_DIAS + 1)
+        token = sincronizacion.generar_token({
+            nombre: (viejo, 0) for nombre in ('sesiones', 'mensajes', 'notificaciones', 'eliminados')
+        })
+        datos = self.sync(token)
+        self.assertTrue(datos['completo'])
+        self.assertEqual(len(datos['sesiones']['cambios']), sincronizacion.sesiones_de(self.estudiante).count())
+
+    def test_token_alterado_responde_400(self):
+        token = self.sync()['token']
+        response = self.client.get('/api/sync/', {'since': token[:-2] + ('AA' if not token.endswith('AA') else 'BB')})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('since', response.json())
+
+    def test_ida_y_vuelta_del_token(self):
+        ahora = timezone.now()
+        posiciones = {'sesiones': (ahora, 3), 'mensajes': (ahora, 0), 'notificaciones': (ahora, 7), 'eliminados': (ahora, 1)}
+        self.assertEqual(sincronizacion.leer_token(sincronizacion.generar_token(posiciones)), posiciones)
+        with self.assertRaises(sincronizacion.TokenInvalido):
+            sincronizacion.leer_token(sincronizacion.generar_token({'sesiones': (ahora, 3)}))
+
+    def test_con_token_solo_llegan_los_cambios(self):
+        token = self.sync()['token']
+        datos = self.sync(token)
+        self.assertFalse(datos['completo'])
+        self.assertEqual(self.ids(datos, 'sesiones'), [])
+
+        sesion = sincronizacion.sesiones_de(self.estudiante).first()
+        sesion.tema_solicitud = 'Cambiado'
+        sesion.save()
+        datos = self.sync(datos['token'])
+        self.assertEqual(self.ids(datos, 'sesiones'), [sesion.pk])
+        self.assertEqual(self.ids(datos, 'mensajes'), [])
+
+    def test_eliminaciones_llegan_en_eliminados(self):
+        token = self.sync()['token']
+        mensaje = Mensaje.objects.filter(sesion__in=sincronizacion.sesiones_de(self.estudiante)).first()
+        mensaje_id = mensaje.pk
+        mensaje.delete()
+        self.assertTrue(Eliminacion.objects.filter(usuario=self.estudiante, objeto_id=mensaje_id).exists())
+
+        datos = self.sync(token)
+        self.assertEqual(datos['mensajes']['eliminados'], [mensaje_id])
+        self.assertEqual(datos['sesiones']['eliminados'], [])
+        self.assertEqual(self.sync(datos['token'])['mensajes']['eliminados'], [])
+
+    def test_sync_maximo_trunca_y_retoma_desde_la_posicion(self):
+        esperadas = sorted(sincronizacion.sesiones_de(self.estudiante).values_list('pk', flat=True))
+        self.assertGreater(len(esperadas), 2)
+        recibidas = []
+        token = None
+        with override_settings(SYNC_MAXIMO=2):
+            for _ in range(100):
+                datos = self.sync(token)
+                self.assertLessEqual(len(datos['sesiones']['cambios']), 2)
+                recibidas += self.ids(datos, 'sesiones')
+                token = datos['token']
+                if not datos['hay_mas']:
+                    break
+        self.assertFalse(datos['hay_mas'])
+        self.assertEqual(sorted(recibidas), esperadas)  # Sin repetidas ni perdidas
+
+        # Misma fecha_actualizacion: el pk desempata la posición
+        fecha = timezone.now() - timedelta(seconds=1)
+        SesionTutoria.objects.filter(pk__in=esperadas).update(fecha_actualizacion=fecha)
+        primera = sincronizacion.sincronizar(self.estudiante, maximo=2)
+        segunda = sincronizacion.sincronizar(self.estudiante, primera['token'], maximo=2)
+        self.assertTrue(primera['hay_mas'])
+        self.assertEqual(
+            [fila['id'] for fila in primera['sesiones']['cambios'] + segunda['sesiones']['cambios']], esperadas[:4],
+        )
+
+    def test_sesiones_archivadas_no_dejan_eliminaciones(self):
+        token = self.sync()['token']
+        movidas = archivo.archivar_lote(timezone.now(), 1000)
+        self.assertGreater(movidas['sesiones'], 0)
+        self.assertFalse(Eliminacion.objects.exists())
+        datos = self.sync(token)
+        self.assertEqual([datos[nombre]['eliminados'] for nombre in ('sesiones', 'mensajes', 'notificaciones')], [[], [], []])
+
+
+# ============================================
+# ARCHIVO HISTÓRICO DE SESIONES
+# ============================================
+@override_settings(**AJUSTES_VERIFICACION, ARCHIVO_SEMESTRES=2)
+class ArchivoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = sembrar_datos(tutores=2, estudiantes=2, sesiones_por_tutor=6)
+        cls.estudiante = cls.usuarios['estudiante']
+
+    def envejecer(self, cantidad, **filtros):
+        """Lleva `cantidad` sesiones Completadas a semestres anteriores al corte; retorna sus ids"""
+        ids = list(SesionTutoria.objects.filter(**filtros).order_by('pk').values_list('pk', flat=True)[:cantidad])
+        fecha_corte = archivo.corte()
+        for n, pk in enumerate(ids):
+            SesionTutoria.objects.filter(pk=pk).update(
+                estado='Completada', fecha_programada=fecha_corte - timedelta(days=30 * (n + 1)),
+            )
+        return ids
+
+    def test_inicio_semestre_en_el_borde(self):
+        local = timezone.get_current_timezone()
+        fin_primero = datetime(2024, 6, 30, 23, 59, tzinfo=local)
+        inicio_segundo = datetime(2024, 7, 1, tzinfo=local)
+        self.assertEqual(archivo.inicio_semestre(fecha=fin_primero), datetime(2024, 1, 1, tzinfo=local))
+        self.assertEqual(archivo.inicio_semestre(fecha=inicio_segundo), inicio_segundo)
+        self.assertEqual(archivo.inicio_semestre(1, inicio_segundo), datetime(2024, 1, 1, tzinfo=local))
+        self.assertEqual(archivo.inicio_semestre(3, inicio_segundo), datetime(2023, 1, 1, tzinfo=local))
+        self.assertEqual(archivo.inicio_semestre(2, fin_primero), datetime(2023, 1, 1, tzinfo=local))
+        # El semestre se decide en hora local: 02:00 UTC del 1 de julio sigue siendo 30 de junio en Santiago
+        utc = datetime(2024, 7, 1, 2, tzinfo=dt_timezone.utc)
+        self.assertEqual(archivo.inicio_semestre(fecha=utc), datetime(2024, 1, 1, tzinfo=local))
+
+    def test_corte_cuenta_semestres_desde_ahora(self):
+        local = timezone.get_current_timezone()
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2024, 7, 1, 4, tzinfo=dt_timezone.utc)):
+            self.assertEqual(archivo.corte(), datetime(2023, 7, 1, tzinfo=local))
+            self.assertEqual(archivo.corte(0), datetime(2024, 7, 1, tzinfo=local))
+            with override_settings(ARCHIVO_SEMESTRES=1):
+                self.assertEqual(archivo.corte(), datetime(2024, 1, 1, tzinfo=local))
+
+    def test_lote_mueve_la_sesion_con_mensajes_y_notificaciones(self):
+        ids = self.envejecer(3)
+        original = SesionTutoria.objects.get(pk=ids[-1])
+        mensajes = sorted(Mensaje.objects.filter(sesion_id__in=ids).values_list('pk', flat=True))
+        notificaciones = sorted(Notificacion.objects.filter(sesion_id__in=ids).values_list('pk', flat=True))
+        version = versiones.obtener(SesionTutoria, Mensaje, Notificacion)[0]
+
+        movidas = archivo.archivar_lote(archivo.corte(), 2)
+        self.assertEqual(movidas, {'sesiones': 2, 'mensajes': 6, 'notificaciones': 2})
+        self.assertNotEqual(versiones.obtener(SesionTutoria, Mensaje, Notificacion)[0], version)
+        # El lote toma las más antiguas
+        self.assertEqual(sorted(SesionArchivada.objects.values_list('pk', flat=True)), sorted(ids[1:]))
+
+        self.assertEqual(archivo.archivar_lote(archivo.corte(), 2), {'sesiones': 1, 'mensajes': 3, 'notificaciones': 1})
+        self.assertEqual(archivo.archivar_lote(archivo.corte(), 2), {})
+
+        self.assertEqual(sorted(MensajeArchivado.objects.values_list('pk', flat=True)), mensajes)
+        self.assertEqual(sorted(NotificacionArchivada.objects.values_list('pk', flat=True)), notificaciones)
+        self.assertEqual(set(MensajeArchivado.objects.values_list('sesion_id', flat=True)), set(ids))
+        copia = SesionArchivada.objects.get(pk=original.pk)
+        for campo in SesionTutoria._meta.concrete_fields:
+            self.assertEqual(getattr(copia, campo.attname), getattr(original, campo.attname), campo.name)
+        self.assertIsNotNone(copia.fecha_archivado)
+
+    def test_raw_delete_no_deja_eliminaciones_ni_huerfanos(self):
+        ids = self.envejecer(4)
+        eventos = EventoSesion.objects.count()
+        archivo.archivar_lote(archivo.corte(), 10)
+        self.assertFalse(SesionTutoria.objects.filter(pk__in=ids).exists())
+        self.assertFalse(Mensaje.objects.filter(sesion_id__in=ids).exists())
+        self.assertFalse(Notificacion.objects.filter(sesion_id__in=ids).exists())
+        self.assertFalse(Eliminacion.objects.exists())
+        self.assertEqual(EventoSesion.objects.count(), eventos)  # Sin post_delete ni transiciones
+        # Las que quedan conservan a sus hijos
+        self.assertEqual(Mensaje.objects.count(), 3 * SesionTutoria.objects.count())
+
+    def test_historial_intercala_ambas_tablas(self):
+        archivadas = self.envejecer(3, tutorado=self.estudiante)
+        SesionTutoria.objects.filter(tutorado=self.estudiante).exclude(pk__in=archivadas).update(estado='Completada')
+        condicion = Q(tutorado=self.estudiante, estado='Completada')
+        todas = list(SesionTutoria.objects.filter(condicion).values_list('pk', 'fecha_programada'))
+        archivo.archivar_lote(archivo.corte(), 10)
+
+        en_uso = archivo.historial(condicion)
+        self.assertFalse(set(en_uso.values_list('pk', flat=True)) & set(archivadas))
+
+        for orden, reverse in (('-fecha_programada', True), ('fecha_programada', False)):
+            sesiones = archivo.historial(condicion, incluir_archivo=True, orden=orden)
+            self.assertEqual([s.pk for s in sesiones], [pk for pk, _ in sorted(todas, key=lambda f: f[1], reverse=reverse)])
+        self.assertEqual(
+            [getattr(s, 'archivada', False) for s in archivo.historial(condicion, incluir_archivo=True)][-3:],
+            [True] * 3,
+        )
+
+    def test_comando_archiva_por_lotes(self):
+        ids = self.envejecer(5)
+        salida = StringIO()
+        call_command('archivar_sesiones', '--simular', stdout=salida)
+        self.assertIn('5 sesión(es)', salida.getvalue())
+        self.assertFalse(SesionArchivada.objects.exists())
+
+        salida = StringIO()
+        call_command('archivar_sesiones', '--lote', '2', stdout=salida)
+        self.assertEqual(salida.getvalue().count('lote:'), 3)
+        self.assertIn('5 sesiones, 15 mensajes, 5 notificaciones', salida.getvalue())
+        self.assertEqual(sorted(SesionArchivada.objects.values_list('pk', flat=True)), sorted(ids))
+
+    def test_index_cuenta_las_archivadas(self):
+        self.envejecer(3)
+        completadas = SesionTutoria.objects.filter(estado='Completada').count()
+        archivo.archivar_lote(archivo.corte(), 10)
+        self.assertEqual(self.client.get(reverse('index')).context['total_sesiones'], completadas)
+
+    def test_mis_sesiones_con_archivo(self):
+        archivadas = self.envejecer(2, tutorado=self.estudiante)
+        archivo.archivar_lote(archivo.corte(), 10)
+        self.client.force_login(self.estudiante)
+
+        pasadas = self.client.get(reverse('mis_sesiones')).context['sesiones_pasadas']
+        self.assertFalse({s.pk for s in pasadas} & set(archivadas))
+        response = self.client.get(reverse('mis_sesiones'), {'archivo': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['incluir_archivo'])
+        self.assertLessEqual(set(archivadas), {s.pk for s in response.context['sesiones_pasadas']})
+
+    def test_admin_sesiones_con_archivo(self):
+        archivadas = set(self.envejecer(2))
+        archivo.archivar_lote(archivo.corte(), 10)
+        self.client.force_login(self.usuarios['admin'])
+
+        def ids(**parametros):
+            response = self.client.get(reverse('admin_sesiones'), parametros)
+            self.assertEqual(response.status_code, 200)
+            return {s.pk for s in response.context['sesiones']}
+
+        self.assertFalse(ids() & archivadas)
+        self.assertLessEqual(archivadas, ids(archivo='1'))
+        self.assertLessEqual(archivadas, ids(archivo='1', periodo='pasadas'))
+        # El archivo solo tiene sesiones pasadas: otros períodos no lo consultan
+        self.assertFalse(ids(archivo='1', periodo='proximo_mes') & archivadas)
+
+
+# ============================================
+# POOL DE CONEXIONES MYSQL (main/pool_mysql)
+# ============================================
+class ConexionFalsa:
+    """Lo que el pool y el backend usan de una conexión de PyMySQL, sin servidor"""
+
+    def __init__(self, viva=True):
+        self.viva = viva
+        self.server_status = 0
+        self.cerrada = False
+        self.pings = 0
+        self.rollbacks = 0
+        self.falla_rollback = False
+
+    def ping(self, reconnect=True):
+        self.pings += 1
+        if not self.viva:
+            raise pool_base.Database.OperationalError(2006, 'MySQL server has gone away')
+
+    def rollback(self):
+        self.rollbacks += 1
+        if self.falla_rollback:
+            raise pool_base.Database.OperationalError(2013, 'Lost connection to MySQL server')
+        self.server_status &= ~SERVER_STATUS.SERVER_STATUS_IN_TRANS
+
+    def close(self):
+        self.cerrada = True
+
+
+class PoolTests(SimpleTestCase):
+    """Pool contra una fábrica de conexiones falsas y un reloj manual"""
+
+    def setUp(self):
+        self.ahora = 1000.0
+        reloj = mock.patch.object(pool_mysql.time, 'monotonic', lambda: self.ahora)
+        reloj.start()
+        self.addCleanup(reloj.stop)
+        self.conexiones = []
+        self.sin_red = False
+
+    def conectar(self):
+        if self.sin_red:
+            raise pool_base.Database.OperationalError(2003, "Can't connect to MySQL server")
+        conexion = ConexionFalsa()
+        self.conexiones.append(conexion)
+        return conexion
+
+    def crear(self, **opciones):
+        return pool_mysql.Pool(
+            conectar=self.conectar, cerrar=lambda conexion: conexion.close(), esta_viva=pool_base._ping,
+            **{'tamano': 2, 'espera': 0.01, 'reciclar': 1800, 'verificar': 30, **opciones},
+        )
+
+    def test_obtener_y_devolver_reutiliza(self):
+        pool = self.crear()
+        primera, segunda = pool.obtener(), pool.obtener()
+        self.assertIsNot(primera, segunda)
+        self.assertEqual(pool.estado()['en_uso'], 2)
+        pool.devolver(primera)
+        pool.devolver(segunda)
+        self.assertIs(pool.obtener(), segunda)  # La más reciente primero
+        self.assertEqual(pool.estado(), {
+            'creadas': 2, 'reutilizadas': 1, 'descartadas': 0, 'agotado': 0, 'tamano': 2, 'en_uso': 1, 'libres': 1,
+        })
+
+    def test_agotado_espera_y_falla(self):
+        pool = self.crear()
+        conexion = pool.obtener()
+        pool.obtener()
+        with self.assertRaises(pool_mysql.PoolAgotado):
+            pool.obtener()
+        self.assertEqual(pool.estado()['agotado'], 1)
+        pool.devolver(conexion)
+        self.assertIs(pool.obtener(), conexion)
+
+    def test_falla_al_conectar_libera_el_cupo(self):
+        pool = self.crear(tamano=1)
+        self.sin_red = True
+        with self.assertRaises(pool_base.Database.OperationalError):
+            pool.obtener()
+        self.sin_red = False
+        self.assertIsNotNone(pool.obtener())
+
+    def test_recicla_por_edad(self):
+        pool = self.crear()
+        vieja = pool.obtener()
+        pool.devolver(vieja)
+        self.ahora += 1800
+        nueva = pool.obtener()
+        self.assertIsNot(nueva, vieja)
+        self.assertTrue(vieja.cerrada)
+
+        # También al devolverla: una conexión vencida no vuelve a quedar libre
+        self.ahora += 1800
+        pool.devolver(nueva)
+        self.assertTrue(nueva.cerrada)
+        self.assertEqual(pool.estado()['libres'], 0)
+        self.assertEqual(pool.estado()['descartadas'], 2)
+
+    def test_verifica_solo_las_que_estuvieron_libres(self):
+        pool = self.crear()
+        conexion = pool.obtener()
+        pool.devolver(conexion)
+        self.ahora += 29
+        self.assertIs(pool.obtener(), conexion)
+        self.assertEqual(conexion.pings, 0)
+        pool.devolver(conexion)
+        self.ahora += 30
+        self.assertIs(pool.obtener(), conexion)
+        self.assertEqual(conexion.pings, 1)
+
+    def test_ping_fallido_descarta_y_conecta_otra(self):
+        pool = self.crear()
+        muerta = pool.obtener()
+        pool.devolver(muerta)
+        muerta.viva = False
+        self.ahora += 30
+        nueva = pool.obtener()
+        self.assertIsNot(nueva, muerta)
+        self.assertTrue(muerta.cerrada)
+        self.assertEqual(pool.estado()['descartadas'], 1)
+
+    def test_devolver_descartando_y_conexion_ajena(self):
+        pool = self.crear(tamano=1)
+        conexion = pool.obtener()
+        pool.devolver(conexion, descartar=True)
+        self.assertTrue(conexion.cerrada)
+        ajena = ConexionFalsa()
+        pool.devolver(ajena)  # No ocupa cupo: no debe liberar uno (BoundedSemaphore fallaría)
+        self.assertTrue(ajena.cerrada)
+        self.assertIsNotNone(pool.obtener())
+
+
+class BackendPoolTests(SimpleTestCase):
+    """DatabaseWrapper de main.pool_mysql sin servidor: get_new_connection del backend MySQL es la fábrica"""
+    ALIAS = 'pool_prueba'
+
+    def setUp(self):
+        self.conexiones = []
+        fabrica = mock.patch.object(
+            pool_base.base.DatabaseWrapper, 'get_new_connection', lambda wrapper, parametros: self.conectar(),
+        )
+        fabrica.start()
+        self.addCleanup(fabrica.stop)
+        self.addCleanup(pool_base._pools.pop, self.ALIAS, None)
+        self.wrapper = pool_base.DatabaseWrapper(
+            {**settings.DATABASES['default'], 'POOL': {'TAMANO': 1, 'ESPERA': 0.01}}, alias=self.ALIAS,
+        )
+
+    def conectar(self):
+        conexion = ConexionFalsa()
+        self.conexiones.append(conexion)
+        return conexion
+
+    def abrir(self):
+        self.wrapper.connection = self.wrapper.get_new_connection({})
+        return self.wrapper.connection
+
+    def test_cerrar_devuelve_al_pool(self):
+        conexion = self.abrir()
+        self.wrapper._close()
+        self.assertFalse(conexion.cerrada)
+        self.assertIs(self.abrir(), conexion)
+        self.assertEqual(len(self.conexiones), 1)
+
+    def test_pool_agotado_es_operational_error(self):
+        self.abrir()
+        with self.assertRaises(pool_base.Database.OperationalError):
+            self.wrapper.get_new_connection({})
+
+    def test_cerrar_en_transaccion_hace_rollback(self):
+        conexion = self.abrir()
+        conexion.server_status |= SERVER_STATUS.SERVER_STATUS_IN_TRANS
+        self.wrapper._close()
+        self.assertEqual(conexion.rollbacks, 1)
+        self.assertFalse(conexion.cerrada)
+        self.assertEqual(pool_base.pool_de(self.ALIAS).estado()['libres'], 1)
+
+    def test_rollback_fallido_descarta(self):
+        conexion = self.abrir()
+        conexion.server_status |= SERVER_STATUS.SERVER_STATUS_IN_TRANS
+        conexion.falla_rollback = True
+        self.wrapper._close()
+        self.assertTrue(conexion.cerrada)
+        self.assertIsNot(self.abrir(), conexion)
+
+    def test_errores_sin_resolver_descartan(self):
+        conexion = self.abrir()
+        self.wrapper.errors_occurred = True
+        self.wrapper._close()
+        self.assertTrue(conexion.cerrada)
+        self.assertEqual(conexion.rollbacks, 0)
+
+    def test_pool_por_proceso_despues_de_fork(self):
+        padre = pool_base.pool_de(self.ALIAS, crear=object)
+        self.assertIs(pool_base.pool_de(self.ALIAS, crear=object), padre)
+        with mock.patch.object(pool_base.os, 'getpid', return_value=os.getpid() + 1):
+            self.assertIsNone(pool_base.pool_de(self.ALIAS))
+            hijo = pool_base.pool_de(self.ALIAS, crear=object)
+            self.assertIsNot(hijo, padre)
+            self.assertIs(pool_base.pool_de(self.ALIAS), hijo)
+
+    def test_conexion_anterior_al_fork_se_cierra(self):
+        conexion = self.abrir()
+        pool_padre = pool_base.pool_de(self.ALIAS)
+        with mock.patch.object(pool_base.os, 'getpid', return_value=os.getpid() + 1):
+            self.wrapper._close()
+            self.assertTrue(conexion.cerrada)
+            # El hijo arma su propio pool y no reutiliza las del padre
+            self.assertIsNot(self.abrir(), conexion)
+            self.assertIsNot(pool_base.pool_de(self.ALIAS), pool_padre)
+        self.assertEqual(pool_padre.estado()['libres'], 0)
+
+    def test_estado_de_sesion_se_inicializa_una_vez(self):
+        with mock.patch.object(pool_base.base.DatabaseWrapper, 'init_connection_state') as inicializar:
+            conexion = self.abrir()
+            self.wrapper.init_connection_state()
+            self.wrapper._close()
+            self.assertIs(self.abrir(), conexion)
+            self.wrapper.init_connection_state()
+        self.assertEqual(inicializar.call_count, 1)
+
+
+# ============================================
+# LÍMITE DE REQUESTS
+# ============================================
+LIMITES_PRUEBA = {
+    'api': {'tasa': '3/min', 'rafaga': 3},
+    'api_mensajes': {'tasa': '1/min', 'rafaga': 1},
+    'proxy_openlibrary': {'tasa': '2/min', 'rafaga': 2},
+}
+
+
+@override_settings(LIMITES_ACTIVOS=True, LIMITES_TASA=LIMITES_PRUEBA, LIMITES_PROXIES=0, OPENLIBRARY_FUENTE='local')
+class LimitesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = Usuario.objects.create(rut='12345678-5', username='12345678-5')
+        cls.beto = Usuario.objects.create(rut='11111111-1', username='11111111-1')
+
+    def setUp(self):
+        caches[settings.LIMITES_CACHE].clear()
+        self.client.force_login(self.ana)
+
+    def assertLimitado(self, response, espera):
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], str(espera))
+
+    def test_bucket_se_recarga_con_el_tiempo(self):
+        limite = (1 / 60, 2)  # 1/min, ráfaga 2
+        estado, espera = limites._consumir_bucket(None, limite, 1000)
+        self.assertEqual((estado, espera), ((1, 1000), 0))
+        estado, espera = limites._consumir_bucket(estado, limite, 1000)
+        estado, espera = limites._consumir_bucket(estado, limite, 1000)
+        self.assertAlmostEqual(espera, 60)
+        estado, espera = limites._consumir_bucket(estado, limite, 1030)  # Medio token recargado
+        self.assertAlmostEqual(espera, 30)
+        _, espera = limites._consumir_bucket(estado, limite, 1061)
+        self.assertEqual(espera, 0)
+        self.assertEqual(limites._consumir_bucket((0, 0), limite, 10 ** 6)[0], (1, 10 ** 6))  # Tope: la ráfaga
+
+    def test_consumos_simultaneos_no_se_pisan(self):
+        consumir_bucket = limites._consumir_bucket
+
+        def lento(*args):
+            time.sleep(0.005)  # Entre leer y escribir el bucket: sin candado los hilos se pisan
+            return consumir_bucket(*args)
+
+        permitidos = []
+        with mock.patch.object(limites, '_consumir_bucket', side_effect=lento), \
+                override_settings(LIMITES_TASA={'prueba': {'tasa': '1/h', 'rafaga': 5}}):
+            hilos = [
+                threading.Thread(target=lambda: permitidos.append(limites.consumir('prueba', 'u1') == 0))
+                for _ in range(12)
+            ]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+        self.assertEqual(permitidos.count(True), 5)
+        self.assertIsNone(caches[settings.LIMITES_CACHE].get(limites._candado(limites._clave('prueba', 'u1'))))
+
+    def test_proxy_responde_429_con_retry_after(self):
+        url = reverse('proxy_openlibrary')
+        for _ in range(2):
+            self.assertEqual(self.client.get(url, {'q': 'algebra'}).status_code, 200)
+        self.assertLimitado(self.client.get(url, {'q': 'algebra'}), 30)
+
+        # Por usuario: otro usuario desde la misma IP tiene su propio bucket
+        self.client.force_login(self.beto)
+        self.assertEqual(self.client.get(url, {'q': 'algebra'}).status_code, 200)
+
+    async def test_proxy_async_responde_429(self):
+        cliente = AsyncClient()
+        await sync_to_async(cliente.force_login)(self.ana)
+        url = reverse('proxy_openlibrary_async')
+        for _ in range(2):
+            self.assertEqual((await cliente.get(url, {'q': 'algebra'})).status_code, 200)
+        self.assertLimitado(await cliente.get(url, {'q': 'algebra'}), 30)
+
+    async def test_sin_sesion_el_limite_es_por_ip(self):
+        url = reverse('proxy_openlibrary_async')
+        anonimo = AsyncClient(client=['10.0.0.1', 0])
+        for _ in range(2):
+            self.assertEqual((await anonimo.get(url)).status_code, 302)  # Al login, pero cuenta
+        self.assertLimitado(await anonimo.get(url), 30)
+        self.assertEqual((await AsyncClient(client=['10.0.0.2', 0]).get(url)).status_code, 302)
+
+    def test_throttle_de_la_api_por_ambito(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/usuarios/').status_code, 200)
+        response = self.client.get('/api/usuarios/')
+        self.assertLimitado(response, 20)
+        # api_mensajes tiene su propio bucket
+        self.assertEqual(self.client.get('/api/mensajes/').status_code, 200)
+        self.assertEqual(self.client.get('/api/mensajes/').status_code, 429)
+        self.client.force_login(self.beto)
+        self.assertEqual(self.client.get('/api/usuarios/').status_code, 200)
+
+    def test_direccion_ip_con_proxies(self):
+        fabrica = RequestFactory()
+        request = fabrica.get('/', REMOTE_ADDR='10.0.0.9', HTTP_X_FORWARDED_FOR='1.1.1.1, 2.2.2.2, 3.3.3.3')
+        casos = ((0, '10.0.0.9'), (1, '3.3.3.3'), (2, '2.2.2.2'), (3, '1.1.1.1'), (5, '1.1.1.1'))
+        for proxies, esperada in casos:
+            with self.subTest(proxies=proxies), override_settings(LIMITES_PROXIES=proxies):
+                self.assertEqual(limites.direccion_ip(request), esperada)
+        with override_settings(LIMITES_PROXIES=1):
+            self.assertEqual(limites.direccion_ip(fabrica.get('/', REMOTE_ADDR='10.0.0.9')), '10.0.0.9')
+            self.assertEqual(limites.identidad(AnonymousUser(), request), 'ip3.3.3.3')
+            self.assertEqual(limites.identidad(self.ana, request), f'u{self.ana.pk}')
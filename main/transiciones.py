@@ -0,0 +1,114 @@
+"""
+Transiciones de estado de las sesiones de tutoría.
+
+Cada cambio de estado es un solo UPDATE condicional:
+
+    UPDATE ... SET estado = <destino>, fecha_actualizacion = <ahora>, <campos>
+    WHERE id = <sesión> AND estado IN (<estados de origen>)
+
+Si otro request ya movió la sesión (un tutor acepta mientras otro rechaza),
+el UPDATE no encuentra la fila y la transición se rechaza en vez de pisar el
+estado: gana el primero. Solo se escriben las columnas que cambian.
+
+Cada transición aplicada envía una señal sesion_transicion con los ids de las
+sesiones movidas; main/signals.py la usa para las versiones de datos y el
+historial de eventos (main/eventos.py), y cualquier otro módulo puede
+conectarse a ella.
+"""
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from . import versiones
+from .models import SesionTutoria
+
+# nombre: (estados de origen, estado de destino)
+TRANSICIONES = {
+    'aceptar': (('Pendiente',), 'Aceptada'),
+    'denegar': (('Pendiente',), 'Denegada'),
+    'finalizar': (('Aceptada',), 'Completada'),
+    'cancelar': (('Pendiente', 'Aceptada'), 'Cancelada'),
+}
+
+# Argumentos: sender=SesionTutoria, transicion, origen, destino, ids, campos y
+# sesiones: [{'id', 'estado' (antes de la transición), 'tutor_id', 'tutorado_id'}].
+# Se envía dentro de la transacción del UPDATE: lo que escriban los receptores
+# (el historial de main/eventos.py) se confirma o se revierte junto con él.
+sesion_transicion = Signal()
+
+COLUMNAS_SESION = ('id', 'estado', 'tutor_id', 'tutorado_id')
+
+
+def transicion_hacia(origen, destino):
+    """Nombre de la transición que lleva de `origen` a `destino`, o None si no hay una"""
+    for nombre, (origenes, final) in TRANSICIONES.items():
+        if origen in origenes and final == destino:
+            return nombre
+    return None
+
+
+def _enviar(nombre, sesiones, campos):
+    origen, destino = TRANSICIONES[nombre]
+    sesion_transicion.send(
+        sender=SesionTutoria, transicion=nombre, origen=origen, destino=destino,
+        ids=[sesion['id'] for sesion in sesiones], sesiones=sesiones, campos=campos,
+    )
+
+
+def transicionar(sesion, nombre, **campos):
+    """
+    Aplica la transición `nombre` a la sesión, escribiendo además `campos`.
+    Retorna False sin escribir nada si la sesión ya no está en un estado de origen;
+    si se aplica, actualiza también la instancia.
+    """
+    origen, destino = TRANSICIONES[nombre]
+    if len(origen) > 1:
+        # El estado anterior no se deduce del UPDATE: se lee con la fila bloqueada
+        movidas = transicionar_varias(SesionTutoria.objects.filter(pk=sesion.pk), nombre, **campos)
+        if movidas:
+            sesion.refresh_from_db(fields=['estado', 'fecha_actualizacion', *campos])
+        return bool(movidas)
+
+    campos = {'estado': destino, 'fecha_actualizacion': timezone.now(), **campos}
+    with transaction.atomic():
+        movidas = SesionTutoria.objects.filter(pk=sesion.pk, estado__in=origen).update(**campos)
+        if not movidas:
+            return False
+        anterior = {'id': sesion.pk, 'estado': origen[0], 'tutor_id': sesion.tutor_id, 'tutorado_id': sesion.tutorado_id}
+        _enviar(nombre, [anterior], campos)
+    for campo, valor in campos.items():
+        setattr(sesion, campo, valor)
+    return True
+
+
+def transicionar_varias(sesiones, nombre, **campos):
+    """Aplica la transición a las sesiones del queryset que estén en un estado de origen; retorna cuántas"""
+    origen, destino = TRANSICIONES[nombre]
+    campos = {'estado': destino, 'fecha_actualizacion': timezone.now(), **campos}
+    with transaction.atomic():
+        # Bloqueadas hasta el UPDATE: la señal lleva exactamente las sesiones movidas y su estado anterior
+        anteriores = list(
+            sesiones.filter(estado__in=origen).select_for_update().order_by().values(*COLUMNAS_SESION)
+        )
+        if not anteriores:
+            return 0
+        SesionTutoria.objects.filter(pk__in=[sesion['id'] for sesion in anteriores]).update(**campos)
+        _enviar(nombre, anteriores, campos)
+    return len(anteriores)
+
+
+def calificar(sesion, campo, calificacion):
+    """
+    Registra la calificación (campo 'calificacion_tutorado' o 'calificacion_tutor') si la
+    sesión está Completada, con el mismo UPDATE condicional. Retorna si se registró.
+    """
+    ahora = timezone.now()
+    registradas = SesionTutoria.objects.filter(pk=sesion.pk, estado='Completada').update(
+        **{campo: calificacion, 'fecha_actualizacion': ahora}
+    )
+    if not registradas:
+        return False
+    setattr(sesion, campo, calificacion)
+    sesion.fecha_actualizacion = ahora
+    versiones.incrementar(SesionTutoria)
+    return True
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .api import *
@@ -33,11 +34,19 @@ urlpatterns = [
     path('sesion/<int:sesion_id>/denegar/', views.denegar_sesion, name='denegar_sesion'),
     path('sesion/<int:sesion_id>/finalizar/', views.finalizar_sesion, name='finalizar_sesion'),
     path('calificar_notificacion/<int:sesion_id>/', views.calificar_desde_notificacion, name='calificar_desde_notificacion'),
+    path('api/dashboard/', DashboardView.as_view(), name='api_dashboard'),
+    path('api/sync/', SincronizacionView.as_view(), name='api_sync'),
     path('api/', include(router.urls)),
     path('api-client/', views.api_client, name='api_client'),
     
     # Proxy para APIs externas (evitar CORS)
-    path('api/proxy/openlibrary/', views.proxy_openlibrary, name='proxy_openlibrary'),
+    # En modo ASGI la ruta principal usa la vista async, que no bloquea el worker
+    path('api/proxy/openlibrary/',
+         views.proxy_openlibrary_async if settings.SERVIDOR_MODO == 'asgi' else views.proxy_openlibrary,
+         name='proxy_openlibrary'),
+    path('api/proxy/openlibrary/async/', views.proxy_openlibrary_async, name='proxy_openlibrary_async'),
+    path('api/proxy/openlibrary/portadas/<int:cover_id>-<str:tamano>.jpg', views.portada_openlibrary, name='portada_openlibrary'),
+    path('api/proxy/openlibrary/metricas/', views.metricas_openlibrary, name='metricas_openlibrary'),
     
     # Nuevas rutas admin
     path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'),
@@ -0,0 +1,57 @@
+"""
+Versiones de datos por modelo.
+
+Cada escritura de un modelo seguido incrementa su contador en VersionModelo:
+las escrituras con save()/delete() por las señales de main/signals.py, y las
+masivas (bulk_create, bulk_update, queryset.update) llamando a incrementar()
+explícitamente. Con la versión de los modelos que entrega un endpoint se
+calcula su ETag y Last-Modified con una sola consulta, sin leer los datos.
+"""
+import hashlib
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import VersionModelo
+
+
+def etiqueta(modelo):
+    return modelo._meta.label_lower
+
+
+def incrementar(*modelos):
+    """Marca los modelos como modificados (dentro de la transacción en curso, si la hay)"""
+    ahora = timezone.now()
+    for modelo in {etiqueta(m) for m in modelos}:
+        actualizadas = VersionModelo.objects.filter(modelo=modelo).update(
+            version=F('version') + 1, fecha_modificacion=ahora
+        )
+        if not actualizadas:
+            try:
+                with transaction.atomic():
+                    VersionModelo.objects.create(modelo=modelo, version=1, fecha_modificacion=ahora)
+            except IntegrityError:
+                # Otro proceso la creó entre el UPDATE y el INSERT
+                VersionModelo.objects.filter(modelo=modelo).update(
+                    version=F('version') + 1, fecha_modificacion=ahora
+                )
+
+
+def obtener(*modelos):
+    """
+    Retorna (firma, ultima_modificacion) de los modelos: la firma cambia con
+    cualquier escritura en ellos; ultima_modificacion es None si nunca se escribieron.
+    """
+    etiquetas = sorted({etiqueta(m) for m in modelos})
+    filas = {
+        modelo: (version, fecha)
+        for modelo, version, fecha in VersionModelo.objects
+        .filter(modelo__in=etiquetas)
+        .values_list('modelo', 'version', 'fecha_modificacion')
+    }
+    firma = hashlib.sha1(
+        ';'.join(f'{modelo}={filas.get(modelo, (0, None))[0]}' for modelo in etiquetas).encode()
+    ).hexdigest()
+    fechas = [fecha for _, fecha in filas.values()]
+    return firma, max(fechas) if fechas else None
@@ -1,23 +1,28 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth.views import redirect_to_login
+from asgiref.sync import sync_to_async
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponseForbidden
+from django.http import JsonResponse, HttpResponseForbidden, HttpResponseNotModified, FileResponse, Http404
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView
 from django.conf import settings
 from django.views.decorators.http import require_http_methods
 from .models import (Usuario, Tutor, SesionTutoria, RecursoEducativo, 
                      Notificacion, DisponibilidadTutor, Mensaje, Asignatura,
-                     Logro, UsuarioLogro)
+                     Logro, UsuarioLogro, SesionArchivada)
 from .forms import (RegistroForm, LoginForm, AgendarForm, MensajeForm, 
                     RecursoEducativoForm)
 from django.utils import timezone
+from django.utils.http import parse_etags
 from django.contrib.auth.hashers import make_password
 from datetime import datetime, timedelta
 import json
-import requests
 from django.db.models import Q, Count
+from . import archivo, openlibrary, portadas, transiciones
+from .limites import limitar
+from .resumen import rango_por_sesiones
 
 # Verificar si es administrador
 def is_admin(user):
@@ -29,7 +34,10 @@ def index(request):
     return render(request, 'main/index.html', {
         'tutores': tutores,
         'total_tutores': Tutor.objects.filter(activo=True).count(),
-        'total_sesiones': SesionTutoria.objects.filter(estado='Completada').count()
+        # Incluye las de semestres anteriores (archivo histórico), en la misma consulta
+        'total_sesiones': SesionTutoria.objects.filter(estado='Completada').order_by().values('pk').union(
+            SesionArchivada.objects.filter(estado='Completada').order_by().values('pk'), all=True
+        ).count()
     })
 
 @login_required
@@ -42,74 +50,106 @@ def api_client(request):
 # ============================================
 # PROXY PARA APIs EXTERNAS (evitar CORS)
 # ============================================
+def _parametros_proxy(request):
+    query = request.GET.get('q', 'mathematics')  # Query de búsqueda, por defecto matemáticas
+    limit = request.GET.get('limit', '10')  # Límite de resultados
+    return query, limit
+
+
+def _respuesta_proxy(query, datos, estado_cache):
+    response = JsonResponse({
+        'query': query,
+        'total_results': datos['total_results'],
+        'books': datos['books']
+    }, safe=False)
+    response['X-Cache'] = estado_cache
+    return response
+
+
+def _error_proxy(error):
+    if isinstance(error, openlibrary.OpenLibraryNoDisponible):
+        response = JsonResponse({'error': str(error)}, status=503)
+        response['Retry-After'] = str(int(error.reintentar_en))
+        return response
+    return JsonResponse({'error': str(error)}, status=502)
+
+
 @login_required
+@limitar('proxy_openlibrary')
 def proxy_openlibrary(request):
     """
     Proxy para Open Library API - Buscar libros educativos
     Permite a los tutores encontrar recursos bibliográficos para recomendar a estudiantes
     Versión pública: solo requiere login (no admin)
+    Las respuestas se cachean por (q, limit) normalizados, ver main/openlibrary.py
     """
-    query = request.GET.get('q', 'mathematics')  # Query de búsqueda, por defecto matemáticas
-    limit = request.GET.get('limit', '10')  # Límite de resultados
-    
-    # Validar y ajustar límite
+    query, limit = _parametros_proxy(request)
+
     try:
-        limit_int = int(limit)
-        if limit_int > 20:
-            limit_int = 20  # Máximo 20 resultados
-        elif limit_int < 1:
-            limit_int = 1
-        limit = str(limit_int)
-    except (ValueError, TypeError):
-        limit = '10'
-    
+        datos, estado_cache = openlibrary.buscar(query, limit)
+    except openlibrary.ErrorOpenLibrary as e:
+        return _error_proxy(e)
+
+    return _respuesta_proxy(query, datos, estado_cache)
+
+
+@limitar('proxy_openlibrary')
+async def proxy_openlibrary_async(request):
+    """
+    Versión async de proxy_openlibrary para despliegues ASGI (SERVIDOR_MODO=asgi).
+    Mientras espera a Open Library libera el event loop, así un proceso puede
+    mantener cientos de búsquedas en curso.
+    """
+    usuario = await sync_to_async(lambda: request.user)()
+    if not usuario.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+
+    query, limit = _parametros_proxy(request)
+
     try:
-        # Buscar libros en Open Library
-        response = requests.get(
-            f'https://openlibrary.org/search.json',
-            params={
-                'q': query,
-                'limit': limit,
-                'fields': 'title,author_name,first_publish_year,subject,isbn,number_of_pages_median,key,cover_i'
-            },
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            # Formatear la respuesta para que sea más útil
-            books = []
-            limit_count = int(limit)
-            for doc in data.get('docs', [])[:limit_count]:
-                # Construir URL del libro en Open Library
-                book_key = doc.get('key', '')
-                book_url = f'https://openlibrary.org{book_key}' if book_key else None
-                
-                # Construir URL de la portada si existe
-                cover_id = doc.get('cover_i')
-                cover_url = f'https://covers.openlibrary.org/b/id/{cover_id}-M.jpg' if cover_id else None
-                
-                books.append({
-                    'title': doc.get('title', 'Sin título'),
-                    'author': doc.get('author_name', ['Autor desconocido'])[0] if doc.get('author_name') else 'Autor desconocido',
-                    'year': doc.get('first_publish_year', 'N/A'),
-                    'subjects': doc.get('subject', [])[:3],  # Primeros 3 temas
-                    'isbn': doc.get('isbn', ['N/A'])[0] if doc.get('isbn') else 'N/A',
-                    'pages': doc.get('number_of_pages_median', 'N/A'),
-                    'url': book_url,
-                    'cover_url': cover_url
-                })
-            
-            return JsonResponse({
-                'query': query,
-                'total_results': data.get('numFound', 0),
-                'books': books
-            }, safe=False)
-        else:
-            return JsonResponse({'error': f'Error en la API: {response.status_code}'}, status=500)
-            
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        datos, estado_cache = await openlibrary.abuscar(query, limit)
+    except openlibrary.ErrorOpenLibrary as e:
+        return _error_proxy(e)
+
+    return _respuesta_proxy(query, datos, estado_cache)
+
+
+@login_required
+@limitar('portadas')
+@require_http_methods(["GET", "HEAD"])
+def portada_openlibrary(request, cover_id, tamano):
+    """
+    Sirve portadas de Open Library desde la caché en disco (main/portadas.py).
+    Las portadas no cambian, así que se cachean un año en el navegador y se
+    validan con ETag.
+    """
+    if tamano not in portadas.TAMANOS:
+        raise Http404('Tamaño de portada inválido')
+
+    try:
+        archivo, etag = portadas.abrir_portada(cover_id, tamano)
+    except portadas.PortadaNoEncontrada:
+        raise Http404('Portada no encontrada')
+    except portadas.ErrorPortada as e:
+        return JsonResponse({'error': str(e)}, status=502)
+
+    # Comparación débil, como la de django.utils.cache: "1-M-64" no debe validar "11-M-64"
+    etags = {valor.removeprefix('W/') for valor in parse_etags(request.headers.get('If-None-Match', ''))}
+    if etag in etags or '*' in etags:
+        archivo.close()
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(archivo, content_type='image/jpeg')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@login_required
+@user_passes_test(is_admin)
+def metricas_openlibrary(request):
+    """Métricas de la caché del proxy de Open Library - Solo administradores"""
+    return JsonResponse(openlibrary.obtener_metricas())
 
 def registro_view(request):
     if request.method == 'POST':
@@ -164,52 +204,38 @@ def dashboard(request):
     user = request.user
     ahora = timezone.now()
 
-    sesiones_terminadas_count = SesionTutoria.objects.filter(
-        tutor=user.tutor_profile,
-        estado='Completada',
-        fecha_programada__lt=ahora
-    ).count() if hasattr(user, 'tutor_profile') else 0
-
-    # Rango basado en sesiones terminadas (orden correcto de mayor a menor)
-    rango = 'Novato'
-    if sesiones_terminadas_count >= 200:
-        rango = 'Iluminado'
-    elif sesiones_terminadas_count >= 100:
-        rango = 'Erudito'
-    elif sesiones_terminadas_count >= 50:
-        rango = 'Avanzado'
-    elif sesiones_terminadas_count >= 25:
-        rango = 'Intermedio'
-    elif sesiones_terminadas_count >= 10:
-        rango = 'Principiante'
+    # Los tres contadores del tutor en una sola consulta
+    contadores = SesionTutoria.objects.filter(tutor=user.tutor_profile).aggregate(
+        terminadas=Count('pk', filter=Q(estado='Completada', fecha_programada__lt=ahora)),
+        pendientes=Count('pk', filter=Q(estado='Pendiente')),
+        completadas=Count('pk', filter=Q(estado='Completada')),
+    ) if hasattr(user, 'tutor_profile') else {'terminadas': 0, 'pendientes': 0, 'completadas': 0}
+    sesiones_terminadas_count = contadores['terminadas']
+    if hasattr(user, 'tutor_profile'):
+        # El rango cuenta también las sesiones de semestres anteriores (archivo histórico)
+        sesiones_terminadas_count += SesionArchivada.objects.filter(
+            tutor=user.tutor_profile, estado='Completada'
+        ).count()
+
+    # Rango basado en sesiones terminadas
+    rango = rango_por_sesiones(sesiones_terminadas_count)
 
     sesiones_tutor = SesionTutoria.objects.filter(
         tutor=user.tutor_profile,
         estado='Aceptada',
         fecha_programada__gte=ahora
-    ).order_by('fecha_programada')[:5] if hasattr(user, 'tutor_profile') else []
-
-    tutores = Tutor.objects.filter(activo=True).order_by('-calificacion_promedio')[:5]
-
-
-    sesiones_pendientes = SesionTutoria.objects.filter(
-        tutor=user.tutor_profile,
-        estado='Pendiente'
-    ).count() if hasattr(user, 'tutor_profile') else 0
-
-
-    sesiones_terminadas = SesionTutoria.objects.filter(
-        tutor=user.tutor_profile,
-        estado='Completada'
-    ).count() if hasattr(user, 'tutor_profile') else 0
+    ).select_related('tutorado', 'asignatura').order_by('fecha_programada')[:5] if hasattr(user, 'tutor_profile') else []
 
+    tutores = Tutor.objects.filter(activo=True).select_related('usuario').order_by('-calificacion_promedio')[:5]
 
+    sesiones_pendientes = contadores['pendientes']
+    sesiones_terminadas = contadores['completadas']
 
     sesiones_proximas_tutorado = SesionTutoria.objects.filter(
         tutorado=user,
         estado__in=['Pendiente', 'Aceptada'],
         fecha_programada__gte=ahora
-    ).order_by('fecha_programada')[:5]
+    ).select_related('tutor__usuario', 'asignatura').order_by('fecha_programada')[:5]
 
 
     # Enviar contexto
@@ -266,7 +292,7 @@ def buscar_tutor(request):
 
 
 def perfil_tutor(request, tutor_id):
-    tutor = get_object_or_404(Tutor, pk=tutor_id)
+    tutor = get_object_or_404(Tutor.objects.select_related('usuario'), pk=tutor_id)
     sesiones_completadas = tutor.sesiones_como_tutor.filter(estado='Completada').count()
     return render(request, 'main/perfil_tutor.html', {
         'tutor': tutor,
@@ -285,19 +311,19 @@ def mis_sesiones(request):
         sesiones_pendientes = SesionTutoria.objects.filter(
             tutor=user.tutor_profile,
             estado='Pendiente'
-        ).order_by('fecha_programada')
+        ).select_related('tutor__usuario', 'tutorado', 'asignatura').order_by('fecha_programada')
         
         sesiones_futuras = SesionTutoria.objects.filter(
             tutor=user.tutor_profile,
             estado__in=['Aceptada'],
             fecha_programada__gte=ahora
-        ).order_by('fecha_programada')
+        ).select_related('tutor__usuario', 'tutorado', 'asignatura').order_by('fecha_programada')
         
         sesiones_pasadas = SesionTutoria.objects.filter(
         tutorado=user,
         estado='Completada',
         calificacion_tutorado__isnull=True
-        ).order_by('-fecha_programada')
+        ).select_related('tutor__usuario', 'tutorado', 'asignatura').order_by('-fecha_programada')
 
         
         return render(request, 'main/mis_sesiones_tutor.html', {
@@ -312,23 +338,26 @@ def mis_sesiones(request):
             tutorado=user,
             estado='Aceptada',
             fecha_programada__gte=ahora
-        ).order_by('fecha_programada')
+        ).select_related('tutor__usuario', 'tutorado', 'asignatura').order_by('fecha_programada')
         
         sesiones_pendientes = SesionTutoria.objects.filter(
             tutorado=user,
             estado='Pendiente'
-        ).order_by('fecha_programada')
+        ).select_related('tutor__usuario', 'tutorado', 'asignatura').order_by('fecha_programada')
         
-        sesiones_pasadas = SesionTutoria.objects.filter(
-            tutorado=user,
-            estado__in=['Completada', 'No_Show'],
-            fecha_programada__lt=ahora
-        ).order_by('-fecha_programada')
+        # Historial: los semestres anteriores (archivo histórico) solo con ?archivo=1
+        incluir_archivo = request.GET.get('archivo') == '1'
+        sesiones_pasadas = archivo.historial(
+            Q(tutorado=user, estado__in=['Completada', 'No_Show'], fecha_programada__lt=ahora),
+            incluir_archivo=incluir_archivo,
+            relacionados=('tutor__usuario', 'tutorado', 'asignatura'),
+        )
         
         return render(request, 'main/mis_sesiones_tutorado.html', {
             'sesiones_futuras': sesiones_futuras,
             'sesiones_pendientes': sesiones_pendientes,
             'sesiones_pasadas': sesiones_pasadas,
+            'incluir_archivo': incluir_archivo,
             'es_tutor': False,
         })
 
@@ -341,10 +370,8 @@ def aceptar_sesion(request, sesion_id):
     if sesion.tutor.usuario != request.user:
         return HttpResponseForbidden("No tienes permiso para aceptar esta sesión.")
 
-    sesion.estado = 'Aceptada'
-    sesion.save()
-
-
+    if not transiciones.transicionar(sesion, 'aceptar'):
+        return JsonResponse({'error': 'Solo puedes aceptar sesiones pendientes'}, status=400)
 
     Notificacion.objects.create(
         usuario=sesion.tutorado,
@@ -366,9 +393,6 @@ def denegar_sesion(request, sesion_id):
     if not hasattr(request.user, 'tutor_profile') or sesion.tutor.usuario != request.user:
         return HttpResponseForbidden()
 
-    if sesion.estado != 'Pendiente':
-        return JsonResponse({'error': 'Solo puedes rechazar sesiones pendientes'}, status=400)
-
     # No intentes cargar JSON si no hay body
     razon = 'Sin especificar'  # default si no envían
 
@@ -377,9 +401,8 @@ def denegar_sesion(request, sesion_id):
         data = json.loads(request.body)
         razon = data.get('razon', razon)
 
-    sesion.estado = 'Denegada'
-    sesion.razon_rechazo = razon
-    sesion.save()
+    if not transiciones.transicionar(sesion, 'denegar', razon_rechazo=razon):
+        return JsonResponse({'error': 'Solo puedes rechazar sesiones pendientes'}, status=400)
 
     # Notificar al tutorado
     Notificacion.objects.create(
@@ -394,7 +417,7 @@ def denegar_sesion(request, sesion_id):
 
 @login_required
 def agendar_sesion(request, tutor_id):
-    tutor = get_object_or_404(Tutor, pk=tutor_id)
+    tutor = get_object_or_404(Tutor.objects.select_related('usuario'), pk=tutor_id)
     
     if request.method == 'POST':
         form = AgendarForm(request.POST, tutor=tutor)
@@ -486,11 +509,9 @@ def detalle_sesion(request, sesion_id):
         if 'calificacion' in request.POST:
             calificacion = int(request.POST.get('calificacion'))
             if sesion.tutorado == request.user:
-                sesion.calificacion_tutorado = calificacion
-            else:
-                sesion.calificacion_tutor = calificacion
+                transiciones.calificar(sesion, 'calificacion_tutorado', calificacion)
+            elif transiciones.calificar(sesion, 'calificacion_tutor', calificacion):
                 sesion.tutor.actualizar_calificacion_promedio()
-            sesion.save()
             return redirect('detalle_sesion', sesion_id=sesion_id)
     
     return render(request, 'main/detalle_sesion.html', {
@@ -503,12 +524,12 @@ def detalle_sesion(request, sesion_id):
 
 @login_required
 def chat(request, sesion_id):
-    sesion = get_object_or_404(SesionTutoria, id=sesion_id)
+    sesion = get_object_or_404(SesionTutoria.objects.select_related('tutor__usuario', 'tutorado'), id=sesion_id)
     # Verificar que el usuario sea tutor o tutorado de la sesión
     if request.user != sesion.tutorado and (not hasattr(request.user, 'tutor_profile') or request.user.tutor_profile != sesion.tutor):
         return redirect('dashboard')
 
-    mensajes = sesion.mensajes.order_by('fecha_envio')
+    mensajes = sesion.mensajes.select_related('remitente').order_by('fecha_envio')
 
     if request.method == 'POST':
         form = MensajeForm(request.POST)
@@ -665,7 +686,10 @@ def notificaciones(request):
 
 @login_required
 def perfil_usuario(request):
-    return render(request, 'main/perfil_usuario.html', {'usuario': request.user})
+    return render(request, 'main/perfil_usuario.html', {
+        'usuario': request.user,
+        'logros': request.user.logros.select_related('logro'),
+    })
 
 @login_required
 def mi_disponibilidad(request):
@@ -737,12 +761,13 @@ def generar_estrellas(calificacion, max_estrellas=5):
     return estrellas_html
 
 @login_required
+@require_http_methods(["POST"])
 def finalizar_sesion(request, sesion_id):
     if request.method == "POST":
         sesion = get_object_or_404(SesionTutoria, pk=sesion_id, tutor__usuario=request.user)
-        sesion.estado = "Completada"
-        sesion.fecha_fin = timezone.now()
-        sesion.save()
+        if not transiciones.transicionar(sesion, 'finalizar', fecha_fin=timezone.now()):
+            messages.error(request, 'Solo puedes finalizar sesiones aceptadas.')
+            return redirect('mis_sesiones')
 
         Notificacion.objects.create(
             usuario=sesion.tutorado,
@@ -759,9 +784,6 @@ def finalizar_sesion(request, sesion_id):
 def calificar_desde_notificacion(request, sesion_id):
     sesion = get_object_or_404(SesionTutoria, pk=sesion_id, tutorado=request.user)
 
-    if sesion.estado != 'Completada':
-        return JsonResponse({'error': 'La sesión no está finalizada'}, status=400)
-
     try:
         calificacion = int(request.POST.get('calificacion'))
         if calificacion < 1 or calificacion > 5:
@@ -769,8 +791,8 @@ def calificar_desde_notificacion(request, sesion_id):
     except Exception:
         return JsonResponse({'error': 'Calificación inválida'}, status=400)
 
-    sesion.calificacion_tutorado = calificacion
-    sesion.save()
+    if not transiciones.calificar(sesion, 'calificacion_tutorado', calificacion):
+        return JsonResponse({'error': 'La sesión no está finalizada'}, status=400)
 
     return JsonResponse({'mensaje': 'Calificación registrada correctamente'})
 
@@ -876,12 +898,12 @@ def admin_editar_usuario(request, usuario_id):
 @user_passes_test(is_admin)
 def admin_sesiones(request):
     """Gestión de sesiones de tutoría"""
-    sesiones = SesionTutoria.objects.all()
+    condicion = Q()
     
     # Filtro por estado
     estado = request.GET.get('estado')
     if estado:
-        sesiones = sesiones.filter(estado=estado)
+        condicion &= Q(estado=estado)
     
     # Filtro por período
     periodo = request.GET.get('periodo')
@@ -890,22 +912,22 @@ def admin_sesiones(request):
     if periodo == 'hoy':
         inicio = ahora.replace(hour=0, minute=0, second=0)
         fin = ahora.replace(hour=23, minute=59, second=59)
-        sesiones = sesiones.filter(fecha_programada__range=[inicio, fin])
+        condicion &= Q(fecha_programada__range=[inicio, fin])
     elif periodo == 'proxima_semana':
         inicio = ahora + timedelta(days=1)
         fin = ahora + timedelta(days=7)
-        sesiones = sesiones.filter(fecha_programada__range=[inicio, fin])
+        condicion &= Q(fecha_programada__range=[inicio, fin])
     elif periodo == 'proximo_mes':
         inicio = ahora + timedelta(days=1)
         fin = ahora + timedelta(days=30)
-        sesiones = sesiones.filter(fecha_programada__range=[inicio, fin])
+        condicion &= Q(fecha_programada__range=[inicio, fin])
     elif periodo == 'pasadas':
-        sesiones = sesiones.filter(fecha_programada__lt=ahora)
+        condicion &= Q(fecha_programada__lt=ahora)
     
     # Búsqueda
     buscar = request.GET.get('buscar')
     if buscar:
-        sesiones = sesiones.filter(
+        condicion &= (
             Q(tutor__usuario__rut__icontains=buscar) |
             Q(tutor__usuario__first_name__icontains=buscar) |
             Q(tutorado__rut__icontains=buscar) |
@@ -913,11 +935,20 @@ def admin_sesiones(request):
             Q(asignatura__nombre__icontains=buscar)
         )
     
+    # El archivo histórico solo tiene sesiones pasadas: se consulta si se pide y el período lo admite
+    archivo_pedido = request.GET.get('archivo') == '1'
+    sesiones = archivo.historial(
+        condicion,
+        incluir_archivo=archivo_pedido and periodo in (None, '', 'pasadas'),
+        relacionados=('tutor__usuario', 'tutorado', 'asignatura'),
+    )
+    
     context = {
-        'sesiones': sesiones.select_related('tutor__usuario', 'tutorado').order_by('-fecha_programada'),
+        'sesiones': sesiones,
         'estado_filtro': estado,
         'periodo_filtro': periodo,
         'buscar': buscar,
+        'archivo_filtro': archivo_pedido,
         'estados': ['Pendiente', 'Aceptada', 'Denegada', 'Completada', 'Cancelada'],
     }
     return render(request, 'admin/sesiones.html', context)
@@ -967,7 +998,7 @@ def admin_grupos_permisos(request):
     """Gestión de grupos y permisos"""
     from django.contrib.auth.models import Group
     
-    grupos = Group.objects.all()
+    grupos = Group.objects.prefetch_related('permissions')
     
     context = {
         'grupos': grupos,
@@ -0,0 +1,11 @@
+#!/usr/bin/env bash
+# Arranque del servidor web según SERVIDOR_MODO
+#   wsgi (por defecto): workers sync de gunicorn
+#   asgi: workers uvicorn; las vistas async (proxy de Open Library) no bloquean
+#         el worker mientras esperan a la API externa
+
+if [ "$SERVIDOR_MODO" = "asgi" ]; then
+    exec gunicorn inacap_tutorias.asgi:application -k uvicorn.workers.UvicornWorker "$@"
+else
+    exec gunicorn inacap_tutorias.wsgi:application "$@"
+fi